@@ -0,0 +1,128 @@
+"""
+Бенчмарк панели оформления: сколько сообщений остаётся в чате и сколько
+вызовов sendMessage/editMessageText уходит на одно оформление заказа
+с CHECKOUT_PANEL и без неё.
+
+Экраны идут в том же порядке и тем же способом (show/send, правка корзины на месте), что и в
+handlers/order.py для типичного пути: каталог, размер, ещё букет,
+корзина, дата, время, имя и телефон вручную, подтверждение, оплата.
+Telegram имитируется поддельным ботом; редкий случай «панель удалили»
+проверяется в конце.
+
+Запуск: python benchmarks/bench_checkout_panel.py
+"""
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram.exceptions import TelegramBadRequest  # noqa: E402
+from aiogram.fsm.context import FSMContext  # noqa: E402
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+from aiogram.fsm.storage.memory import MemoryStorage  # noqa: E402
+from aiogram.methods import EditMessageText  # noqa: E402
+
+import checkout_panel  # noqa: E402
+from config import Config  # noqa: E402
+
+CHECKOUTS = 100
+
+# (способ, экран) - как в handlers/order.py; "edit" - корзина, которую
+# show_bouquet_count_selection и без панели правит на месте
+FLOW = [
+    ("send", "каталог"),              # show_bouquet_options (после фото)
+    ("send", "размер букета"),        # bouquet_selected (после фото размеров)
+    ("edit", "корзина"),              # quantity_selected
+    ("edit", "корзина +1"),           # change_bouquet_count
+    ("show", "ещё букеты"),           # select_more_bouquets
+    ("send", "каталог"),              # add_new_bouquet -> show_bouquet_options
+    ("send", "размер букета"),        # bouquet_selected
+    ("edit", "корзина"),              # quantity_selected
+    ("show", "даты"),                 # no_more_bouquets
+    ("show", "время"),                # date_selected
+    ("show", "имя"),                  # time_selected
+    ("send", "телефон"),              # name_entered (после сообщения покупателя)
+    ("send", "подтверждение"),        # phone_entered
+    ("show", "редактирование"),       # edit_order_bouquets
+    ("show", "подтверждение"),        # back_to_confirmation
+    ("show", "оплата"),               # order_confirmed
+]
+
+
+class FakeBot:
+    def __init__(self):
+        self.calls = {"sendMessage": 0, "editMessageText": 0}
+        self.messages = set()
+        self._next_id = 0
+
+    def new_message(self, chat_id: int):
+        self.calls["sendMessage"] += 1
+        self._next_id += 1
+        self.messages.add(self._next_id)
+        return SimpleNamespace(message_id=self._next_id)
+
+    async def edit_message_text(self, text, chat_id, message_id, reply_markup=None):
+        self.calls["editMessageText"] += 1
+        if message_id not in self.messages:
+            raise TelegramBadRequest(
+                EditMessageText(text=text, chat_id=chat_id, message_id=message_id),
+                "Bad Request: message to edit not found"
+            )
+
+
+class FakeMessage:
+    def __init__(self, bot: FakeBot, chat_id: int):
+        self.bot = bot
+        self.chat = SimpleNamespace(id=chat_id)
+
+    async def answer(self, text, reply_markup=None):
+        return self.bot.new_message(self.chat.id)
+
+
+async def checkout(bot: FakeBot, state: FSMContext, chat_id: int):
+    message = FakeMessage(bot, chat_id)
+    last = None
+    for how, screen in FLOW:
+        if how == "edit" and not Config.CHECKOUT_PANEL:
+            await bot.edit_message_text(screen, chat_id, last.message_id)
+        elif how == "send":
+            last = await checkout_panel.send(message, state, screen)
+        else:
+            last = await checkout_panel.show(message, state, screen) or last
+
+
+async def run(panel: bool):
+    Config.CHECKOUT_PANEL = panel
+    bot = FakeBot()
+    storage = MemoryStorage()
+    for chat_id in range(CHECKOUTS):
+        state = FSMContext(storage, StorageKey(bot_id=1, chat_id=chat_id, user_id=chat_id))
+        await checkout(bot, state, chat_id)
+    print(f"  CHECKOUT_PANEL={int(panel)}:")
+    print(f"    сообщений в чате: {len(bot.messages) / CHECKOUTS:.0f} на оформление")
+    print(f"    sendMessage: {bot.calls['sendMessage'] / CHECKOUTS:.0f}, "
+          f"editMessageText: {bot.calls['editMessageText'] / CHECKOUTS:.0f} на оформление")
+    return bot
+
+
+async def main():
+    print(f"Оформлений заказа: {CHECKOUTS}, экранов в каждом: {len(FLOW)}")
+    await run(False)
+    await run(True)
+
+    # Панель удалили посреди оформления - следующий экран приходит новым сообщением
+    bot = FakeBot()
+    state = FSMContext(MemoryStorage(), StorageKey(bot_id=1, chat_id=1, user_id=1))
+    message = FakeMessage(bot, 1)
+    sent = await checkout_panel.send(message, state, "корзина")
+    bot.messages.discard(sent.message_id)
+    await checkout_panel.show(message, state, "даты")
+    await checkout_panel.show(message, state, "время")
+    print(f"  панель удалена: новых сообщений {bot.calls['sendMessage'] - 1}, "
+          f"правок {bot.calls['editMessageText']}, статистика {checkout_panel.PANEL_STATS}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+"""
+Бенчмарк FSM-хранилищ: задержка get_data и update_data у MemoryStorage
+и SqliteFSMStorage (горячий кэш и чтение с диска после вытеснения).
+
+Запуск: python benchmarks/bench_fsm_storage.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+from aiogram.fsm.storage.memory import MemoryStorage  # noqa: E402
+
+from fsm_storage import SqliteFSMStorage  # noqa: E402
+
+USERS = 5_000
+CALLS = 20_000
+CART = {
+    "bouquets": [{"variant": 1, "variant_name": "Микс", "quantity": 15, "count": 1}],
+    "pickup_date": "7 марта",
+    "pickup_time": "12:00",
+}
+
+
+def key(i: int) -> StorageKey:
+    user_id = 100000 + i % USERS
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+async def timed(label: str, coro_factory, calls: int = CALLS) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        await coro_factory(i)
+    per_call_us = (time.perf_counter() - start) / calls * 1_000_000
+    print(f"    {label:<36} {per_call_us:10.1f} мкс/вызов")
+    return per_call_us
+
+
+async def run_storage(label: str, storage):
+    print(f"  {label}:")
+    await timed("update_data", lambda i: storage.update_data(key(i), CART))
+    await timed("get_data", lambda i: storage.get_data(key(i)))
+
+
+async def main():
+    await run_storage("MemoryStorage", MemoryStorage())
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = os.path.join(data_dir, "fsm.sqlite3")
+        storage = SqliteFSMStorage(path, cache_size=USERS)
+        await run_storage(f"SqliteFSMStorage (кэш {USERS})", storage)
+        await storage.close()
+        print(f"    записей на диск: {storage.stats['rows_written']}, транзакций: {storage.stats['flushes']}")
+
+        # Кэш меньше числа чатов: часть чтений идёт в SQLite
+        cold = SqliteFSMStorage(path + ".cold", cache_size=USERS // 10)
+        await run_storage(f"SqliteFSMStorage (кэш {USERS // 10})", cold)
+        await cold.close()
+        print(f"    промахов кэша: {cold.stats['misses']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+"""
+Бенчмарк остатков в штуках: сотни покупателей одновременно берут
+последние букеты одного варианта.
+
+Каждый покупатель кладёт в корзину 1-2 букета, думает (await) и
+подтверждает заказ, который сохраняется в настоящий Database (JSON во
+временной папке). Сравниваются:
+  - проверка без брони: остаток считается по сохранённым заказам при
+    выборе и при подтверждении, между проверкой и сохранением есть await;
+  - Inventory: бронь корзины при выборе и повторная бронь при
+    подтверждении, заказ переводит бронь в проданное (add_order_listener).
+
+Печатает, сколько букетов продано при лимите, и проверяет, что
+закончившийся вариант выключился в stock.json.
+
+Запуск: python benchmarks/bench_inventory.py
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, add_order_listener  # noqa: E402
+from inventory import Inventory  # noqa: E402
+
+CUSTOMERS = 500
+LIMIT = 40
+VARIANT = 3
+
+
+def order_data(user_id: int, bouquets: list) -> dict:
+    return {
+        "user_id": user_id,
+        "first_name": "Иван",
+        "last_name": "Иванов",
+        "bouquets": bouquets,
+        "pickup_date": "7 марта",
+        "pickup_time": "12:00",
+        "total_price": 1800 * bouquets[0]["count"],
+        "status": "pending_payment",
+    }
+
+
+def cart(rng: random.Random) -> list:
+    return [{"variant": VARIANT, "variant_name": "Жёлтый", "quantity": 15, "count": rng.choice((1, 2))}]
+
+
+async def think(rng: random.Random):
+    await asyncio.sleep(rng.uniform(0, 0.05))
+
+
+async def sold(db: Database) -> int:
+    return sum(
+        bouquet["count"]
+        for order in (await db.get_all_orders()).values()
+        for bouquet in order["bouquets"]
+        if bouquet["variant"] == VARIANT
+    )
+
+
+async def checkout_unlocked(db: Database, user_id: int, rng: random.Random) -> bool:
+    """Без брони: остаток по сохранённым заказам, потом await и сохранение"""
+    bouquets = cart(rng)
+    if await sold(db) + bouquets[0]["count"] > LIMIT:
+        return False
+    await think(rng)  # ввод имени и телефона
+    if await sold(db) + bouquets[0]["count"] > LIMIT:
+        return False
+    await think(rng)  # сохранение пользователя перед заказом
+    await db.save_order(order_data(user_id, bouquets))
+    return True
+
+
+async def checkout_held(db: Database, inventory: Inventory, user_id: int, rng: random.Random) -> bool:
+    """С бронью корзины: букеты закрепляются при выборе и ещё раз перед сохранением"""
+    bouquets = cart(rng)
+    if inventory.hold_cart(user_id, bouquets) is not None:
+        return False
+    await think(rng)
+    if inventory.hold_cart(user_id, bouquets) is not None:
+        return False
+    await think(rng)
+    await db.save_order(order_data(user_id, bouquets))
+    return True
+
+
+async def run(label: str, checkout, db: Database):
+    rng = random.Random(7)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(checkout(db, 100000 + i, rng) for i in range(CUSTOMERS)))
+    elapsed = time.perf_counter() - started
+    total = await sold(db)
+    print(f"  {label}:")
+    print(f"    заказов: {sum(results)}, отказов: {results.count(False)}")
+    print(f"    продано букетов: {total} при остатке {LIMIT}{' - ПЕРЕПРОДАЖА' if total > LIMIT else ''}")
+    print(f"    время: {elapsed:.2f} с")
+    return total
+
+
+async def main():
+    print(f"Покупателей: {CUSTOMERS}, остаток варианта №{VARIANT}: {LIMIT}")
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        await run("проверка без брони", checkout_unlocked, Database(data_dir))
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        db = Database(data_dir)
+        inventory = Inventory()
+        await inventory.load(db)
+        add_order_listener(inventory.on_order_changed)
+        await inventory.set_count(VARIANT, LIMIT)
+        total = await run(
+            "Inventory (бронь корзины)", lambda db, user_id, rng: checkout_held(db, inventory, user_id, rng), db
+        )
+        await inventory.wait_switches()
+        stock = await db.get_stock_status()
+        print(f"    вариант №{VARIANT} в stock.json: {'включен' if stock[str(VARIANT)] else 'выключен'}")
+        print(f"    статистика: {inventory.stats}")
+        assert total <= LIMIT, "перепродажа"
+
+        # После перезапуска остаток восстанавливается по заказам
+        restarted = Inventory()
+        await restarted.load(db)
+        print(f"    после перезапуска осталось: {restarted.remaining(str(VARIANT))}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""
+Бенчмарк кэша заказов: задержка одного вызова Database при 1k, 10k и 100k заказов.
+
+Сравнивает старую схему (чтение и разбор orders.json на каждый вызов)
+с кэшем OrdersCache.
+
+Запуск: python benchmarks/bench_orders_cache.py
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database  # noqa: E402
+
+SIZES = [1_000, 10_000, 100_000]
+CALLS = 50
+
+
+def make_orders(count: int) -> dict:
+    orders = {}
+    for i in range(1, count + 1):
+        number = f"{i:03d}"
+        orders[number] = {
+            "user_id": 100000 + i % 500,
+            "first_name": "Иван",
+            "last_name": "Иванов",
+            "username": "ivan",
+            "bouquets": [{"variant": i % 6 + 1, "variant_name": "Микс", "quantity": 15, "count": 1}],
+            "pickup_date": "7 марта",
+            "pickup_time": "12:00",
+            "total_price": 1800,
+            "status": "paid" if i % 3 else "pending_payment",
+            "order_number": number,
+            "created_at": "2026-03-01T12:00:00",
+        }
+    return orders
+
+
+async def uncached_get_order(path: str, order_number: str):
+    """Старое поведение: полное чтение и разбор файла на каждый вызов"""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.loads(f.read()).get(order_number)
+
+
+async def timed(label: str, coro_factory, calls: int = CALLS) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        await coro_factory(i)
+    per_call_ms = (time.perf_counter() - start) / calls * 1000
+    print(f"    {label:<32} {per_call_ms:10.3f} мс/вызов")
+    return per_call_ms
+
+
+async def run_size(count: int):
+    with tempfile.TemporaryDirectory() as data_dir:
+        orders = make_orders(count)
+        with open(os.path.join(data_dir, "orders.json"), "w", encoding="utf-8") as f:
+            json.dump(orders, f, ensure_ascii=False, indent=2)
+        db = Database(data_dir)
+        numbers = list(orders.keys())
+
+        print(f"  {count} заказов:")
+        await timed("get_order (без кэша)", lambda i: uncached_get_order(db.orders_file, numbers[i]))
+        await db.get_order(numbers[0])  # прогрев кэша
+        await timed("get_order", lambda i: db.get_order(numbers[i]))
+        await timed("get_user_orders", lambda i: db.get_user_orders(100000 + i))
+        await timed("get_all_orders", lambda i: db.get_all_orders(), calls=5)
+        await timed(
+            "update_order_status",
+            lambda i: db.update_order_status(numbers[i], "paid"),
+            calls=5,
+        )
+
+
+async def main():
+    for count in SIZES:
+        await run_size(count)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
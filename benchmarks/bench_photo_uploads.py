@@ -0,0 +1,106 @@
+"""
+Бенчмарк загрузки фотографий каталога: сколько байт уходит в Telegram
+за одно оформление заказа (/start, каталог, выбор букета) без кэша file_id
+и с ним.
+
+Telegram имитируется: поддельное сообщение считает байты загружаемых
+файлов и возвращает новый file_id на каждую загрузку.
+
+Запуск: python benchmarks/bench_photo_uploads.py
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aiogram.types import FSInputFile  # noqa: E402
+
+from photo_cache import PhotoCache  # noqa: E402
+
+CHECKOUTS = 50
+
+
+class FakeMessage:
+    def __init__(self):
+        self.bytes_uploaded = 0
+        self._uploads = 0
+
+    def _sent(self, media):
+        if isinstance(media, FSInputFile):
+            self.bytes_uploaded += os.path.getsize(media.path)
+            self._uploads += 1
+            media = f"file-{self._uploads}"
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=media)])
+
+    async def answer_photo(self, photo, **kwargs):
+        return self._sent(photo)
+
+    async def answer_media_group(self, media, **kwargs):
+        return [self._sent(item.media) for item in media]
+
+
+def prepare_photos(data_dir: str):
+    """Фото из data/; фото вариантов (data/photos не в git) заменяем копиями colors.jpg"""
+    colors = os.path.join(data_dir, "colors.jpg")
+    shutil.copy(os.path.join(ROOT, "data", "colors.jpg"), colors)
+    quantity = []
+    for name in ("15.jpg", "25.jpg"):
+        quantity.append(os.path.join(data_dir, name))
+        shutil.copy(os.path.join(ROOT, "data", name), quantity[-1])
+    variants = []
+    for i in range(1, 7):
+        variants.append(os.path.join(data_dir, f"variant_{i}.jpg"))
+        shutil.copy(colors, variants[-1])
+    return colors, variants, quantity
+
+
+async def checkout_uncached(message: FakeMessage, colors, variants, quantity):
+    await message.answer_photo(FSInputFile(colors))  # /start
+    await message.answer_photo(FSInputFile(colors))  # каталог
+    await message.answer_media_group([SimpleNamespace(media=FSInputFile(p)) for p in variants])
+    await message.answer_media_group([SimpleNamespace(media=FSInputFile(p)) for p in quantity])
+
+
+async def checkout_cached(cache: PhotoCache, message: FakeMessage, colors, variants, quantity):
+    await cache.answer_photo(message, colors)
+    await cache.answer_photo(message, colors)
+    await cache.answer_media_group(message, variants)
+    await cache.answer_media_group(message, quantity)
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as data_dir:
+        photos = prepare_photos(data_dir)
+
+        message = FakeMessage()
+        for _ in range(CHECKOUTS):
+            await checkout_uncached(message, *photos)
+        before = message.bytes_uploaded / CHECKOUTS
+
+        cache = PhotoCache(os.path.join(data_dir, "file_ids.json"))
+        message = FakeMessage()
+        await checkout_cached(cache, message, *photos)
+        first = message.bytes_uploaded
+        for _ in range(CHECKOUTS - 1):
+            await checkout_cached(cache, message, *photos)
+        after = message.bytes_uploaded / CHECKOUTS
+
+        # После перезапуска кэш читается с диска - загрузок нет
+        restarted = PhotoCache(cache.path)
+        message = FakeMessage()
+        await checkout_cached(restarted, message, *photos)
+
+        print(f"Оформлений заказа: {CHECKOUTS}")
+        print(f"  без кэша file_id:   {before / 1024:8.1f} КБ на оформление")
+        print(f"  с кэшем file_id:    {after / 1024:8.1f} КБ на оформление (первое - {first / 1024:.1f} КБ, дальше 0)")
+        print(f"  после перезапуска:  {message.bytes_uploaded / 1024:8.1f} КБ")
+        print(f"  статистика кэша: {cache.stats}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+"""
+Бенчмарк вместимости слотов самовывоза: сотни одновременных оформлений
+заказа на несколько популярных часов.
+
+Каждый покупатель выбирает время, думает (await), вводит данные и
+подтверждает заказ, который сохраняется в настоящий Database (JSON во
+временной папке). Сравниваются:
+  - проверка без брони: "есть ли место" при выборе времени и при
+    подтверждении, между проверкой и сохранением есть await;
+  - PickupSlots: бронь при выборе времени и повторная бронь при
+    подтверждении, заказ снимает бронь через add_order_listener.
+
+Печатает, сколько слотов оказались переполнены, сколько заказов принято
+и сколько отказов получили покупатели.
+
+Запуск: python benchmarks/bench_pickup_slots.py
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, add_order_listener  # noqa: E402
+from pickup_slots import PickupSlots  # noqa: E402
+
+CUSTOMERS = 500
+CAPACITY = 5
+DATE = "7 марта"
+HOURS = [f"{hour:02d}:00" for hour in range(10, 16)]  # 6 часов x 5 мест = 30 заказов
+
+
+def order_data(user_id: int, hour: str) -> dict:
+    return {
+        "user_id": user_id,
+        "first_name": "Иван",
+        "last_name": "Иванов",
+        "bouquets": [{"variant": 1, "variant_name": "Микс", "quantity": 15, "count": 1}],
+        "pickup_date": DATE,
+        "pickup_time": hour,
+        "total_price": 1800,
+        "status": "pending_payment",
+    }
+
+
+async def think(rng: random.Random):
+    await asyncio.sleep(rng.uniform(0, 0.05))
+
+
+async def checkout_unlocked(db: Database, booked: Counter, user_id: int, rng: random.Random) -> bool:
+    """Без брони: проверка занятости по счётчику заказов, потом await и сохранение"""
+    free = [hour for hour in HOURS if booked[hour] < CAPACITY]
+    if not free:
+        return False
+    hour = rng.choice(free)
+    await think(rng)  # ввод имени и телефона
+    if booked[hour] >= CAPACITY:
+        return False
+    await think(rng)  # сохранение пользователя перед заказом
+    await db.save_order(order_data(user_id, hour))
+    booked[hour] += 1
+    return True
+
+
+async def checkout_held(db: Database, slots: PickupSlots, user_id: int, rng: random.Random) -> bool:
+    """С бронью: место закрепляется при выборе времени и подтверждается перед сохранением"""
+    free = [hour for hour in HOURS if not slots.is_full((DATE, hour))]
+    if not free:
+        return False
+    hour = rng.choice(free)
+    if not slots.hold(user_id, (DATE, hour)):
+        return False
+    await think(rng)
+    if not slots.hold(user_id, (DATE, hour)):
+        return False
+    await think(rng)
+    await db.save_order(order_data(user_id, hour))
+    return True
+
+
+async def run(label: str, checkout):
+    with tempfile.TemporaryDirectory() as data_dir:
+        db = Database(data_dir)
+        rng = random.Random(7)
+        started = time.perf_counter()
+        results = await asyncio.gather(*(checkout(db, 100000 + i, rng) for i in range(CUSTOMERS)))
+        elapsed = time.perf_counter() - started
+        per_hour = Counter(order["pickup_time"] for order in (await db.get_all_orders()).values())
+        overbooked = {hour: count for hour, count in per_hour.items() if count > CAPACITY}
+        print(f"  {label}:")
+        print(f"    принято заказов: {sum(results)} (мест {len(HOURS) * CAPACITY}), отказов: {results.count(False)}")
+        print(f"    переполнено слотов: {len(overbooked)} {dict(sorted(overbooked.items()))}")
+        print(f"    время: {elapsed:.2f} с")
+        return overbooked
+
+
+async def main():
+    print(f"Покупателей: {CUSTOMERS}, часов: {len(HOURS)}, мест в часе: {CAPACITY}")
+
+    booked = Counter()
+    await run("проверка без брони", lambda db, user_id, rng: checkout_unlocked(db, booked, user_id, rng))
+
+    slots = PickupSlots(CAPACITY)
+    add_order_listener(slots.on_order_changed)
+    overbooked = await run("PickupSlots (бронь)", lambda db, user_id, rng: checkout_held(db, slots, user_id, rng))
+    print(f"    статистика: {slots.stats}")
+    assert not overbooked, "слоты переполнены"
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
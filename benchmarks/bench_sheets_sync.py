@@ -0,0 +1,140 @@
+"""
+Бенчмарк синхронизации с Google Sheets на поддельном листе (fake_sheets).
+
+Имитирует пик продаж: ORDERS оплат приходят со скоростью ARRIVAL_RATE в секунду,
+часть заказов сразу отменяется. Очередь SheetsSync разбирается в фоне через
+настоящий GoogleSheets (квоты, повторы, пакетная запись); лист отвечает
+с задержкой LATENCY и иногда возвращает 429. Для каждого режима очереди
+печатаются пропускная способность, задержка от постановки события в очередь
+до записи в лист (p50/p99) и число запросов к API по всем листам, включая сводку.
+
+Квота и пауза повтора уменьшены в SCALE раз против настоящих, чтобы прогон
+занимал секунды, а не минуты.
+
+Запуск: python benchmarks/bench_sheets_sync.py
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ORDERS = 200
+ARRIVAL_RATE = 50.0  # оплат в секунду
+CANCEL_SHARE = 0.2
+LATENCY = 0.05
+QUOTA_ERROR_RATE = 0.02
+SCALE = 10
+# (название, окно сбора пачки в секундах, размер пачки)
+MODES = [
+    ("по одному событию", 0.0, 1),
+    ("окно 0.5 с", 0.5, 200),
+    ("окно 2 с", 2.0, 200),
+]
+
+
+def make_order(i: int) -> dict:
+    return {
+        "order_number": f"{i:03d}",
+        "user_id": i,
+        "status": "paid",
+        "pickup_date": "7 марта",
+        "pickup_time": f"{10 + i % 8}:00",
+        "first_name": "Иван",
+        "last_name": "Иванов",
+        "username": f"user{i}",
+        "total_price": 1500,
+        "bouquets": [{"variant": 1 + i % 6, "count": 1, "quantity": 5}],
+    }
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def run(name: str, flush_window: float, max_batch: int, data_dir: str):
+    import google_sheets
+    from fake_sheets import FakeWorksheet, connect_fake
+    from google_sheets import GoogleSheets, SHEETS_STATS
+    from rate_limiter import TokenBucket
+    from sheets_sync import SheetsSync
+
+    google_sheets._read_bucket = TokenBucket.per_minute(60 * SCALE)
+    google_sheets._write_bucket = TokenBucket.per_minute(60 * SCALE)
+    google_sheets.BACKOFF_BASE = 1.0 / SCALE
+    for key in SHEETS_STATS:
+        SHEETS_STATS[key] = 0
+
+    worksheet = FakeWorksheet(latency=LATENCY, quota_error_rate=QUOTA_ERROR_RATE, seed=1)
+    sheets = connect_fake(GoogleSheets(), worksheet)
+    sheets._init_headers()
+    worksheet.stats.update(reads=0, writes=0)
+
+    # Время записи каждого события в лист
+    applied = {}
+    apply_changes = sheets.apply_changes
+
+    def timed_apply(changes):
+        apply_changes(changes)
+        now = time.perf_counter()
+        for change in changes:
+            applied[(change["order_number"], change["action"])] = now
+
+    sheets.apply_changes = timed_apply
+
+    sync = SheetsSync(
+        os.path.join(data_dir, f"sync_{max_batch}_{flush_window}.sqlite3"),
+        flush_window=flush_window,
+        max_batch=max_batch,
+        sheets=sheets
+    )
+    worker = asyncio.create_task(sync.run())
+
+    rnd = random.Random(1)
+    enqueued = {}
+    start = time.perf_counter()
+    for i in range(1, ORDERS + 1):
+        order = make_order(i)
+        await sync.add_order(order)
+        enqueued[(order["order_number"], "add")] = time.perf_counter()
+        if rnd.random() < CANCEL_SHARE:
+            await sync.update_order_status(order["order_number"], "cancelled", order={**order, "status": "cancelled"})
+            enqueued[(order["order_number"], "status")] = time.perf_counter()
+        await asyncio.sleep(1 / ARRIVAL_RATE)
+
+    while len(applied) < len(enqueued):
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    worker.cancel()
+
+    lags = [applied[key] - enqueued[key] for key in enqueued]
+    # Запросы ко всем листам таблицы (заказы и сводка)
+    totals = {key: sum(ws.stats[key] for ws in sheets.sheet.worksheets.values()) for key in worksheet.stats}
+    print(
+        f"  {name:<18} {len(enqueued) / elapsed:6.1f} событий/с   "
+        f"p50 {statistics.median(lags) * 1000:7.0f} мс   p99 {percentile(lags, 0.99) * 1000:7.0f} мс   "
+        f"записей: {totals['writes']:>4}   чтений: {totals['reads']:>4}   "
+        f"429: {totals['quota_errors']:>3}   пачек: {sync.stats['batches']:>4}"
+    )
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ["EVENT_LOG_PATH"] = os.path.join(data_dir, "events.ndjson")
+        os.environ["GOOGLE_SHEET_ID"] = "bench"
+        print(
+            f"Оплат: {ORDERS} ({ARRIVAL_RATE:g}/с), отмен: ~{CANCEL_SHARE:.0%}, задержка листа {LATENCY * 1000:.0f} мс, "
+            f"429: {QUOTA_ERROR_RATE:.0%} запросов, квота {60 * SCALE} запросов/мин"
+        )
+        for name, flush_window, max_batch in MODES:
+            await run(name, flush_window, max_batch, data_dir)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+Бенчмарк запуска: сколько времени и обращений к Google API уходит
+на импорт обработчиков и подготовку Google Sheets до начала polling.
+
+Сеть имитируется: авторизация и каждый запрос к таблице занимают LATENCY секунд.
+
+Запуск: python benchmarks/bench_startup.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+LATENCY = 0.3
+CALLS = {"authorize": 0, "requests": 0}
+
+
+class FakeWorksheet:
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            CALLS["requests"] += 1
+            time.sleep(LATENCY)
+            if name in ("get_all_values", "get", "batch_get", "col_values"):
+                return []
+            return {}
+        return call
+
+
+class FakeSheet:
+    def worksheet(self, name):
+        CALLS["requests"] += 1
+        time.sleep(LATENCY)
+        return FakeWorksheet()
+
+
+class FakeClient:
+    def open_by_key(self, key):
+        CALLS["requests"] += 1
+        time.sleep(LATENCY)
+        return FakeSheet()
+
+
+def fake_authorize(creds):
+    CALLS["authorize"] += 1
+    time.sleep(LATENCY)
+    return FakeClient()
+
+
+def main():
+    credentials = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
+    credentials.close()
+    os.environ["GOOGLE_SHEETS_CREDENTIALS_PATH"] = credentials.name
+    os.environ["GOOGLE_SHEET_ID"] = "bench"
+    data_dir = tempfile.mkdtemp()
+    os.environ["SQLITE_PATH"] = os.path.join(data_dir, "bot.sqlite3")
+    os.environ["SHEETS_SYNC_PATH"] = os.path.join(data_dir, "sheets_sync.sqlite3")
+    os.chdir(data_dir)
+
+    import google_sheets
+    google_sheets.Credentials.from_service_account_file = staticmethod(lambda *a, **k: object())
+    google_sheets.gspread.authorize = fake_authorize
+
+    start = time.perf_counter()
+    import handlers.common, handlers.order, handlers.payment, handlers.cancellation, handlers.admin  # noqa: F401,E401
+    import main as bot_main
+    imported = time.perf_counter()
+    # main() запускает init_google_sheets в фоновом потоке, polling его не ждёт
+    bot_main.init_google_sheets()
+    ready = time.perf_counter()
+
+    print(f"Задержка сети (имитация): {LATENCY * 1000:.0f} мс на запрос")
+    print(f"  до начала polling (импорт):        {(imported - start) * 1000:8.0f} мс")
+    print(f"  подготовка Google Sheets (в фоне): {(ready - imported) * 1000:8.0f} мс")
+    print(f"  авторизаций: {CALLS['authorize']}, запросов к таблице: {CALLS['requests']}")
+    os.remove(credentials.name)
+
+
+if __name__ == "__main__":
+    main()
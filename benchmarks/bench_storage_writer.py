@@ -0,0 +1,66 @@
+"""
+Бенчмарк единственного писателя с групповой фиксацией.
+
+Пропускная способность update_order_status при 1, 10 и 100 конкурентных
+писателях: сколько изменений в секунду и сколько изменений приходится
+на одну запись (fsync) журнала.
+
+Запуск: python benchmarks/bench_storage_writer.py
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, get_storage  # noqa: E402
+
+ORDERS = 10_000
+UPDATES_PER_RUN = 2_000
+CONCURRENCY = [1, 10, 100]
+WINDOWS_MS = [0, 2, 5]
+
+
+async def writer(db: Database, numbers, updates: int, offset: int):
+    for i in range(updates):
+        await db.update_order_status(numbers[(offset + i) % len(numbers)], "paid", touched=i)
+
+
+async def run(concurrency: int, window_ms: float):
+    with tempfile.TemporaryDirectory() as data_dir:
+        orders = {
+            f"{i:03d}": {"order_number": f"{i:03d}", "user_id": i % 500, "status": "pending_payment"}
+            for i in range(1, ORDERS + 1)
+        }
+        with open(os.path.join(data_dir, "orders.json"), "w", encoding="utf-8") as f:
+            json.dump(orders, f)
+        db = Database(data_dir, commit_window=window_ms / 1000)
+        storage = get_storage(data_dir)
+        numbers = list(orders.keys())
+        await db.get_order(numbers[0])  # прогрев кэша
+
+        per_writer = UPDATES_PER_RUN // concurrency
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            writer(db, numbers, per_writer, w * per_writer) for w in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - start
+        total = per_writer * concurrency
+        print(
+            f"  окно {window_ms:g} мс, писателей: {concurrency:>3}   {total / elapsed:10.0f} изменений/с   "
+            f"пачек: {storage.stats['batches']:>5}   "
+            f"изменений на пачку: {storage.stats['mutations'] / storage.stats['batches']:6.1f}"
+        )
+
+
+async def main():
+    for window_ms in WINDOWS_MS:
+        for concurrency in CONCURRENCY:
+            await run(concurrency, window_ms)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+"""
+Коллаж каталога (CATALOG_MODE=collage).
+
+Все варианты букетов собираются Pillow в одну картинку 3x2 с подписями;
+варианты, выключенные в остатках, показываются серыми с пометкой
+«нет в наличии». Каталог тогда уходит одним сообщением: коллаж с подписью
+и клавиатурой. Коллаж зависит только от фотографий и остатков, поэтому
+рендерится один раз на каждое их состояние: имя файла - хэш остатков
+и содержимого фото. Повторная отправка идёт по file_id (photo_cache).
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+from PIL import Image, ImageDraw, ImageEnhance, ImageFont, ImageOps
+
+from config import Config
+from photo_cache import get_photo_cache
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = 3
+CELL = 420  # сторона ячейки, пикселей
+LABEL_HEIGHT = 56
+PADDING = 8
+FONT_PATHS = (
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "DejaVuSans-Bold.ttf",
+)
+_render_lock = threading.Lock()
+
+
+def _font(size: int):
+    """Шрифт с кириллицей; без него подписи будут только номерами"""
+    for path in (Config.CATALOG_FONT_PATH, *FONT_PATHS):
+        if not path:
+            continue
+        try:
+            return ImageFont.truetype(path, size), True
+        except OSError:
+            continue
+    return ImageFont.load_default(), False
+
+
+def collage_key(stock: Dict[str, bool]) -> str:
+    """Хэш всего, от чего зависит картинка: остатков, фотографий и раскладки"""
+    photo_cache = get_photo_cache()
+    state = {"stock": {}, "photos": {}, "layout": [COLUMNS, CELL, LABEL_HEIGHT]}
+    for variant_num, variant in Config.BOUQUET_VARIANTS.items():
+        state["stock"][variant_num] = bool(stock.get(str(variant_num), True))
+        path = variant["photo"]
+        state["photos"][variant_num] = photo_cache.content_hash(path) if os.path.exists(path) else None
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def render_collage(stock: Dict[str, bool], path: str):
+    """Нарисовать коллаж вариантов и сохранить в path (JPEG)"""
+    variants = sorted(Config.BOUQUET_VARIANTS.items())
+    rows = (len(variants) + COLUMNS - 1) // COLUMNS
+    width = COLUMNS * CELL + (COLUMNS + 1) * PADDING
+    height = rows * (CELL + LABEL_HEIGHT) + (rows + 1) * PADDING
+    canvas = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(canvas)
+    font, cyrillic = _font(26)
+    badge_font, _ = _font(30)
+
+    for index, (variant_num, variant) in enumerate(variants):
+        x = PADDING + (index % COLUMNS) * (CELL + PADDING)
+        y = PADDING + (index // COLUMNS) * (CELL + LABEL_HEIGHT + PADDING)
+        available = stock.get(str(variant_num), True)
+
+        if os.path.exists(variant["photo"]):
+            with Image.open(variant["photo"]) as photo:
+                tile = ImageOps.fit(ImageOps.exif_transpose(photo).convert("RGB"), (CELL, CELL), Image.LANCZOS)
+        else:
+            tile = Image.new("RGB", (CELL, CELL), (235, 235, 235))
+        if not available:
+            tile = ImageEnhance.Brightness(ImageOps.grayscale(tile).convert("RGB")).enhance(0.6)
+        canvas.paste(tile, (x, y))
+
+        label = f"{variant_num}. {variant['name']}" if cyrillic else str(variant_num)
+        label_font = font
+        if cyrillic:
+            # Длинные названия уменьшаем, чтобы поместились в ячейку
+            size = 26
+            while size > 14 and label_font.getlength(label) > CELL - 2 * PADDING:
+                size -= 2
+                label_font, _ = _font(size)
+        draw.rectangle((x, y + CELL, x + CELL, y + CELL + LABEL_HEIGHT), fill=(245, 245, 245))
+        draw.text((x + CELL // 2, y + CELL + LABEL_HEIGHT // 2), label, font=label_font,
+                  fill=(60, 60, 60) if available else (150, 150, 150), anchor="mm")
+        if not available:
+            badge = "нет в наличии" if cyrillic else "X"
+            draw.text((x + CELL // 2, y + CELL // 2), badge, font=badge_font, fill="white", anchor="mm",
+                      stroke_width=2, stroke_fill=(80, 80, 80))
+
+    tmp_path = f"{path}.tmp"
+    canvas.save(tmp_path, "JPEG", quality=Config.PHOTO_JPEG_QUALITY, progressive=True, optimize=True)
+    os.replace(tmp_path, path)
+
+
+def catalog_collage(stock: Dict[str, bool]) -> Optional[str]:
+    """Путь к коллажу для текущих остатков (рендерится при первом обращении); None - нет ни одного фото"""
+    if not any(os.path.exists(variant["photo"]) for variant in Config.BOUQUET_VARIANTS.values()):
+        return None
+    key = collage_key(stock)
+    path = os.path.join(Config.CATALOG_COLLAGE_DIR, f"catalog_{key[:16]}.jpg")
+    if os.path.exists(path):
+        return path
+    with _render_lock:
+        if not os.path.exists(path):
+            _render_new(stock, path)
+    return path
+
+
+def _render_new(stock: Dict[str, bool], path: str):
+    os.makedirs(Config.CATALOG_COLLAGE_DIR, exist_ok=True)
+    render_collage(stock, path)
+    logger.info(f"Нарисован коллаж каталога {path}")
+    # Коллажи для старых состояний остатков больше не понадобятся (кроме недавних - остатки переключают туда-обратно)
+    collages = sorted(
+        (os.path.join(Config.CATALOG_COLLAGE_DIR, name) for name in os.listdir(Config.CATALOG_COLLAGE_DIR)
+         if name.startswith("catalog_") and name.endswith(".jpg")),
+        key=os.path.getmtime,
+        reverse=True
+    )
+    for old in collages[Config.CATALOG_COLLAGE_KEEP:]:
+        os.remove(old)
@@ -0,0 +1,69 @@
+"""
+Оформление заказа в одном сообщении (CHECKOUT_PANEL=1).
+
+Для каждого чата запоминается одно сообщение-«панель» (его id лежит в
+данных FSM, ключ panel_message_id). Экраны оформления - выбор ещё
+букетов, даты и времени, подтверждение, редактирование заказа - не
+присылаются новыми сообщениями, а заменяют текст и кнопки панели через
+editMessageText. Новое сообщение отправляется, только если панели нет:
+её удалили, она старше 48 часов или это не текстовое сообщение.
+
+После фотографий (каталог, размеры букетов) и после сообщений самого
+покупателя (имя, телефон) панель отправляется заново, чтобы экран
+оставался внизу чата. Без CHECKOUT_PANEL всё отправляется новыми
+сообщениями, как раньше.
+"""
+import logging
+from typing import Optional
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.fsm.context import FSMContext
+from aiogram.types import InlineKeyboardMarkup, Message
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+PANEL_KEY = "panel_message_id"
+
+# Счётчики для статистики администратора
+PANEL_STATS = {"edits": 0, "sends": 0, "fallbacks": 0}
+
+
+async def show(message: Message, state: FSMContext, text: str,
+               reply_markup: Optional[InlineKeyboardMarkup] = None) -> Optional[Message]:
+    """Показать экран оформления: заменить содержимое панели или, если её нет, прислать новую"""
+    if not Config.CHECKOUT_PANEL:
+        return await message.answer(text, reply_markup=reply_markup)
+
+    panel_id = (await state.get_data()).get(PANEL_KEY)
+    if panel_id:
+        try:
+            await message.bot.edit_message_text(
+                text, chat_id=message.chat.id, message_id=panel_id, reply_markup=reply_markup
+            )
+            PANEL_STATS["edits"] += 1
+            return None
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                return None
+            # Панель удалена, слишком старая или не текстовая - отправляем новую
+            logger.info(f"Панель оформления {panel_id} в чате {message.chat.id} недоступна: {e}")
+            PANEL_STATS["fallbacks"] += 1
+    return await send(message, state, text, reply_markup)
+
+
+async def send(message: Message, state: FSMContext, text: str,
+               reply_markup: Optional[InlineKeyboardMarkup] = None) -> Message:
+    """Прислать экран новым сообщением; в режиме панели оно становится панелью"""
+    sent = await message.answer(text, reply_markup=reply_markup)
+    if Config.CHECKOUT_PANEL:
+        PANEL_STATS["sends"] += 1
+        await state.update_data(**{PANEL_KEY: sent.message_id})
+    return sent
+
+
+async def forget(state: FSMContext):
+    """Следующий экран отправить новым сообщением (после фотографий панель оказалась выше них)"""
+    if Config.CHECKOUT_PANEL:
+        await state.update_data(**{PANEL_KEY: None})
@@ -14,7 +14,64 @@ class Config:
     GOOGLE_SHEETS_CREDENTIALS_PATH = os.getenv("GOOGLE_SHEETS_CREDENTIALS_PATH", "credentials/service_account.json")
     GOOGLE_SHEET_ID = os.getenv("GOOGLE_SHEET_ID")
     GOOGLE_WORKSHEET_NAME = os.getenv("GOOGLE_WORKSHEET_NAME", "Заказы")
+    # Лист сводки по датам и вариантам (пусто - не вести)
+    GOOGLE_SUMMARY_WORKSHEET_NAME = os.getenv("GOOGLE_SUMMARY_WORKSHEET_NAME", "Сводка")
     
+    # Кэш file_id фотографий каталога (повторно фото не загружаются)
+    PHOTO_CACHE_PATH = os.getenv("PHOTO_CACHE_PATH", "data/file_ids.json")
+    # Подготовка фото каталога: уменьшение, прогрессивный JPEG, без EXIF
+    PHOTO_OPTIMIZE = os.getenv("PHOTO_OPTIMIZE", "1").lower() in ("1", "true", "yes")
+    PHOTO_OPTIMIZED_DIR = os.getenv("PHOTO_OPTIMIZED_DIR", "data/optimized")
+    PHOTO_MAX_SIDE = int(os.getenv("PHOTO_MAX_SIDE", "1280"))
+    PHOTO_JPEG_QUALITY = int(os.getenv("PHOTO_JPEG_QUALITY", "85"))
+    # Оформление заказа в одном сообщении: экраны заменяют друг друга через editMessageText
+    CHECKOUT_PANEL = os.getenv("CHECKOUT_PANEL", "0").lower() in ("1", "true", "yes")
+    # Каталог: "photos" (фото цветов + альбом + кнопки) или "collage" (один коллаж с кнопками)
+    CATALOG_MODE = os.getenv("CATALOG_MODE", "photos").lower()
+    CATALOG_COLLAGE_DIR = os.getenv("CATALOG_COLLAGE_DIR", "data/collages")
+    CATALOG_COLLAGE_KEEP = int(os.getenv("CATALOG_COLLAGE_KEEP", "16"))
+    CATALOG_FONT_PATH = os.getenv("CATALOG_FONT_PATH", "")
+    
+    # Storage: "json" (файлы в data/) или "sqlite"
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json").lower()
+    SQLITE_PATH = os.getenv("SQLITE_PATH", "data/bot.sqlite3")
+    # Окно групповой фиксации изменений (мс): сколько ждать попутчиков, если в очереди уже есть записи
+    STORAGE_COMMIT_WINDOW_MS = float(os.getenv("STORAGE_COMMIT_WINDOW_MS", "0"))
+    # Как часто сворачивать журнал заказов в снимок (секунды)
+    ORDERS_COMPACT_INTERVAL = int(os.getenv("ORDERS_COMPACT_INTERVAL", "300"))
+    
+    # FSM (корзины и незавершённые оформления): "sqlite" переживает перезапуск, "memory" - нет
+    FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite").lower()
+    FSM_SQLITE_PATH = os.getenv("FSM_SQLITE_PATH", "data/fsm.sqlite3")
+    # Сколько активных чатов держать в памяти
+    FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "1000"))
+    # Как часто сбрасывать накопленные изменения FSM на диск (мс)
+    FSM_FLUSH_INTERVAL_MS = float(os.getenv("FSM_FLUSH_INTERVAL_MS", "200"))
+    # Через сколько часов без изменений диалог (корзина, поиск админа и т.п.) считается брошенным
+    FSM_TTL_HOURS = float(os.getenv("FSM_TTL_HOURS", "72"))
+    # Как часто удалять брошенные диалоги (секунды)
+    FSM_SWEEP_INTERVAL = int(os.getenv("FSM_SWEEP_INTERVAL", "3600"))
+    
+    
+    # Очередь синхронизации с Google Sheets
+    SHEETS_SYNC_PATH = os.getenv("SHEETS_SYNC_PATH", "data/sheets_sync.sqlite3")
+    # После стольких неудачных попыток событие откладывается как ошибочное
+    SHEETS_SYNC_MAX_ATTEMPTS = int(os.getenv("SHEETS_SYNC_MAX_ATTEMPTS", "10"))
+    # Как часто сверять таблицу с локальными заказами (секунды, 0 - только вручную из админки)
+    SHEETS_RECONCILE_INTERVAL = int(os.getenv("SHEETS_RECONCILE_INTERVAL", "3600"))
+    # Квоты Sheets API на чтение и запись (запросов в минуту) и число повторов при 429/5xx
+    SHEETS_READS_PER_MINUTE = float(os.getenv("SHEETS_READS_PER_MINUTE", "60"))
+    SHEETS_WRITES_PER_MINUTE = float(os.getenv("SHEETS_WRITES_PER_MINUTE", "60"))
+    SHEETS_MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "5"))
+    # Сколько копить изменения перед отправкой одной пачкой (мс)
+    SHEETS_FLUSH_WINDOW_MS = float(os.getenv("SHEETS_FLUSH_WINDOW_MS", "2000"))
+    
+    # Журнал событий (NDJSON): путь, размер файла до ротации, число архивов
+    # и доля записываемых событий по типам, например "sheets.client_created=0.1"
+    EVENT_LOG_PATH = os.getenv("EVENT_LOG_PATH", "logs/events.ndjson")
+    EVENT_LOG_MAX_BYTES = int(os.getenv("EVENT_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    EVENT_LOG_BACKUPS = int(os.getenv("EVENT_LOG_BACKUPS", "3"))
+    EVENT_LOG_SAMPLING = os.getenv("EVENT_LOG_SAMPLING", "")
     
     # Payment
     PAYMENT_PHONE = os.getenv("PAYMENT_PHONE", "89881664153")
@@ -38,6 +95,16 @@ class Config:
         6: {"name": "Красный + жёлтый", "photo": "data/photos/red_yellow.jpg"},
     }
     
+    # Сколько минут букеты корзины держатся за покупателем (для вариантов с остатком в штуках)
+    CART_HOLD_MINUTES = float(os.getenv("CART_HOLD_MINUTES", "15"))
+    
+    # Вместимость часа самовывоза (заказов на слот; 0 - без ограничения)
+    PICKUP_SLOT_CAPACITY = int(os.getenv("PICKUP_SLOT_CAPACITY", "0"))
+    # Отдельная вместимость: "7 марта 10:00=5; 8 марта=8" (час или все часы даты)
+    PICKUP_SLOT_CAPACITY_OVERRIDES = os.getenv("PICKUP_SLOT_CAPACITY_OVERRIDES", "")
+    # Сколько минут выбранное время держится за покупателем до подтверждения заказа
+    PICKUP_HOLD_MINUTES = float(os.getenv("PICKUP_HOLD_MINUTES", "15"))
+    
     # Pickup times (start and end hours)
     PICKUP_START_HOUR = 8
     PICKUP_END_HOUR = 19
@@ -1,15 +1,455 @@
+import asyncio
 import json
 import os
 import logging
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 from datetime import datetime
 import aiofiles
 
+from order_journal import OrderJournal, apply_records, atomic_write
+
 logger = logging.getLogger(__name__)
 
 
+def _clone(value: Any) -> Any:
+    """Быстрая глубокая копия JSON-данных (dict/list/скаляры)"""
+    if isinstance(value, dict):
+        return {k: _clone(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_clone(v) for v in value]
+    return value
+
+
+def _recover_json_object(content: str) -> Optional[Dict]:
+    """Попытаться вытащить первый целый JSON-объект из повреждённого файла"""
+    content = content.strip()
+    # Ищем первую открывающую скобку
+    start_idx = content.find('{')
+    if start_idx == -1:
+        return None
+    # Пытаемся найти соответствующую закрывающую скобку
+    brace_count = 0
+    for i in range(start_idx, len(content)):
+        if content[i] == '{':
+            brace_count += 1
+        elif content[i] == '}':
+            brace_count -= 1
+            if brace_count == 0:
+                try:
+                    return json.loads(content[start_idx:i + 1])
+                except json.JSONDecodeError:
+                    return None
+    return None
+
+
+def _order_number_value(order_number: str) -> int:
+    return int(order_number) if order_number.isdigit() else 0
+
+
+class OrdersCache:
+    """Общий на процесс кэш заказов: снимок orders.json + журнал изменений.
+    
+    Держит разобранный словарь заказов в памяти и отдаёт чтения из него.
+    Изменения дописываются в журнал (order_journal), а снимок периодически
+    перезаписывается целиком при компактизации. Внешние правки снимка
+    отслеживаются по mtime и размеру.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.journal = OrderJournal(os.path.splitext(path)[0] + ".journal.ndjson")
+        self.lock = asyncio.Lock()
+        self.max_number = 0  # наибольший номер заказа среди снимка и журнала
+        # Вторичный индекс user_id -> [номера заказов]; сохраняется вместе со снимком
+        self.index_path = os.path.join(os.path.dirname(path), "user_orders_index.json")
+        self.user_index: Dict[str, List[str]] = {}
+        self._orders: Optional[Dict[str, Dict]] = None
+        self._signature: Optional[Tuple[int, int]] = None
+        self._writing = False
+    
+    @property
+    def data(self) -> Dict[str, Dict]:
+        """Загруженный словарь заказов (после load)"""
+        return self._orders
+    
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+    
+    async def load(self) -> Dict[str, Dict]:
+        """Получить словарь заказов; перечитывает снимок, только если он изменился"""
+        if self._orders is not None and self._writing:
+            # Снимок сейчас перезаписываем мы сами - содержимое кэша актуальнее
+            return self._orders
+        signature = self._stat()
+        if self._orders is not None and signature == self._signature:
+            return self._orders
+        
+        try:
+            async with aiofiles.open(self.path, "r", encoding="utf-8") as f:
+                content = await f.read()
+            orders = json.loads(content) if content and content.strip() else {}
+        except FileNotFoundError:
+            orders = {}
+        except json.JSONDecodeError as e:
+            logger.error(f"Ошибка парсинга JSON в {self.path}: {e}")
+            if self._orders is not None:
+                return self._orders
+            orders = {}
+        except Exception as e:
+            logger.error(f"Ошибка при чтении {self.path}: {e}", exc_info=True)
+            if self._orders is not None:
+                return self._orders
+            orders = {}
+        
+        self.user_index = await asyncio.to_thread(self._load_user_index, signature, orders)
+        
+        records = await asyncio.to_thread(self.journal.read)
+        replayed = apply_records(orders, records)
+        if replayed:
+            logger.info(f"Из журнала {self.journal.path} восстановлено изменений: {replayed}")
+            for record in records:
+                self._index_order(record["order"])
+        
+        self.max_number = max((_order_number_value(n) for n in orders), default=0)
+        self._orders = orders
+        self._signature = signature
+        return orders
+    
+    def _load_user_index(self, signature: Optional[Tuple[int, int]], orders: Dict[str, Dict]) -> Dict[str, List[str]]:
+        """Прочитать сохранённый индекс, если он построен по этому же снимку, иначе построить заново"""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if signature is not None and saved.get("snapshot") == list(signature):
+                return saved["users"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Индекс {self.index_path} не прочитан ({e}), строим заново")
+        
+        index: Dict[str, List[str]] = {}
+        for order_number, order in orders.items():
+            index.setdefault(str(order.get("user_id")), []).append(order_number)
+        return index
+    
+    def _index_order(self, order: Dict):
+        numbers = self.user_index.setdefault(str(order.get("user_id")), [])
+        if order["order_number"] not in numbers:
+            numbers.append(order["order_number"])
+    
+    def put(self, order: Dict):
+        """Добавить или заменить заказ в памяти (вызывать только из мутации)"""
+        self._orders[order["order_number"]] = order
+        self._index_order(order)
+        self.max_number = max(self.max_number, _order_number_value(order["order_number"]))
+    
+    async def append(self, orders: List[Dict]):
+        """Записать изменённые заказы в журнал (одна пачка - один fsync)"""
+        records = [{"op": "put", "order": order} for order in orders]
+        await asyncio.to_thread(self.journal.append, records)
+    
+    async def compact(self) -> bool:
+        """Свернуть журнал в новый снимок orders.json"""
+        async with self.lock:
+            if self._orders is None or (self.journal.records == 0 and not os.path.exists(self.journal.rotated_path)):
+                return False
+            snapshot = _clone(self._orders)
+            user_index = _clone(self.user_index)
+            await asyncio.to_thread(self.journal.rotate)
+            self._writing = True
+        
+        try:
+            content = await asyncio.to_thread(json.dumps, snapshot, ensure_ascii=False, indent=2)
+            await asyncio.to_thread(atomic_write, self.path, content)
+            await asyncio.to_thread(self.journal.drop_rotated)
+        finally:
+            self._writing = False
+        self._signature = self._stat()
+        
+        # Индекс помечается сигнатурой снимка: если снимок поменяют извне, индекс перестроится
+        index_content = json.dumps({"snapshot": list(self._signature), "users": user_index}, ensure_ascii=False)
+        await asyncio.to_thread(atomic_write, self.index_path, index_content)
+        logger.info(f"Журнал заказов свёрнут в снимок {self.path} ({len(snapshot)} заказов)")
+        return True
+    
+    def invalidate(self):
+        """Сбросить кэш: следующее чтение перечитает снимок и журнал"""
+        self._orders = None
+        self._signature = None
+
+
+class JsonFileCache:
+    """Кэш небольшого JSON-файла (users, stock, stock_counts, order_counter) с атомарной записью"""
+    
+    def __init__(self, path: str, default: Callable[[], Dict]):
+        self.path = path
+        self.default = default
+        self.data: Optional[Dict] = None
+        self._signature: Optional[Tuple[int, int]] = None
+    
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+    
+    async def load(self) -> Dict:
+        """Получить содержимое файла; перечитывает его, только если он изменился"""
+        signature = self._stat()
+        if self.data is not None and signature == self._signature:
+            return self.data
+        
+        content = ""
+        try:
+            async with aiofiles.open(self.path, "r", encoding="utf-8") as f:
+                content = await f.read()
+            data = json.loads(content) if content and content.strip() else self.default()
+        except FileNotFoundError:
+            data = self.default()
+        except json.JSONDecodeError as e:
+            # Файл поврежден - пытаемся восстановить
+            logger.error(f"Ошибка парсинга JSON в {self.path}: {e}. Попытка восстановления...")
+            data = _recover_json_object(content)
+            if data is None:
+                logger.warning(f"Не удалось восстановить {self.path}, используем пустые данные")
+                data = self.default()
+            else:
+                logger.info(f"Файл {self.path} восстановлен")
+        except Exception as e:
+            logger.error(f"Ошибка при чтении {self.path}: {e}", exc_info=True)
+            if self.data is not None:
+                return self.data
+            data = self.default()
+        
+        self.data = data
+        self._signature = signature
+        return data
+    
+    async def write(self):
+        """Атомарно записать текущее содержимое на диск"""
+        content = json.dumps(self.data if self.data is not None else self.default(), ensure_ascii=False, indent=2)
+        await asyncio.to_thread(atomic_write, self.path, content)
+        self._signature = self._stat()
+    
+    def invalidate(self):
+        """Сбросить кэш: следующее чтение перечитает файл"""
+        self.data = None
+        self._signature = None
+
+
+def _default_stock() -> Dict[str, bool]:
+    # По умолчанию все товары доступны
+    return {str(i): True for i in range(1, 7)}
+
+
+class Batch:
+    """Изменения одной групповой фиксации"""
+    
+    def __init__(self):
+        self.orders: Dict[str, Dict] = {}  # изменённые заказы (номер -> заказ)
+        self.files: Set[JsonFileCache] = set()  # файлы, которые нужно перезаписать
+    
+    def put_order(self, order: Dict):
+        self.orders[order["order_number"]] = order
+    
+    def touch(self, cache: JsonFileCache):
+        self.files.add(cache)
+
+
+class Storage:
+    """Файлы данных одного каталога и единственная задача-писатель.
+    
+    Все изменения (заказы, пользователи, остатки, счётчик) ставятся в очередь
+    функциями-мутациями. Писатель применяет к данным в памяти всё, что пришло
+    за окно commit_window, одной пачкой, делает по одной записи на каждый
+    затронутый файл (для заказов - строка журнала на заказ и один fsync)
+    и только после этого разрешает futures вызывающих.
+    """
+    
+    def __init__(self, data_dir: str, commit_window: float = 0.0, max_batch: int = 512):
+        self.data_dir = data_dir
+        self.commit_window = commit_window
+        self.max_batch = max_batch
+        self.orders = OrdersCache(os.path.join(data_dir, "orders.json"))
+        self.users = JsonFileCache(os.path.join(data_dir, "users.json"), dict)
+        self.stock = JsonFileCache(os.path.join(data_dir, "stock.json"), _default_stock)
+        # Лимиты количества по вариантам (inventory.Inventory); нет файла - количество не ограничено
+        self.stock_counts = JsonFileCache(os.path.join(data_dir, "stock_counts.json"), dict)
+        self.counter = JsonFileCache(os.path.join(data_dir, "order_counter.json"), lambda: {"counter": 0})
+        self.stats = {"batches": 0, "mutations": 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    async def load(self):
+        """Убедиться, что все данные загружены и актуальны"""
+        await self.orders.load()
+        for cache in (self.users, self.stock, self.stock_counts, self.counter):
+            await cache.load()
+    
+    def next_order_number(self) -> str:
+        """Увеличить счётчик заказов в памяти (вызывать только из мутации)"""
+        data = self.counter.data
+        # Номера из журнала могут опережать файл счётчика - он пишется при компактизации
+        counter = max(data.get("counter", 0), self.orders.max_number) + 1
+        data["counter"] = counter
+        self.orders.max_number = counter
+        return f"{counter:03d}"
+    
+    async def submit(self, mutation: Callable[[Batch], Any]) -> Any:
+        """Поставить мутацию в очередь и дождаться её надёжной записи"""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+        future = loop.create_future()
+        self._queue.put_nowait((mutation, future))
+        return await future
+    
+    async def _run(self):
+        while True:
+            items = [await self._queue.get()]
+            # Даём отработать остальным готовым корутинам; если есть конкуренты, ждём окно
+            await asyncio.sleep(0)
+            if not self._queue.empty() and self.commit_window > 0:
+                await asyncio.sleep(self.commit_window)
+            while not self._queue.empty() and len(items) < self.max_batch:
+                items.append(self._queue.get_nowait())
+            try:
+                await self._commit(items)
+            except Exception as e:
+                logger.error(f"Ошибка групповой записи в {self.data_dir}: {e}", exc_info=True)
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+    
+    async def _commit(self, items: List[Tuple[Callable[[Batch], Any], asyncio.Future]]):
+        batch = Batch()
+        results = []
+        async with self.orders.lock:
+            await self.load()
+            for mutation, future in items:
+                try:
+                    results.append((future, mutation(batch), None))
+                except Exception as e:
+                    results.append((future, None, e))
+            
+            try:
+                if batch.orders:
+                    await self.orders.append(list(batch.orders.values()))
+                for cache in batch.files:
+                    await cache.write()
+            except Exception:
+                # Состояние в памяти опережает диск - перечитаем его при следующем обращении
+                for cache in (self.orders, self.users, self.stock, self.stock_counts, self.counter):
+                    cache.invalidate()
+                raise
+        
+        self.stats["batches"] += 1
+        self.stats["mutations"] += len(items)
+        for future, result, error in results:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+    
+    async def compact(self) -> bool:
+        """Свернуть журнал заказов в снимок и сохранить счётчик"""
+        if not await self.orders.compact():
+            return False
+        
+        def mutate(batch: Batch):
+            # Номера из журнала могли не пройти через счётчик (например, после перезапуска)
+            data = self.counter.data
+            data["counter"] = max(data.get("counter", 0), self.orders.max_number)
+            batch.touch(self.counter)
+        
+        await self.submit(mutate)
+        return True
+
+
+_storages: Dict[str, Storage] = {}
+
+
+def get_storage(data_dir: str = "data", commit_window: Optional[float] = None) -> Storage:
+    """Хранилище каталога данных (одно на процесс для каждого каталога)"""
+    key = os.path.abspath(data_dir)
+    if key not in _storages:
+        _storages[key] = Storage(data_dir)
+    if commit_window is not None:
+        _storages[key].commit_window = commit_window
+    return _storages[key]
+
+
+# Подписчики на изменения заказов (общие для всех экземпляров Database и SqliteDatabase)
+_order_listeners: List[Callable[[Dict], None]] = []
+
+
+def add_order_listener(listener: Callable[[Dict], None]):
+    """Подписаться на изменения заказов: listener(order) вызывается после записи заказа"""
+    _order_listeners.append(listener)
+
+
+def notify_order_changed(order: Dict):
+    """Сообщить подписчикам о записанном заказе"""
+    for listener in _order_listeners:
+        try:
+            listener(order)
+        except Exception as e:
+            logger.error(f"Ошибка в обработчике изменения заказа {order.get('order_number')}: {e}", exc_info=True)
+
+
+_stock_listeners: List[Callable[[Dict[str, bool]], None]] = []
+
+
+def add_stock_listener(listener: Callable[[Dict[str, bool]], None]):
+    """Подписаться на изменения остатков: listener(stock) вызывается после записи"""
+    _stock_listeners.append(listener)
+
+
+def notify_stock_changed(stock: Dict[str, bool]):
+    """Сообщить подписчикам о новых остатках"""
+    for listener in _stock_listeners:
+        try:
+            listener(dict(stock))
+        except Exception as e:
+            logger.error(f"Ошибка в обработчике изменения остатков: {e}", exc_info=True)
+
+
+def merge_user_data(existing_user: Dict, user_data: Dict) -> Dict:
+    """Объединить сохранённые данные пользователя с новыми, не теряя согласие, телефон и имя"""
+    # Если у пользователя уже есть согласие, сохраняем его (не перезаписываем на False)
+    if existing_user.get("consent_given") and "consent_given" not in user_data:
+        user_data["consent_given"] = True
+    
+    # Сохраняем телефон, если он уже есть и не перезаписывается
+    if existing_user.get("phone") and "phone" not in user_data:
+        user_data["phone"] = existing_user.get("phone")
+    
+    # Сохраняем имя, если оно уже есть и не перезаписывается (и не пустое)
+    if existing_user.get("first_name") and existing_user.get("first_name").strip() and "first_name" not in user_data:
+        user_data["first_name"] = existing_user.get("first_name")
+    
+    if existing_user.get("last_name") and existing_user.get("last_name").strip() and "last_name" not in user_data:
+        user_data["last_name"] = existing_user.get("last_name")
+    
+    return {
+        **existing_user,  # Сохраняем существующие данные
+        **user_data,      # Обновляем новыми данными
+        "updated_at": datetime.now().isoformat()
+    }
+
+
 class Database:
-    def __init__(self, data_dir: str = "data"):
+    def __init__(self, data_dir: str = "data", commit_window: Optional[float] = None):
         self.data_dir = data_dir
         self.orders_file = os.path.join(data_dir, "orders.json")
         self.order_counter_file = os.path.join(data_dir, "order_counter.json")
@@ -17,6 +457,7 @@ class Database:
         self.stock_file = os.path.join(data_dir, "stock.json")
         os.makedirs(data_dir, exist_ok=True)
         self._init_files()
+        self._storage = get_storage(data_dir, commit_window)
     
     def _init_files(self):
         """Инициализация файлов базы данных"""
@@ -34,297 +475,195 @@ class Database:
         
         if not os.path.exists(self.stock_file):
             # По умолчанию все товары доступны
-            stock = {str(i): True for i in range(1, 7)}
+            stock = _default_stock()
             with open(self.stock_file, "w", encoding="utf-8") as f:
                 json.dump(stock, f, ensure_ascii=False, indent=2)
     
     async def get_next_order_number(self) -> str:
         """Получить следующий номер заказа"""
-        async with aiofiles.open(self.order_counter_file, "r", encoding="utf-8") as f:
-            content = await f.read()
-            data = json.loads(content)
-            counter = data.get("counter", 0)
-            counter += 1
-            data["counter"] = counter
-        
-        async with aiofiles.open(self.order_counter_file, "w", encoding="utf-8") as f:
-            await f.write(json.dumps(data, ensure_ascii=False, indent=2))
+        def mutate(batch: Batch) -> str:
+            batch.touch(self._storage.counter)
+            return self._storage.next_order_number()
         
-        return f"{counter:03d}"
+        return await self._storage.submit(mutate)
     
     async def save_order(self, order: Dict) -> str:
         """Сохранить заказ"""
-        order_number = await self.get_next_order_number()
-        order["order_number"] = order_number
-        order["created_at"] = datetime.now().isoformat()
-        order["status"] = "pending_payment"
-        
-        async with aiofiles.open(self.orders_file, "r", encoding="utf-8") as f:
-            content = await f.read()
-            orders = json.loads(content) if content else {}
-        
-        orders[order_number] = order
-        
-        async with aiofiles.open(self.orders_file, "w", encoding="utf-8") as f:
-            await f.write(json.dumps(orders, ensure_ascii=False, indent=2))
+        def mutate(batch: Batch) -> str:
+            order_number = self._storage.next_order_number()
+            order["order_number"] = order_number
+            order["created_at"] = datetime.now().isoformat()
+            order["status"] = "pending_payment"
+            stored = _clone(order)
+            self._storage.orders.put(stored)
+            batch.put_order(stored)
+            return order_number
         
+        order_number = await self._storage.submit(mutate)
+        notify_order_changed(_clone(order))
         return order_number
     
     async def get_order(self, order_number: str) -> Optional[Dict]:
         """Получить заказ по номеру"""
-        try:
-            async with aiofiles.open(self.orders_file, "r", encoding="utf-8") as f:
-                content = await f.read()
-                if not content or not content.strip():
-                    return None
-                orders = json.loads(content)
-        except json.JSONDecodeError as e:
-            logger.error(f"Ошибка парсинга JSON в {self.orders_file}: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"Ошибка при чтении {self.orders_file}: {e}", exc_info=True)
+        orders = await self._storage.orders.load()
+        order = orders.get(order_number)
+        return _clone(order) if order is not None else None
+    
+    def _set_status(self, batch: Batch, order_number: str, status: str, kwargs: Dict) -> Optional[Dict]:
+        order = self._storage.orders.data.get(order_number)
+        if order is None:
             return None
-        
-        return orders.get(order_number)
+        order["status"] = status
+        order.update(_clone(kwargs))
+        if "updated_at" not in order:
+            order["updated_at"] = []
+        order["updated_at"].append(datetime.now().isoformat())
+        batch.put_order(order)
+        return _clone(order)
     
     async def update_order_status(self, order_number: str, status: str, **kwargs):
         """Обновить статус заказа"""
-        try:
-            async with aiofiles.open(self.orders_file, "r", encoding="utf-8") as f:
-                content = await f.read()
-                if not content or not content.strip():
-                    orders = {}
-                else:
-                    orders = json.loads(content)
-        except json.JSONDecodeError as e:
-            logger.error(f"Ошибка парсинга JSON в {self.orders_file}: {e}")
-            orders = {}
-        except Exception as e:
-            logger.error(f"Ошибка при чтении {self.orders_file}: {e}", exc_info=True)
-            orders = {}
+        def mutate(batch: Batch) -> Optional[Dict]:
+            return self._set_status(batch, order_number, status, kwargs)
+        
+        order = await self._storage.submit(mutate)
+        if order is not None:
+            notify_order_changed(order)
+    
+    async def update_orders_status(self, order_numbers: List[str], status: str,
+                                   expected_status: Optional[str] = None, **kwargs) -> List[Dict]:
+        """Обновить статус нескольких заказов одной записью; возвращает изменённые заказы.
         
-        if order_number in orders:
-            orders[order_number]["status"] = status
-            orders[order_number].update(kwargs)
-            if "updated_at" not in orders[order_number]:
-                orders[order_number]["updated_at"] = []
-            orders[order_number]["updated_at"].append(datetime.now().isoformat())
+        Если задан expected_status, меняются только заказы, у которых сейчас этот статус.
+        """
+        def mutate(batch: Batch) -> List[Dict]:
+            updated = []
+            for order_number in order_numbers:
+                order = self._storage.orders.data.get(order_number)
+                if order is None or (expected_status is not None and order.get("status") != expected_status):
+                    continue
+                updated.append(self._set_status(batch, order_number, status, kwargs))
+            return updated
         
-        async with aiofiles.open(self.orders_file, "w", encoding="utf-8") as f:
-            await f.write(json.dumps(orders, ensure_ascii=False, indent=2))
+        orders = await self._storage.submit(mutate)
+        for order in orders:
+            notify_order_changed(order)
+        return orders
     
     async def get_user_orders(self, user_id: int) -> List[Dict]:
         """Получить все заказы пользователя"""
-        try:
-            async with aiofiles.open(self.orders_file, "r", encoding="utf-8") as f:
-                content = await f.read()
-                if not content or not content.strip():
-                    return []
-                orders = json.loads(content)
-        except json.JSONDecodeError as e:
-            logger.error(f"Ошибка парсинга JSON в {self.orders_file}: {e}")
-            return []
-        except Exception as e:
-            logger.error(f"Ошибка при чтении {self.orders_file}: {e}", exc_info=True)
-            return []
-        
-        return [order for order in orders.values() if order.get("user_id") == user_id]
+        orders = await self._storage.orders.load()
+        numbers = self._storage.orders.user_index.get(str(user_id), [])
+        return [_clone(orders[n]) for n in numbers if n in orders]
     
     async def get_all_orders(self) -> Dict[str, Dict]:
         """Получить все заказы"""
-        try:
-            async with aiofiles.open(self.orders_file, "r", encoding="utf-8") as f:
-                content = await f.read()
-                if not content or not content.strip():
-                    return {}
-                return json.loads(content)
-        except json.JSONDecodeError as e:
-            logger.error(f"Ошибка парсинга JSON в {self.orders_file}: {e}")
-            return {}
-        except Exception as e:
-            logger.error(f"Ошибка при чтении {self.orders_file}: {e}", exc_info=True)
-            return {}
+        orders = await self._storage.orders.load()
+        return _clone(orders)
+    
+    async def get_orders_by_status(self, status: str) -> Dict[str, Dict]:
+        """Получить заказы с указанным статусом"""
+        orders = await self._storage.orders.load()
+        return {k: _clone(v) for k, v in orders.items() if v.get("status") == status}
+    
+    async def compact_orders(self) -> bool:
+        """Свернуть журнал заказов в снимок orders.json"""
+        return await self._storage.compact()
     
     async def get_user(self, user_id: int) -> Optional[Dict]:
         """Получить данные пользователя"""
-        try:
-            async with aiofiles.open(self.users_file, "r", encoding="utf-8") as f:
-                content = await f.read()
-                if not content or not content.strip():
-                    return None
-                users = json.loads(content)
-        except json.JSONDecodeError as e:
-            # Файл поврежден - пытаемся восстановить
-            logger.error(f"Ошибка парсинга JSON в {self.users_file}: {e}. Попытка восстановления...")
-            try:
-                # Пытаемся найти первый валидный JSON объект
-                content = content.strip()
-                # Ищем первую открывающую скобку
-                start_idx = content.find('{')
-                if start_idx != -1:
-                    # Пытаемся найти соответствующую закрывающую скобку
-                    brace_count = 0
-                    end_idx = start_idx
-                    for i in range(start_idx, len(content)):
-                        if content[i] == '{':
-                            brace_count += 1
-                        elif content[i] == '}':
-                            brace_count -= 1
-                            if brace_count == 0:
-                                end_idx = i + 1
-                                break
-                    
-                    if brace_count == 0:
-                        # Нашли валидный JSON объект
-                        valid_content = content[start_idx:end_idx]
-                        users = json.loads(valid_content)
-                        # Сохраняем восстановленный файл
-                        async with aiofiles.open(self.users_file, "w", encoding="utf-8") as f:
-                            await f.write(json.dumps(users, ensure_ascii=False, indent=2))
-                        logger.info(f"Файл {self.users_file} восстановлен")
-                    else:
-                        # Не удалось восстановить - создаем пустой файл
-                        logger.warning(f"Не удалось восстановить {self.users_file}, создаем пустой файл")
-                        users = {}
-                        async with aiofiles.open(self.users_file, "w", encoding="utf-8") as f:
-                            await f.write(json.dumps(users, ensure_ascii=False, indent=2))
-                else:
-                    # Нет валидного JSON - создаем пустой файл
-                    users = {}
-                    async with aiofiles.open(self.users_file, "w", encoding="utf-8") as f:
-                        await f.write(json.dumps(users, ensure_ascii=False, indent=2))
-            except Exception as restore_error:
-                # Если восстановление не удалось - создаем пустой файл
-                logger.error(f"Не удалось восстановить файл: {restore_error}", exc_info=True)
-                users = {}
-                async with aiofiles.open(self.users_file, "w", encoding="utf-8") as f:
-                    await f.write(json.dumps(users, ensure_ascii=False, indent=2))
-        except Exception as e:
-            logger.error(f"Неожиданная ошибка при чтении {self.users_file}: {e}", exc_info=True)
-            return None
+        users = await self._storage.users.load()
         
         user = users.get(str(user_id))
         if user:
             logger.debug(f"Найден пользователь {user_id}: consent_given={user.get('consent_given')}, phone={user.get('phone')}, first_name={user.get('first_name')}")
         else:
             logger.warning(f"Пользователь {user_id} не найден в базе. Доступные ключи: {list(users.keys())[:10]}")
-        return user
+        return _clone(user) if user else None
     
     async def save_user(self, user_id: int, user_data: Dict):
         """Сохранить данные пользователя"""
-        try:
-            async with aiofiles.open(self.users_file, "r", encoding="utf-8") as f:
-                content = await f.read()
-                if not content or not content.strip():
-                    users = {}
-                else:
-                    users = json.loads(content)
-        except json.JSONDecodeError as e:
-            logger.error(f"Ошибка парсинга JSON в {self.users_file} при сохранении: {e}. Создаем новый файл.")
-            # Если файл поврежден, начинаем с пустого словаря
-            users = {}
-            # Пытаемся восстановить данные из поврежденного файла
-            try:
-                content = content.strip()
-                start_idx = content.find('{')
-                if start_idx != -1:
-                    brace_count = 0
-                    end_idx = start_idx
-                    for i in range(start_idx, len(content)):
-                        if content[i] == '{':
-                            brace_count += 1
-                        elif content[i] == '}':
-                            brace_count -= 1
-                            if brace_count == 0:
-                                end_idx = i + 1
-                                break
-                    if brace_count == 0:
-                        valid_content = content[start_idx:end_idx]
-                        users = json.loads(valid_content)
-            except Exception:
-                pass  # Если не удалось восстановить, используем пустой словарь
-        except Exception as e:
-            logger.error(f"Ошибка при чтении {self.users_file}: {e}", exc_info=True)
-            users = {}
-        
-        # Сохраняем существующие данные пользователя (например, consent_given, phone, first_name, last_name)
-        existing_user = users.get(str(user_id), {})
-        
-        # Если у пользователя уже есть согласие, сохраняем его (не перезаписываем на False)
-        if existing_user.get("consent_given") and "consent_given" not in user_data:
-            user_data["consent_given"] = True
-        
-        # Сохраняем телефон, если он уже есть и не перезаписывается
-        if existing_user.get("phone") and "phone" not in user_data:
-            user_data["phone"] = existing_user.get("phone")
+        def mutate(batch: Batch):
+            users = self._storage.users.data
+            # Сохраняем существующие данные пользователя (например, consent_given, phone, first_name, last_name)
+            existing_user = users.get(str(user_id), {})
+            users[str(user_id)] = merge_user_data(existing_user, _clone(user_data))
+            batch.touch(self._storage.users)
         
-        # Сохраняем имя, если оно уже есть и не перезаписывается (и не пустое)
-        if existing_user.get("first_name") and existing_user.get("first_name").strip() and "first_name" not in user_data:
-            user_data["first_name"] = existing_user.get("first_name")
-        
-        if existing_user.get("last_name") and existing_user.get("last_name").strip() and "last_name" not in user_data:
-            user_data["last_name"] = existing_user.get("last_name")
-        
-        users[str(user_id)] = {
-            **existing_user,  # Сохраняем существующие данные
-            **user_data,      # Обновляем новыми данными
-            "updated_at": datetime.now().isoformat()
-        }
-        
-        async with aiofiles.open(self.users_file, "w", encoding="utf-8") as f:
-            await f.write(json.dumps(users, ensure_ascii=False, indent=2))
+        await self._storage.submit(mutate)
     
     async def update_user_consent(self, user_id: int, consented: bool = True):
         """Обновить согласие на обработку ПД"""
-        user = await self.get_user(user_id)
-        if user:
-            user["consent_given"] = consented
-            await self.save_user(user_id, user)
-        else:
-            await self.save_user(user_id, {"consent_given": consented})
+        await self.save_user(user_id, {"consent_given": consented})
     
     async def get_stock_status(self) -> Dict[str, bool]:
         """Получить статус остатков товаров"""
-        try:
-            async with aiofiles.open(self.stock_file, "r", encoding="utf-8") as f:
-                content = await f.read()
-                if not content or not content.strip():
-                    # По умолчанию все товары доступны
-                    return {str(i): True for i in range(1, 7)}
-                return json.loads(content)
-        except json.JSONDecodeError as e:
-            logger.error(f"Ошибка парсинга JSON в {self.stock_file}: {e}")
-            return {str(i): True for i in range(1, 7)}
-        except Exception as e:
-            logger.error(f"Ошибка при чтении {self.stock_file}: {e}", exc_info=True)
-            return {str(i): True for i in range(1, 7)}
+        stock = await self._storage.stock.load()
+        return dict(stock)
     
     async def is_variant_available(self, variant_num: int) -> bool:
         """Проверить, доступен ли вариант букета"""
-        stock = await self.get_stock_status()
+        stock = await self._storage.stock.load()
         return stock.get(str(variant_num), True)
     
     async def toggle_variant_stock(self, variant_num: int) -> bool:
         """Переключить доступность варианта букета"""
-        try:
-            async with aiofiles.open(self.stock_file, "r", encoding="utf-8") as f:
-                content = await f.read()
-                if not content or not content.strip():
-                    stock = {str(i): True for i in range(1, 7)}
-                else:
-                    stock = json.loads(content)
-            
+        def mutate(batch: Batch) -> bool:
+            stock = self._storage.stock.data
             # Переключаем статус
             current_status = stock.get(str(variant_num), True)
             stock[str(variant_num)] = not current_status
-            
-            async with aiofiles.open(self.stock_file, "w", encoding="utf-8") as f:
-                await f.write(json.dumps(stock, ensure_ascii=False, indent=2))
-            
-            logger.info(f"Вариант {variant_num} {'включен' if not current_status else 'выключен'}")
+            batch.touch(self._storage.stock)
             return not current_status
+        
+        try:
+            new_status = await self._storage.submit(mutate)
+            logger.info(f"Вариант {variant_num} {'включен' if new_status else 'выключен'}")
+            notify_stock_changed(self._storage.stock.data)
+            return new_status
         except Exception as e:
             logger.error(f"Ошибка при переключении остатков: {e}", exc_info=True)
             return False
+    
+    async def set_variant_stock(self, variant_num: int, available: bool) -> bool:
+        """Включить или выключить вариант букета; True - статус изменился"""
+        def mutate(batch: Batch) -> bool:
+            stock = self._storage.stock.data
+            if stock.get(str(variant_num), True) == available:
+                return False
+            stock[str(variant_num)] = available
+            batch.touch(self._storage.stock)
+            return True
+        
+        changed = await self._storage.submit(mutate)
+        if changed:
+            logger.info(f"Вариант {variant_num} {'включен' if available else 'выключен'}")
+            notify_stock_changed(self._storage.stock.data)
+        return changed
+    
+    async def get_stock_counts(self) -> Dict[str, Dict]:
+        """Лимиты количества по вариантам (вариант -> запись inventory.Inventory)"""
+        counts = await self._storage.stock_counts.load()
+        return _clone(counts)
+    
+    async def save_stock_count(self, variant_num: int, entry: Optional[Dict]):
+        """Сохранить лимит количества варианта (None - снять лимит)"""
+        def mutate(batch: Batch):
+            counts = self._storage.stock_counts.data
+            if entry is None:
+                counts.pop(str(variant_num), None)
+            else:
+                counts[str(variant_num)] = _clone(entry)
+            batch.touch(self._storage.stock_counts)
+        
+        await self._storage.submit(mutate)
 
 
+def create_database(data_dir: str = "data"):
+    """Создать хранилище согласно Config.STORAGE_BACKEND ("json" или "sqlite")"""
+    from config import Config
+    
+    if Config.STORAGE_BACKEND == "sqlite":
+        from sqlite_database import SqliteDatabase
+        return SqliteDatabase(Config.SQLITE_PATH)
+    return Database(data_dir, commit_window=Config.STORAGE_COMMIT_WINDOW_MS / 1000)
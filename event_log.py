@@ -0,0 +1,143 @@
+"""
+Структурированный журнал событий (NDJSON).
+
+log_event("sheets.append_rows_ok", order_numbers=[...]) не делает ввода-вывода:
+запись кладётся в ограниченную очередь в памяти, а фоновый поток раз в
+flush_interval дописывает накопленное в файл одной операцией. При
+переполнении очереди новые события отбрасываются (и считаются), а не
+блокируют вызывающего. Файл ротируется по размеру, для каждого типа событий
+можно задать долю записываемых событий (sampling).
+"""
+import atexit
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config import Config
+
+
+class EventLog:
+    """Буферизованный NDJSON-журнал с фоновым сбросом на диск и ротацией"""
+
+    def __init__(self, path: str, max_queue: int = 10000, max_bytes: int = 10 * 1024 * 1024,
+                 backup_count: int = 3, flush_interval: float = 1.0,
+                 sample_rates: Optional[Dict[str, float]] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.sample_rates = sample_rates or {}
+        self.stats = {"logged": 0, "sampled_out": 0, "dropped": 0, "written": 0, "rotations": 0, "errors": 0}
+        self._queue: "queue.Queue[str]" = queue.Queue(maxsize=max_queue)
+        self._closed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def log(self, event: str, **data):
+        """Записать событие (без блокировки; может быть отброшено сэмплированием или при переполнении)"""
+        rate = self.sample_rates.get(event, 1.0)
+        if rate < 1.0 and random.random() >= rate:
+            self.stats["sampled_out"] += 1
+            return
+        record = {"ts": int(time.time() * 1000), "event": event, **data}
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return
+        self.stats["logged"] += 1
+        if self._thread is None:
+            self._start()
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+                self._thread.start()
+
+    def _drain(self) -> List[str]:
+        lines = []
+        while True:
+            try:
+                lines.append(self._queue.get_nowait())
+            except queue.Empty:
+                return lines
+
+    def _run(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        """Дописать накопленные события в файл"""
+        lines = self._drain()
+        if not lines:
+            return
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+                self._rotate()
+            with open(self.path, "ab") as f:
+                f.write(data)
+            self.stats["written"] += len(lines)
+        except OSError:
+            # Журнал событий не должен ронять бота
+            self.stats["errors"] += 1
+
+    def _rotate(self):
+        """events.ndjson -> events.ndjson.1 -> ... -> events.ndjson.N"""
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.stats["rotations"] += 1
+
+    def close(self):
+        """Остановить фоновый поток и записать остаток"""
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        else:
+            self.flush()
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """Разобрать строку вида "sheets.connect_start=0.1,sheets.add_order=0.5" """
+    rates = {}
+    for item in value.split(","):
+        if "=" in item:
+            event, rate = item.split("=", 1)
+            rates[event.strip()] = float(rate)
+    return rates
+
+
+_event_log: Optional[EventLog] = None
+
+
+def get_event_log() -> EventLog:
+    """Общий на процесс журнал событий"""
+    global _event_log
+    if _event_log is None:
+        _event_log = EventLog(
+            Config.EVENT_LOG_PATH,
+            max_bytes=Config.EVENT_LOG_MAX_BYTES,
+            backup_count=Config.EVENT_LOG_BACKUPS,
+            sample_rates=parse_sample_rates(Config.EVENT_LOG_SAMPLING)
+        )
+        atexit.register(_event_log.close)
+    return _event_log
+
+
+def log_event(event: str, **data):
+    """Записать событие в общий журнал"""
+    get_event_log().log(event, **data)
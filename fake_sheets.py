@@ -0,0 +1,272 @@
+"""
+Поддельный лист Google Sheets в памяти процесса.
+
+Реализует ту часть gspread.Worksheet, которой пользуется google_sheets.py,
+и позволяет без сети и учётных данных проверять и нагружать синхронизацию:
+задержка на каждый запрос, ответы 429 (квота) и 5xx (сбой) - с заданной
+вероятностью или принудительно на ближайшие N запросов.
+
+    worksheet = FakeWorksheet(latency=0.2, quota_error_rate=0.05)
+    sheets = connect_fake(GoogleSheets(), worksheet)
+"""
+import random
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+import gspread
+from gspread.cell import Cell
+
+_A1 = re.compile(r"^([A-Z]+)(\d+)?(?::([A-Z]+)(\d+)?)?$")
+
+
+class _FakeResponse:
+    """Ответ API для gspread.exceptions.APIError"""
+
+    def __init__(self, status_code: int, message: str):
+        self.status_code = status_code
+        self.text = message
+        self._message = message
+
+    def json(self) -> Dict:
+        return {"error": {"code": self.status_code, "message": self._message, "status": "FAKE"}}
+
+
+def _col_index(letters: str) -> int:
+    index = 0
+    for ch in letters:
+        index = index * 26 + ord(ch) - ord("A") + 1
+    return index
+
+
+def _col_letters(index: int) -> str:
+    letters = ""
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def _cell_value(value) -> str:
+    # Значения возвращаются так же, как FORMATTED_VALUE у API: строками
+    return "" if value is None else str(value)
+
+
+class FakeWorksheet:
+    """Лист в памяти с имитацией задержки, квоты и сбоев API"""
+
+    def __init__(self, title: str = "Заказы", latency: float = 0.0, quota_error_rate: float = 0.0,
+                 server_error_rate: float = 0.0, seed: Optional[int] = None):
+        self.title = title
+        self.latency = latency
+        self.quota_error_rate = quota_error_rate
+        self.server_error_rate = server_error_rate
+        self.rows: List[List[str]] = []
+        self.stats = {"reads": 0, "writes": 0, "quota_errors": 0, "server_errors": 0}
+        self._forced: List[int] = []  # коды ошибок для ближайших запросов
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    # --- управление сбоями ---
+
+    def fail_next(self, count: int = 1, status_code: int = 429):
+        """Следующие count запросов завершатся ошибкой status_code"""
+        self._forced.extend([status_code] * count)
+
+    def _request(self, kind: str):
+        if self.latency:
+            time.sleep(self.latency)
+        self.stats[f"{kind}s"] += 1
+        code = None
+        if self._forced:
+            code = self._forced.pop(0)
+        elif self.quota_error_rate and self._random.random() < self.quota_error_rate:
+            code = 429
+        elif self.server_error_rate and self._random.random() < self.server_error_rate:
+            code = 503
+        if code is not None:
+            self.stats["quota_errors" if code == 429 else "server_errors"] += 1
+            message = "Quota exceeded" if code == 429 else "Backend error"
+            raise gspread.exceptions.APIError(_FakeResponse(code, message))
+
+    # --- внутренние операции над сеткой ---
+
+    def _ensure(self, row: int, col: int):
+        while len(self.rows) < row:
+            self.rows.append([])
+        line = self.rows[row - 1]
+        if len(line) < col:
+            line.extend([""] * (col - len(line)))
+
+    def _set(self, row: int, col: int, value):
+        self._ensure(row, col)
+        self.rows[row - 1][col - 1] = _cell_value(value)
+
+    def _get(self, row: int, col: int) -> str:
+        if row > len(self.rows) or col > len(self.rows[row - 1]):
+            return ""
+        return self.rows[row - 1][col - 1]
+
+    def _parse(self, range_name: str):
+        range_name = range_name.split("!")[-1].replace("'", "")
+        match = _A1.match(range_name)
+        if not match:
+            raise ValueError(f"неподдерживаемый диапазон {range_name}")
+        c1, r1, c2, r2 = match.groups()
+        row1 = int(r1) if r1 else 1
+        col1 = _col_index(c1)
+        col2 = _col_index(c2) if c2 else col1
+        if c2 is None:
+            row2 = row1
+        else:
+            row2 = int(r2) if r2 else max(len(self.rows), row1)
+        return row1, col1, row2, col2
+
+    def _read_range(self, range_name: str) -> List[List[str]]:
+        row1, col1, row2, col2 = self._parse(range_name)
+        values = []
+        for row in range(row1, min(row2, len(self.rows)) + 1):
+            line = [self._get(row, col) for col in range(col1, col2 + 1)]
+            while line and line[-1] == "":
+                line.pop()  # API обрезает пустой хвост строки
+            values.append(line)
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def _write_range(self, range_name: str, values: List[List]):
+        row1, col1, _, _ = self._parse(range_name)
+        for i, line in enumerate(values):
+            for j, value in enumerate(line):
+                self._set(row1 + i, col1 + j, value)
+
+    # --- подмножество gspread.Worksheet ---
+
+    def get_all_values(self, **kwargs) -> List[List[str]]:
+        self._request("read")
+        with self._lock:
+            width = max((len(line) for line in self.rows), default=0)
+            return [line + [""] * (width - len(line)) for line in self.rows]
+
+    def get(self, range_name: str = None, **kwargs) -> List[List[str]]:
+        self._request("read")
+        with self._lock:
+            return self._read_range(range_name)
+
+    def batch_get(self, ranges: List[str], **kwargs) -> List[List[List[str]]]:
+        self._request("read")
+        with self._lock:
+            return [self._read_range(r) for r in ranges]
+
+    def col_values(self, col: int, **kwargs) -> List[str]:
+        self._request("read")
+        with self._lock:
+            values = [self._get(row, col) for row in range(1, len(self.rows) + 1)]
+            while values and values[-1] == "":
+                values.pop()
+            return values
+
+    def cell(self, row: int, col: int, **kwargs) -> Cell:
+        self._request("read")
+        with self._lock:
+            return Cell(row, col, self._get(row, col))
+
+    def acell(self, label: str, **kwargs) -> Cell:
+        row, col, _, _ = self._parse(label)
+        return self.cell(row, col)
+
+    def findall(self, query: str, in_row: int = None, in_column: int = None, case_sensitive: bool = True) -> List[Cell]:
+        self._request("read")
+        with self._lock:
+            found = []
+            for r, line in enumerate(self.rows, start=1):
+                if in_row is not None and r != in_row:
+                    continue
+                for c, value in enumerate(line, start=1):
+                    if in_column is not None and c != in_column:
+                        continue
+                    if value == query or (not case_sensitive and value.lower() == query.lower()):
+                        found.append(Cell(r, c, value))
+            return found
+
+    def update_cell(self, row: int, col: int, value) -> Dict:
+        self._request("write")
+        with self._lock:
+            self._set(row, col, value)
+        return {"updatedCells": 1}
+
+    def update(self, range_name, values=None, **kwargs) -> Dict:
+        self._request("write")
+        with self._lock:
+            self._write_range(range_name, values)
+        return {"updatedRange": f"'{self.title}'!{range_name}"}
+
+    def batch_update(self, data: List[Dict], **kwargs) -> Dict:
+        self._request("write")
+        with self._lock:
+            for item in data:
+                self._write_range(item["range"], item["values"])
+        return {"totalUpdatedCells": sum(len(line) for item in data for line in item["values"])}
+
+    def append_rows(self, values: List[List], value_input_option: str = "RAW", **kwargs) -> Dict:
+        self._request("write")
+        with self._lock:
+            # Как и API, дописываем после последней непустой строки
+            last = len(self.rows)
+            while last and not any(self.rows[last - 1]):
+                last -= 1
+            del self.rows[last:]
+            start = last + 1
+            for line in values:
+                self.rows.append([_cell_value(v) for v in line])
+            end = start + len(values) - 1
+            width = max((len(line) for line in values), default=1)
+        return {"updates": {"updatedRange": f"'{self.title}'!A{start}:{_col_letters(width)}{end}",
+                            "updatedRows": len(values)}}
+
+    def append_row(self, values: List, **kwargs) -> Dict:
+        return self.append_rows([values], **kwargs)
+
+    def insert_row(self, values: List, index: int = 1, **kwargs) -> Dict:
+        self._request("write")
+        with self._lock:
+            self._ensure(index - 1, 1)
+            self.rows.insert(index - 1, [_cell_value(v) for v in values])
+        return {"updatedRows": 1}
+
+    def delete_rows(self, start_index: int, end_index: int = None) -> Dict:
+        self._request("write")
+        with self._lock:
+            del self.rows[start_index - 1:(end_index or start_index)]
+        return {}
+
+
+class FakeSpreadsheet:
+    """Таблица из поддельных листов (листы создаются по запросу, как add_worksheet)"""
+
+    def __init__(self, *worksheets: FakeWorksheet):
+        self.worksheets: Dict[str, FakeWorksheet] = {ws.title: ws for ws in worksheets}
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        if title not in self.worksheets:
+            raise gspread.exceptions.WorksheetNotFound(title)
+        return self.worksheets[title]
+
+    def add_worksheet(self, title: str, rows: int = 1000, cols: int = 26, **kwargs) -> FakeWorksheet:
+        first = next(iter(self.worksheets.values()), None)
+        worksheet = FakeWorksheet(title, latency=first.latency if first else 0.0)
+        self.worksheets[title] = worksheet
+        return worksheet
+
+
+def connect_fake(sheets, worksheet: FakeWorksheet):
+    """Подключить клиент GoogleSheets к поддельному листу вместо настоящего API"""
+    sheets.sheet_id = sheets.sheet_id or "fake"
+    sheets.sheet = FakeSpreadsheet(worksheet)
+    sheets.worksheet = worksheet
+    sheets.state = "connected"
+    sheets.connected_at = time.time()
+    sheets._rows = None
+    sheets._summary = None
+    return sheets
@@ -0,0 +1,188 @@
+"""
+Хранилище состояний FSM (aiogram) на SQLite.
+
+Корзины и незавершённые оформления заказа переживают перезапуск бота.
+Активные чаты держатся в ограниченном LRU-кэше, поэтому get_state/get_data
+обычно не обращаются к диску. Изменения копятся в памяти и записываются
+одной транзакцией раз в flush_interval секунд (и при close()).
+Брошенные диалоги удаляются expire() по индексу на updated_at.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from sqlite_database import get_connection
+
+logger = logging.getLogger(__name__)
+
+FSM_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fsm_updated_at ON fsm(updated_at);
+"""
+
+
+class FSMRecord:
+    """Состояние и данные одного чата"""
+
+    __slots__ = ("state", "data", "updated_at")
+
+    def __init__(self, state: Optional[str] = None, data: Optional[Dict[str, Any]] = None,
+                 updated_at: float = 0.0):
+        self.state = state
+        self.data = data if data is not None else {}
+        self.updated_at = updated_at
+
+    def is_empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class SqliteFSMStorage(BaseStorage):
+    """FSM-хранилище на SQLite с LRU-кэшем активных чатов и пакетной записью"""
+
+    def __init__(self, path: str = "data/fsm.sqlite3", cache_size: int = 1000, flush_interval: float = 0.2):
+        self.path = path
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self._conn = get_connection(path, FSM_SCHEMA)
+        self._cache: "OrderedDict[str, FSMRecord]" = OrderedDict()
+        self._dirty: Dict[str, FSMRecord] = {}  # изменённые записи, ещё не сброшенные на диск
+        self._flush_task: Optional[asyncio.Task] = None
+        self.stats = {
+            "hits": 0, "misses": 0, "flushes": 0, "rows_written": 0,
+            "expired_sessions": 0, "expired_bytes": 0,
+        }
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+    def _remember(self, k: str, record: FSMRecord):
+        self._cache[k] = record
+        self._cache.move_to_end(k)
+        # Вытесняем давно неактивные чаты; несохранённые остаются в _dirty до записи
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _record(self, key: StorageKey) -> FSMRecord:
+        k = self._key(key)
+        record = self._dirty.get(k) or self._cache.get(k)
+        if record is not None:
+            self.stats["hits"] += 1
+            self._remember(k, record)
+            return record
+
+        self.stats["misses"] += 1
+        row = await self._conn.run(
+            lambda conn: conn.execute("SELECT state, data, updated_at FROM fsm WHERE key = ?", (k,)).fetchone()
+        )
+        # Пока ждали диск, запись могла появиться в памяти - она новее
+        record = self._dirty.get(k) or self._cache.get(k)
+        if record is None:
+            record = FSMRecord(row["state"], json.loads(row["data"]), row["updated_at"]) if row else FSMRecord()
+        self._remember(k, record)
+        return record
+
+    def _changed(self, key: StorageKey, record: FSMRecord):
+        k = self._key(key)
+        record.updated_at = time.time()
+        self._dirty[k] = record
+        self._remember(k, record)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Ошибка записи состояний FSM в {self.path}: {e}", exc_info=True)
+
+    async def flush(self):
+        """Записать все накопленные изменения одной транзакцией"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        # Сериализуем сразу: записи могут измениться, пока транзакция ждёт своей очереди
+        upserts = []
+        deletes = []
+        for k, record in dirty.items():
+            if record.is_empty():
+                deletes.append((k,))
+            else:
+                upserts.append((k, record.state, json.dumps(record.data, ensure_ascii=False, default=str),
+                                record.updated_at))
+
+        def _write(conn):
+            if upserts:
+                conn.executemany(
+                    "INSERT INTO fsm (key, state, data, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data, "
+                    "updated_at = excluded.updated_at",
+                    upserts
+                )
+            if deletes:
+                conn.executemany("DELETE FROM fsm WHERE key = ?", deletes)
+
+        try:
+            await self._conn.run(_write)
+        except Exception:
+            # Вернём несохранённое, если его не успели изменить заново
+            for k, record in dirty.items():
+                self._dirty.setdefault(k, record)
+            raise
+        self.stats["flushes"] += 1
+        self.stats["rows_written"] += len(dirty)
+
+    async def expire(self, ttl: float) -> Dict[str, int]:
+        """Удалить состояния, не менявшиеся дольше ttl секунд; возвращает число сессий и байт"""
+        cutoff = time.time() - ttl
+        # Кэш ограничен cache_size, поэтому полный проход по нему дешёвый
+        for k in [k for k, record in self._cache.items() if record.updated_at < cutoff and k not in self._dirty]:
+            del self._cache[k]
+        await self.flush()
+
+        def _delete(conn) -> Dict[str, int]:
+            row = conn.execute(
+                "SELECT COUNT(*) AS sessions, COALESCE(SUM(LENGTH(key) + LENGTH(COALESCE(state, '')) + LENGTH(data)), 0) "
+                "AS bytes FROM fsm WHERE updated_at < ?",
+                (cutoff,)
+            ).fetchone()
+            conn.execute("DELETE FROM fsm WHERE updated_at < ?", (cutoff,))
+            return {"sessions": row["sessions"], "bytes": row["bytes"]}
+
+        reclaimed = await self._conn.run(_delete)
+        self.stats["expired_sessions"] += reclaimed["sessions"]
+        self.stats["expired_bytes"] += reclaimed["bytes"]
+        return reclaimed
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._changed(key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._record(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._record(key)
+        record.data = data.copy()
+        self._changed(key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._record(key)).data.copy()
+
+    async def close(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
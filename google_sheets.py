@@ -1,42 +1,115 @@
 import gspread
+import requests
+from google.auth.transport.requests import Request
 from google.oauth2.service_account import Credentials
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional
+import logging
 import os
+import random
+import re
 from config import Config
-import json
+from event_log import log_event
+from datetime import timezone
+from rate_limiter import TokenBucket
+from sheets_summary import PAID_DISPLAY, SUMMARY_FIRST_ROW, SUMMARY_HEADER, SUMMARY_HEADER_RANGE, SummaryTable, order_counts
+import threading
 import time
 import traceback
 
+logger = logging.getLogger(__name__)
 
-# region agent log
-_DEBUG_LOG_PATHS = [
-    r"c:\Users\Ф\Desktop\freelance\flowers_bot\.cursor\debug.log",  # host path (Cursor workspace)
-    r"/app/.cursor/debug.log",  # docker path (mounted from ./.cursor)
-    os.path.join(".cursor", "debug.log"),  # relative fallback
+
+# Раскладка строки заказа: A статус, B № заказа, C дата, D имя, E телеграм,
+# F-K варианты 1-6, L итого букетов, M итого тюльпанов, N сумма, O оплата, P возврат
+HEADER_ROWS = 2
+HEADER_RANGE = "A1:P2"
+
+# Первая строка заголовков
+HEADER_ROW1 = [
+    "статус",
+    "№ заказа",
+    "дата и время готовности",
+    "Фамилия, Имя",
+    "@ телеграм",
+    "№ варианта",
+    "", "", "", "", "",  # Место для вариантов 1-6
+    "итого букетов",
+    "итого тюльпанов",
+    "сумма",
+    "оплата",
+    "возврат"
 ]
 
+# Вторая строка заголовков (подзаголовки для вариантов)
+HEADER_ROW2 = [
+    "",  # статус
+    "",  # № заказа
+    "",  # дата и время готовности
+    "",  # Фамилия, Имя
+    "",  # @ телеграм
+    "1 (микс)",
+    "2 (красный)",
+    "3 (желтый)",
+    "4 (белый)",
+    "5 (фиол+желт)",
+    "6 (красн+желт)",
+    "",  # итого букетов
+    "",  # итого тюльпанов
+    "",  # сумма
+    "",  # оплата
+    ""   # возврат
+]
+ORDER_NUMBER_COL = 2
+STATUS_COL = "A"
+TOTAL_PRICE_COL = "N"
+PAYMENT_COL = "O"
+REFUND_COL = "P"
 
-def _dbg_log(hypothesisId: str, location: str, message: str, data: Dict):
-    """Write one NDJSON line for debug-mode. Avoid secrets/PII."""
-    payload = {
-        "sessionId": "debug-session",
-        "runId": os.getenv("DEBUG_RUN_ID", "pre-fix"),
-        "hypothesisId": hypothesisId,
-        "location": location,
-        "message": message,
-        "data": data,
-        "timestamp": int(time.time() * 1000),
-    }
-    line = json.dumps(payload, ensure_ascii=False)
-    for p in _DEBUG_LOG_PATHS:
-        try:
-            os.makedirs(os.path.dirname(p) or ".", exist_ok=True)
-            with open(p, "a", encoding="utf-8") as f:
-                f.write(line + "\n")
-            return
-        except Exception:
-            continue
-# endregion
+
+# Клиентские квоты под лимиты Sheets API (чтение и запись считаются отдельно)
+_read_bucket = TokenBucket.per_minute(Config.SHEETS_READS_PER_MINUTE)
+_write_bucket = TokenBucket.per_minute(Config.SHEETS_WRITES_PER_MINUTE)
+BACKOFF_BASE = 1.0  # секунды
+BACKOFF_MAX = 64.0
+
+# Счётчики обращений к API, ожиданий квоты и ошибок (общие для процесса)
+SHEETS_STATS = {
+    "reads": 0,
+    "writes": 0,
+    "throttled": 0,  # сколько раз ждали токен у своего ограничителя
+    "throttled_seconds": 0.0,
+    "rate_limited": 0,  # ответы 429
+    "server_errors": 0,  # ответы 5xx и сетевые ошибки
+    "retries": 0,
+    "gave_up": 0,
+}
+
+
+def _retry_reason(error: Exception) -> Optional[str]:
+    """Причина, по которой запрос стоит повторить (None - ошибка не временная)"""
+    if isinstance(error, gspread.exceptions.APIError):
+        code = error.response.status_code
+        if code == 429:
+            return "rate_limited"
+        if code >= 500:
+            return "server_errors"
+        return None
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return "server_errors"
+    return None
+
+
+def _status_values(status: str, total_price) -> tuple:
+    """Отображаемый статус и сумма оплаты для первой строки заказа"""
+    status_display = "оплачен" if status == "paid" else "отменен" if status == "cancelled" else "ожидает оплаты"
+    payment_amount = total_price if status == "paid" else 0
+    return status_display, payment_amount
+
+
+def _same_amount(cell, value) -> bool:
+    """Сравнить сумму из таблицы (отформатированную строку) с числом"""
+    digits = re.sub(r"[^\d]", "", str(cell))
+    return int(digits or 0) == int(value or 0)
 
 
 class GoogleSheets:
@@ -44,54 +117,89 @@ class GoogleSheets:
         self.credentials_path = Config.GOOGLE_SHEETS_CREDENTIALS_PATH
         self.sheet_id = Config.GOOGLE_SHEET_ID
         self.worksheet_name = Config.GOOGLE_WORKSHEET_NAME
+        self.summary_name = Config.GOOGLE_SUMMARY_WORKSHEET_NAME
         self.client = None
         self.sheet = None
         self.worksheet = None
-        # region agent log
-        _dbg_log(
-            "A",
-            "google_sheets.py:GoogleSheets.__init__",
-            "init",
-            {
-                "has_sheet_id": bool(self.sheet_id),
-                "worksheet_name": self.worksheet_name,
-                "credentials_path": self.credentials_path,
-                "credentials_exists": bool(self.credentials_path and os.path.exists(self.credentials_path)),
-            },
+        self.summary_worksheet = None
+        self.credentials = None
+        # Состояние подключения: disconnected, connecting, connected, error
+        self.state = "disconnected"
+        self.last_error: Optional[str] = None
+        self.connected_at: Optional[float] = None
+        self._connect_lock = threading.Lock()
+        # Записи (очередь синхронизации и сверка) идут из разных потоков и делят индекс строк
+        self._write_lock = threading.RLock()
+        # Индекс "номер заказа -> первая строка заказа"; строится одним чтением колонки B
+        self._rows: Optional[Dict[str, int]] = None
+        # Сводка по датам и вариантам; строится при первом изменении заказов
+        self._summary: Optional[SummaryTable] = None
+        log_event(
+            "sheets.client_created",
+            has_sheet_id=bool(self.sheet_id),
+            worksheet_name=self.worksheet_name,
+            credentials_path=self.credentials_path,
+            credentials_exists=bool(self.credentials_path and os.path.exists(self.credentials_path)),
         )
-        # endregion
-        self._connect()
+        # Подключение ленивое: при первом обращении или в фоновой задаче при запуске
     
     def ensure_connected(self):
-        """Убедиться, что подключение установлено"""
-        if not self.worksheet and self.sheet_id:
-            self._connect()
+        """Убедиться, что подключение установлено (подключается при первом вызове)"""
+        if self.worksheet or not self.sheet_id:
+            return
+        with self._connect_lock:
+            if self.worksheet:
+                return
+            self.state = "connecting"
+            try:
+                self._connect()
+            except Exception as e:
+                self.state = "error"
+                self.last_error = f"{type(e).__name__}: {e}"
+                raise
+            if self.worksheet:
+                self.state = "connected"
+                self.connected_at = time.time()
+                self.last_error = None
+            else:
+                self.state = "error"
+                self.last_error = self.last_error or "нет файла учётных данных"
+    
+    def refresh_credentials(self, margin: float = 600.0) -> bool:
+        """Обновить токен заранее, если до его истечения меньше margin секунд"""
+        creds = self.credentials
+        if creds is None:
+            return False
+        expiry = getattr(creds, "expiry", None)
+        # expiry у google-auth - время UTC без tzinfo
+        if creds.valid and expiry is not None and expiry.replace(tzinfo=timezone.utc).timestamp() - time.time() > margin:
+            return False
+        creds.refresh(Request())
+        return True
+    
+    def connection_info(self) -> Dict:
+        """Состояние подключения для диагностики"""
+        expiry = getattr(self.credentials, "expiry", None)
+        return {
+            "state": self.state,
+            "connected_at": self.connected_at,
+            "last_error": self.last_error,
+            "token_expiry": expiry.isoformat() if expiry else None,
+        }
     
     def _connect(self):
         """Подключение к Google Sheets"""
-        # region agent log
-        _dbg_log(
-            "A",
-            "google_sheets.py:GoogleSheets._connect",
-            "connect_start",
-            {
-                "has_sheet_id": bool(self.sheet_id),
-                "worksheet_name": self.worksheet_name,
-                "credentials_path": self.credentials_path,
-                "credentials_exists": bool(self.credentials_path and os.path.exists(self.credentials_path)),
-            },
+        log_event(
+            "sheets.connect_start",
+            has_sheet_id=bool(self.sheet_id),
+            worksheet_name=self.worksheet_name,
+            credentials_path=self.credentials_path,
+            credentials_exists=bool(self.credentials_path and os.path.exists(self.credentials_path)),
         )
-        # endregion
         if not os.path.exists(self.credentials_path):
             print(f"Warning: Credentials file not found at {self.credentials_path}")
-            # region agent log
-            _dbg_log(
-                "B",
-                "google_sheets.py:GoogleSheets._connect",
-                "credentials_missing",
-                {"credentials_path": self.credentials_path},
-            )
-            # endregion
+            self.last_error = f"нет файла учётных данных {self.credentials_path}"
+            log_event("sheets.credentials_missing", credentials_path=self.credentials_path)
             return
         
         scope = [
@@ -104,6 +212,7 @@ class GoogleSheets:
             scopes=scope
         )
         
+        self.credentials = creds
         self.client = gspread.authorize(creds)
         
         if self.sheet_id:
@@ -117,258 +226,134 @@ class GoogleSheets:
                     cols=20
                 )
                 self._init_headers()
-        # region agent log
-        _dbg_log(
-            "A",
-            "google_sheets.py:GoogleSheets._connect",
-            "connect_end",
-            {
-                "connected": bool(self.worksheet),
-                "sheet_opened": bool(self.sheet),
-            },
-        )
-        # endregion
+        log_event("sheets.connect_end", connected=bool(self.worksheet), sheet_opened=bool(self.sheet))
     
     def _init_headers(self):
         """Инициализация заголовков таблицы (при создании нового листа)"""
         if not self.worksheet:
             return
         
-        # Первая строка заголовков
-        header_row1 = [
-            "статус",
-            "№ заказа",
-            "дата и время готовности",
-            "Фамилия, Имя",
-            "@ телеграм",
-            "№ варианта",  # Будет объединено с 6 колонками для вариантов
-            "", "", "", "", "",  # Место для вариантов 1-6
-            "итого букетов",
-            "итого тюльпанов",
-            "сумма",
-            "оплата",
-            "возврат"
-        ]
-        
-        # Вторая строка заголовков (подзаголовки для вариантов)
-        header_row2 = [
-            "",  # статус
-            "",  # № заказа
-            "",  # дата и время готовности
-            "",  # Фамилия, Имя
-            "",  # @ телеграм
-            "1 (микс)",
-            "2 (красный)",
-            "3 (желтый)",
-            "4 (белый)",
-            "5 (фиол+желт)",
-            "6 (красн+желт)",
-            "",  # итого букетов
-            "",  # итого тюльпанов
-            "",  # сумма
-            "",  # оплата
-            ""   # возврат
-        ]
-        
-        self.worksheet.append_row(header_row1)
-        self.worksheet.append_row(header_row2)
+        self.worksheet.update(HEADER_RANGE, [HEADER_ROW1, HEADER_ROW2])
     
     def init_headers(self):
-        """Инициализация заголовков таблицы при каждом запуске (перезаписывает первые две строки)"""
+        """Проверить заголовки таблицы при запуске и перезаписать первые две строки, только если они отличаются"""
         # Убеждаемся, что подключение установлено
         self.ensure_connected()
         
         if not self.worksheet:
             print("Warning: Google Sheets not connected")
-            # region agent log
-            _dbg_log(
-                "A",
-                "google_sheets.py:GoogleSheets.init_headers",
-                "no_worksheet",
-                {"has_sheet_id": bool(self.sheet_id)},
-            )
-            # endregion
+            log_event("sheets.init_headers_no_worksheet", has_sheet_id=bool(self.sheet_id))
             return False
         
-        # Первая строка заголовков
-        header_row1 = [
-            "статус",
-            "№ заказа",
-            "дата и время готовности",
-            "Фамилия, Имя",
-            "@ телеграм",
-            "№ варианта",
-            "", "", "", "", "",  # Место для вариантов 1-6
-            "итого букетов",
-            "итого тюльпанов",
-            "сумма",
-            "оплата",
-            "возврат"
-        ]
-        
-        # Вторая строка заголовков (подзаголовки для вариантов)
-        header_row2 = [
-            "",  # статус
-            "",  # № заказа
-            "",  # дата и время готовности
-            "",  # Фамилия, Имя
-            "",  # @ телеграм
-            "1 (микс)",
-            "2 (красный)",
-            "3 (желтый)",
-            "4 (белый)",
-            "5 (фиол+желт)",
-            "6 (красн+желт)",
-            "",  # итого букетов
-            "",  # итого тюльпанов
-            "",  # сумма
-            "",  # оплата
-            ""   # возврат
-        ]
-        
         try:
-            # Получаем все данные из таблицы
-            all_values = self.worksheet.get_all_values()
+            # Читаем только диапазон заголовков, а не весь лист
+            current = self._call("read", self.worksheet.get, HEADER_RANGE)
+            current_rows = [list(row) + [""] * (len(HEADER_ROW1) - len(row)) for row in current]
+            if current_rows == [HEADER_ROW1, HEADER_ROW2]:
+                return True
             
-            print(f"Initializing headers. Current rows in sheet: {len(all_values)}")
-            # region agent log
-            _dbg_log(
-                "A",
-                "google_sheets.py:GoogleSheets.init_headers",
-                "before_replace",
-                {"rows": len(all_values)},
-            )
-            # endregion
+            log_event("sheets.headers_differ", rows=len(current_rows))
             
-            # Всегда обновляем первые две строки через update
-            # Если строк меньше двух, добавляем недостающие
-            if len(all_values) >= 2:
-                # Обновляем существующие первые две строки (без сдвига данных)
-                r1 = self.worksheet.update("A1:P1", [header_row1])
-                r2 = self.worksheet.update("A2:P2", [header_row2])
-                # region agent log
-                _dbg_log(
-                    "A",
-                    "google_sheets.py:GoogleSheets.init_headers",
-                    "updated_header_rows",
-                    {
-                        "update1": r1,
-                        "update2": r2,
-                    },
-                )
-                # endregion
-                return True
-            elif len(all_values) == 1:
-                # Обновляем первую строку и добавляем вторую
-                r1 = self.worksheet.update("A1:P1", [header_row1])
-                self.worksheet.insert_row(header_row2, 2)
-                # region agent log
-                _dbg_log(
-                    "A",
-                    "google_sheets.py:GoogleSheets.init_headers",
-                    "updated_row1_inserted_row2",
-                    {"update1": r1},
-                )
-                # endregion
-                return True
+            if len(current_rows) == 2 and current_rows[1][ORDER_NUMBER_COL - 1] and current_rows[1] != HEADER_ROW2:
+                # Во второй строке уже заказ (старый лист с одной строкой заголовков) - не затираем его
+                self._call("write", self.worksheet.update, "A1:P1", [HEADER_ROW1])
+                self._call("write", self.worksheet.insert_row, HEADER_ROW2, 2)
+                self._rows = None
+                logger.info("Updated header row 1 and inserted header row 2")
             else:
-                # Если таблица пустая, вставляем заголовки
-                self.worksheet.insert_row(header_row2, 1)  # Сначала вторую строку
-                self.worksheet.insert_row(header_row1, 1)  # Потом первую строку (она будет выше)
-                print("Inserted header rows into empty sheet")
-                # region agent log
-                _dbg_log(
-                    "A",
-                    "google_sheets.py:GoogleSheets.init_headers",
-                    "inserted_into_empty",
-                    {},
-                )
-                # endregion
-                return True
+                self._call("write", self.worksheet.update, HEADER_RANGE, [HEADER_ROW1, HEADER_ROW2])
+                logger.info("Updated header rows")
+            return True
             
         except Exception as e:
             print(f"Error initializing headers: {e}")
             traceback.print_exc()
-            # region agent log
-            _dbg_log(
-                "E",
-                "google_sheets.py:GoogleSheets.init_headers",
-                "exception",
-                {"error": str(e), "trace": traceback.format_exc()[:1000]},
-            )
-            # endregion
-            # Если произошла ошибка, пробуем другой способ
+            log_event("sheets.init_headers_failed", error=str(e), trace=traceback.format_exc()[:1000])
+            return False
+    
+    def _call(self, kind: str, fn: Callable, *args, idempotent: bool = True, **kwargs):
+        """Вызвать метод gspread с учётом квоты и повторами на 429/5xx.
+        
+        kind - "read" или "write". Неидемпотентные запросы (append_rows) при 5xx
+        не повторяются: строки могли уже добавиться.
+        """
+        bucket = _read_bucket if kind == "read" else _write_bucket
+        for attempt in range(Config.SHEETS_MAX_RETRIES + 1):
+            waited = bucket.acquire()
+            if waited:
+                SHEETS_STATS["throttled"] += 1
+                SHEETS_STATS["throttled_seconds"] += waited
+                log_event("sheets.throttled", kind=kind, method=getattr(fn, "__name__", kind), waited=round(waited, 3))
+            SHEETS_STATS[f"{kind}s"] += 1
             try:
-                # Пробуем удалить первые две строки и вставить новые
-                all_values = self.worksheet.get_all_values()
-                if len(all_values) >= 2:
-                    self.worksheet.delete_rows(1, 2)
-                elif len(all_values) == 1:
-                    self.worksheet.delete_rows(1, 1)
-                # Вставляем новые заголовки
-                self.worksheet.insert_row(header_row2, 1)
-                self.worksheet.insert_row(header_row1, 1)
-                print("Used fallback method to insert headers")
-                # region agent log
-                _dbg_log(
-                    "E",
-                    "google_sheets.py:GoogleSheets.init_headers",
-                    "fallback_insert_ok",
-                    {},
-                )
-                # endregion
-                return True
-            except Exception as e2:
-                print(f"Error adding headers as fallback: {e2}")
-                traceback.print_exc()
-                # region agent log
-                _dbg_log(
-                    "E",
-                    "google_sheets.py:GoogleSheets.init_headers",
-                    "fallback_insert_failed",
-                    {"error": str(e2), "trace": traceback.format_exc()[:1000]},
-                )
-                # endregion
-                return False
+                return fn(*args, **kwargs)
+            except Exception as e:
+                reason = _retry_reason(e)
+                if reason is None:
+                    raise
+                SHEETS_STATS[reason] += 1
+                method = getattr(fn, "__name__", kind)
+                if attempt == Config.SHEETS_MAX_RETRIES or (reason != "rate_limited" and not idempotent):
+                    SHEETS_STATS["gave_up"] += 1
+                    logger.error(f"Google Sheets {reason} on {method}: повторов больше не будет ({attempt + 1} попыток)")
+                    log_event("sheets.gave_up", reason=reason, method=method, attempts=attempt + 1, error=str(e))
+                    raise
+                # Экспоненциальная пауза с полным джиттером
+                delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+                SHEETS_STATS["retries"] += 1
+                logger.warning(f"Google Sheets {reason} on {method}, повтор через {delay:.1f} с")
+                log_event("sheets.retry", reason=reason, method=method, attempt=attempt + 1, delay=round(delay, 3))
+                time.sleep(delay)
+    
+    def _load_row_index(self) -> Dict[str, int]:
+        """Прочитать колонку с номерами заказов и построить индекс строк"""
+        column = self._call("read", self.worksheet.col_values, ORDER_NUMBER_COL)
+        rows = {}
+        for row, value in enumerate(column, start=1):
+            if row > HEADER_ROWS and value and value not in rows:
+                rows[value] = row
+        self._rows = rows
+        return rows
+    
+    def _row_index(self) -> Dict[str, int]:
+        return self._rows if self._rows is not None else self._load_row_index()
+    
+    def _remember_appended(self, order_numbers: List[str], response: Dict):
+        """Запомнить строки только что добавленных заказов по ответу append_rows (по две строки на заказ)"""
+        updated_range = (response or {}).get("updates", {}).get("updatedRange", "")
+        match = re.search(r"![A-Z]+(\d+)", updated_range)
+        if match and self._rows is not None:
+            start = int(match.group(1))
+            for i, order_number in enumerate(order_numbers):
+                self._rows[order_number] = start + 2 * i
+        else:
+            # Не удалось понять, куда легли строки - перечитаем индекс при следующем обращении
+            self._rows = None
+    
+    def find_order_row(self, order_number: str) -> Optional[int]:
+        """Номер первой строки заказа в таблице (None, если заказа нет)"""
+        return self._row_index().get(order_number)
     
     def add_order(self, order: Dict):
         """Добавить заказ в таблицу (создает две строки: количество букетов и количество тюльпанов по вариантам)"""
-        # region agent log
-        _dbg_log(
-            "C",
-            "google_sheets.py:GoogleSheets.add_order",
-            "enter",
-            {
-                "has_worksheet": bool(self.worksheet),
-                "order_number_present": bool(order.get("order_number")),
-                "status": order.get("status"),
-                "bouquets_len": len(order.get("bouquets", []) or []),
-            },
+        log_event(
+            "sheets.add_order",
+            has_worksheet=bool(self.worksheet),
+            order_number_present=bool(order.get("order_number")),
+            status=order.get("status"),
+            bouquets_len=len(order.get("bouquets", []) or []),
         )
-        # endregion
         if not self.worksheet:
             print("Warning: Google Sheets not connected")
-            # region agent log
-            _dbg_log(
-                "D",
-                "google_sheets.py:GoogleSheets.add_order",
-                "no_worksheet",
-                {},
-            )
-            # endregion
+            log_event("sheets.add_order_no_worksheet")
             return
         
+        self.apply_changes([{"action": "add", "order": order}])
+    
+    def _order_rows(self, order: Dict) -> List[List]:
+        """Две строки заказа: количество букетов и количество тюльпанов по вариантам"""
         order_number = order.get("order_number", "")
         
-        # Проверяем, не существует ли уже заказ в таблице
-        try:
-            existing_cells = self.worksheet.findall(order_number)
-            if existing_cells:
-                print(f"Order {order_number} already exists in sheet, skipping add")
-                return
-        except:
-            pass  # Если не найдено, продолжаем
-        
         # Общие данные заказа
         status = order.get("status", "pending_payment")
         pickup_date = order.get("pickup_date", "")
@@ -457,74 +442,276 @@ class GoogleSheets:
             ""   # возврат
         ]
         
-        # Добавляем обе строки заказа
+        return [row1, row2]
+    
+    def update_order_status(self, order_number: str, status: str, **kwargs):
+        """Обновить статус заказа в таблице (обновляет первую строку заказа, где находятся статус, сумма, оплата, возврат)"""
+        if not self.worksheet:
+            return
+        
         try:
-            self.worksheet.append_rows([row1, row2])
-            # region agent log
-            _dbg_log(
-                "E",
-                "google_sheets.py:GoogleSheets.add_order",
-                "append_rows_ok",
-                {"order_number": order_number},
-            )
-            # endregion
+            self.apply_changes([{"action": "status", "order_number": order_number, "status": status, **kwargs}])
         except Exception as e:
-            # region agent log
-            _dbg_log(
-                "E",
-                "google_sheets.py:GoogleSheets.add_order",
-                "append_rows_failed",
-                {"order_number": order_number, "error": str(e), "trace": traceback.format_exc()[:1000]},
-            )
-            # endregion
+            print(f"Error updating order {order_number} in sheet: {e}")
+            # Пробрасываем, чтобы очередь синхронизации повторила попытку
             raise
     
-    def update_order_status(self, order_number: str, status: str, **kwargs):
-        """Обновить статус заказа в таблице (обновляет первую строку заказа, где находятся статус, сумма, оплата, возврат)"""
+    def _checked_rows(self, order_numbers: List[str]) -> Dict[str, List]:
+        """Строки заказов с проверкой индекса: номер первой строки и значения A..N обеих строк.
+        
+        Все строки читаются одним batch_get; если хоть одна не совпала с индексом
+        (строки сдвинули вручную), индекс перестраивается и чтение повторяется.
+        """
+        for attempt in range(2):
+            index = self._row_index() if attempt == 0 else self._load_row_index()
+            rows = {n: index[n] for n in order_numbers if n in index}
+            ranges = [f"A{row}:{TOTAL_PRICE_COL}{row + 1}" for row in rows.values()]
+            values = self._call("read", self.worksheet.batch_get, ranges) if ranges else []
+            checked = {}
+            for (order_number, row), value in zip(rows.items(), values):
+                if value and len(value[0]) >= ORDER_NUMBER_COL and value[0][ORDER_NUMBER_COL - 1] == order_number:
+                    checked[order_number] = [row, value[0], value[1] if len(value) > 1 else []]
+            if len(checked) == len(order_numbers):
+                break
+        for order_number in order_numbers:
+            if order_number not in checked:
+                logger.warning(f"Order {order_number} not found in sheet")
+        return checked
+    
+    def apply_changes(self, changes: List[Dict]):
+        """Применить пачку изменений заказов (см. _apply_changes)"""
+        with self._write_lock:
+            self._apply_changes(changes)
+    
+    def _apply_changes(self, changes: List[Dict]):
+        """Применить пачку изменений заказов минимальным числом запросов.
+        
+        changes - список {"action": "add", "order": {...}} и
+        {"action": "status", "order_number": ..., "status": ..., "order": ..., "refund_amount": ...}.
+        Все новые заказы добавляются одним append_rows, все изменения ячеек
+        уходят одним batch_update; повторные записи в одну ячейку схлопываются
+        в последнее значение. Затем изменившиеся строки сводки пишутся одним batch_update.
+        """
         if not self.worksheet:
             return
         
+        summary = self._summary_table()
         try:
-            # Найти первую строку с номером заказа (заказ занимает две строки: первая - количество букетов, вторая - количество тюльпанов)
-            cells = self.worksheet.findall(order_number)
-            if not cells:
-                print(f"Order {order_number} not found in sheet")
-                return
-            
-            # Берем первую найденную строку (это строка с количеством букетов, где находятся статус, сумма, оплата, возврат)
-            first_row = cells[0].row
-            
-            # Определяем статус для отображения
-            status_display = "оплачен" if status == "paid" else "отменен" if status == "cancelled" else "ожидает оплаты"
+            self._apply_order_changes(changes, summary)
+        except Exception:
+            # Часть изменений могла записаться - сводку пересчитаем по листу заказов
+            self._summary = None
+            raise
+        if summary is not None:
+            self._write_summary(summary)
+    
+    def _apply_order_changes(self, changes: List[Dict], summary: Optional[SummaryTable]):
+        """Записать изменения в лист заказов и учесть оплаты/отмены в сводке (в памяти)"""
+        # Новые заказы (уже существующие в таблице и повторы в пачке пропускаем)
+        index = self._row_index()
+        new_orders: Dict[str, Dict] = {}
+        for change in changes:
+            if change["action"] != "add":
+                continue
+            order_number = change["order"].get("order_number", "")
+            if order_number in index or order_number in new_orders:
+                logger.info(f"Order {order_number} already exists in sheet, skipping add")
+                continue
+            new_orders[order_number] = change["order"]
+        
+        if new_orders:
+            order_rows = {order_number: self._order_rows(order) for order_number, order in new_orders.items()}
+            rows = [row for pair in order_rows.values() for row in pair]
+            try:
+                response = self._call("write", self.worksheet.append_rows, rows, idempotent=False)
+                self._remember_appended(list(new_orders), response)
+                log_event("sheets.append_rows_ok", order_numbers=list(new_orders))
+            except Exception as e:
+                # Строки могли добавиться несмотря на ошибку - перед повтором перечитаем индекс
+                self._rows = None
+                log_event(
+                    "sheets.append_rows_failed",
+                    order_numbers=list(new_orders),
+                    error=str(e),
+                    trace=traceback.format_exc()[:1000],
+                )
+                raise
+            if summary is not None:
+                for row1, row2 in order_rows.values():
+                    if row1[0] == PAID_DISPLAY:
+                        summary.add(*order_counts(row1, row2), sign=1)
+        
+        # Изменения статусов: ячейки первой строки заказа, последнее значение побеждает
+        updates = [change for change in changes if change["action"] == "status"]
+        if not updates:
+            return
+        checked = self._checked_rows(list(dict.fromkeys(change["order_number"] for change in updates)))
+        # Текущий статус в таблице: по нему видно, учтён ли заказ в сводке
+        displayed = {order_number: values[1][0] for order_number, values in checked.items()}
+        cells: Dict[str, object] = {}
+        for change in updates:
+            if change["order_number"] not in checked:
+                continue
+            row, row_values, second_row = checked[change["order_number"]]
+            status = change["status"]
             
-            # Получаем данные заказа для обновления суммы оплаты
-            order = kwargs.get("order")
+            # Сумма берётся из заказа, а если он не передан - из строки (колонка N - "сумма")
+            order = change.get("order")
             if order:
                 total_price = order.get("total_price", 0)
-                payment_amount = total_price if status == "paid" else 0
             else:
-                # Если заказ не передан, пытаемся получить сумму из существующей строки
-                try:
-                    # Колонка "сумма" = 15 (после: статус, № заказа, дата, имя, телеграм, № варианта, 6 вариантов, итого букетов, итого тюльпанов)
-                    total_price = self.worksheet.cell(first_row, 15).value
-                    payment_amount = total_price if status == "paid" else 0
-                except:
-                    payment_amount = 0
-            
-            refund_amount = kwargs.get("refund_amount", "")
+                total_price = row_values[13] if len(row_values) > 13 else 0
+            status_display, payment_amount = _status_values(status, total_price)
             
-            # Обновляем первую строку заказа
-            # Статус (колонка 1)
-            self.worksheet.update_cell(first_row, 1, status_display)
+            was_paid = displayed[change["order_number"]] == PAID_DISPLAY
+            if summary is not None and was_paid != (status_display == PAID_DISPLAY):
+                summary.add(*order_counts(row_values, second_row), sign=-1 if was_paid else 1)
+            displayed[change["order_number"]] = status_display
             
-            # Сумма оплаты (колонка 16 - "оплата")
-            self.worksheet.update_cell(first_row, 16, payment_amount)
-                
-            # Возврат (колонка 17 - "возврат") если есть
+            cells[f"{STATUS_COL}{row}"] = status_display
+            cells[f"{PAYMENT_COL}{row}"] = payment_amount
+            refund_amount = change.get("refund_amount", "")
             if refund_amount:
-                self.worksheet.update_cell(first_row, 17, refund_amount)
-                    
+                cells[f"{REFUND_COL}{row}"] = refund_amount
+        
+        if cells:
+            self._call("write", self.worksheet.batch_update, [{"range": cell, "values": [[value]]} for cell, value in cells.items()])
+    
+    def _summary_table(self, orders_values: Optional[List[List]] = None) -> Optional[SummaryTable]:
+        """Сводка в памяти; при первом обращении считается по листу заказов (None - сводка отключена или недоступна).
+        
+        orders_values - уже прочитанные строки листа заказов (тогда он повторно не читается).
+        """
+        if not self.summary_name or not self.sheet:
+            return None
+        if self._summary is not None:
+            return self._summary
+        try:
+            if self.summary_worksheet is None:
+                try:
+                    self.summary_worksheet = self._call("read", self.sheet.worksheet, self.summary_name)
+                except gspread.exceptions.WorksheetNotFound:
+                    self.summary_worksheet = self._call(
+                        "write", self.sheet.add_worksheet, idempotent=False,
+                        title=self.summary_name, rows=1000, cols=len(SUMMARY_HEADER)
+                    )
+                    self._call("write", self.summary_worksheet.update, SUMMARY_HEADER_RANGE, [SUMMARY_HEADER])
+            if orders_values is None:
+                orders_values = self._call("read", self.worksheet.get, f"A{HEADER_ROWS + 1}:P")
+            summary_values = self._call("read", self.summary_worksheet.get, f"A{SUMMARY_FIRST_ROW}:P")
         except Exception as e:
-            print(f"Error updating order {order_number} in sheet: {e}")
+            # Сводка не должна мешать записи заказов; попробуем при следующем изменении
+            logger.error(f"Error loading summary worksheet: {e}", exc_info=True)
+            log_event("sheets.summary_load_failed", error=str(e))
+            return None
+        self._summary = SummaryTable.build(orders_values, summary_values)
+        log_event("sheets.summary_built", slots=len(self._summary.counts))
+        return self._summary
+    
+    def _write_summary(self, summary: SummaryTable):
+        """Записать изменившиеся строки сводки одним batch_update"""
+        updates = summary.pending_updates()
+        if not updates:
+            return
+        try:
+            self._call("write", self.summary_worksheet.batch_update, updates)
+        except Exception as e:
+            # Лист заказов уже записан; сводку пересчитаем по нему при следующем изменении
+            self._summary = None
+            logger.error(f"Error updating summary worksheet: {e}", exc_info=True)
+            log_event("sheets.summary_write_failed", error=str(e), rows=len(updates))
+            return
+        summary.written()
+    
+    def refresh_summary(self) -> bool:
+        """Пересчитать сводку по листу заказов и исправить отличающиеся строки"""
+        with self._write_lock:
+            self._summary = None
+            summary = self._summary_table()
+            if summary is None:
+                return False
+            self._write_summary(summary)
+            return True
+
+    
+    def reconcile_orders(self, orders: Dict[str, Dict]) -> Dict:
+        """Сверить таблицу с локальными заказами и исправить только расхождения.
+        
+        В таблице должны быть все заказы, которые были оплачены (включая отменённые
+        после оплаты). Лист читается одним запросом, недостающие заказы дописываются
+        и неверные статусы/суммы исправляются через apply_changes (один append_rows
+        и один batch_update).
+        """
+        self.ensure_connected()
+        if not self.worksheet:
+            raise RuntimeError("Google Sheets не подключены")
+        
+        with self._write_lock:
+            values = self._call("read", self.worksheet.get, f"A{HEADER_ROWS + 1}:P")
+            # Заодно перестраиваем индекс строк по этому же чтению
+            rows: Dict[str, int] = {}
+            sheet: Dict[str, List] = {}
+            for offset, row in enumerate(values):
+                order_number = row[ORDER_NUMBER_COL - 1] if len(row) >= ORDER_NUMBER_COL else ""
+                if order_number and order_number not in rows:
+                    rows[order_number] = HEADER_ROWS + 1 + offset
+                    sheet[order_number] = list(row) + [""] * (len(HEADER_ROW1) - len(row))
+            self._rows = rows
+            sheet_rows = len(rows)
+            
+            changes = []
+            appended = []
+            updated = []
+            checked = 0
+            for order_number, order in orders.items():
+                status = order.get("status")
+                if status != "paid" and not order.get("payment_confirmed_at"):
+                    continue  # Неоплаченные заказы в таблицу не попадают
+                checked += 1
+                order = {**order, "order_number": order_number}
+                total_price = order.get("total_price", 0)
+                refund_amount = total_price if status == "cancelled" and order.get("refund_card") else ""
+                status_change = {
+                    "action": "status",
+                    "order_number": order_number,
+                    "status": status,
+                    "order": order,
+                    "refund_amount": refund_amount,
+                }
+                
+                row = sheet.get(order_number)
+                if row is None:
+                    changes.append({"action": "add", "order": order})
+                    if refund_amount:
+                        changes.append(status_change)
+                    appended.append(order_number)
+                    continue
+                
+                status_display, payment_amount = _status_values(status, total_price)
+                if (row[0] != status_display
+                        or not _same_amount(row[14], payment_amount)
+                        or (refund_amount and not _same_amount(row[15], refund_amount))):
+                    changes.append(status_change)
+                    updated.append(order_number)
+            
+            # Заодно пересчитываем сводку по этому же чтению: лист заказов могли править вручную.
+            # Изменения ниже учитываются в ней так же, как при обычной записи
+            self._summary = None
+            summary = self._summary_table(orders_values=values)
+            if changes:
+                self._apply_changes(changes)
+            elif summary is not None:
+                self._write_summary(summary)
+        
+        log_event("sheets.reconciled", checked=checked, sheet_rows=sheet_rows, appended=appended, updated=updated)
+        return {"checked": checked, "sheet_rows": sheet_rows, "appended": appended, "updated": updated}
+
+_sheets: Optional[GoogleSheets] = None
 
 
+def get_sheets() -> GoogleSheets:
+    """Общий на процесс клиент Google Sheets (подключается лениво)"""
+    global _sheets
+    if _sheets is None:
+        _sheets = GoogleSheets()
+    return _sheets
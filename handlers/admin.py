@@ -1,15 +1,19 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from datetime import datetime
+from checkout_panel import PANEL_STATS
 from config import Config
-from database import Database
-from google_sheets import GoogleSheets
+from database import create_database
+from google_sheets import get_sheets, SHEETS_STATS
+from inventory import get_inventory
+from photo_cache import get_photo_cache
+from pickup_slots import get_pickup_slots
+from sheets_sync import get_sheets_sync
 
 router = Router()
-db = Database()
-sheets = GoogleSheets()
+db = create_database()
 
 
 admin_keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -23,6 +27,7 @@ admin_keyboard = InlineKeyboardMarkup(inline_keyboard=[
             InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats")
         ],
         [InlineKeyboardButton(text="🔍 Найти заказ", callback_data="admin_search_order")],
+        [InlineKeyboardButton(text="🔄 Сверить с таблицей", callback_data="admin_reconcile")],
         [InlineKeyboardButton(text="Остатки", callback_data="admin_stock")]
         
     ])
@@ -257,14 +262,47 @@ async def admin_stats_handler(callback: CallbackQuery):
     
     total_revenue = sum(o.get("total_price", 0) for o in orders.values() if o.get("status") == "paid")
     
+    sync = await get_sheets_sync().status()
+    connection = get_sheets().connection_info()
+    
     text = (
         "📊 Статистика заказов:\n\n"
         f"Всего заказов: {total_orders}\n"
         f"⏳ Ожидают оплаты: {pending}\n"
         f"✅ Оплачено: {paid}\n"
         f"❌ Отменено: {cancelled}\n\n"
-        f"💰 Общая выручка: {total_revenue:,} ₽"
+        f"💰 Общая выручка: {total_revenue:,} ₽\n\n"
+        "📤 Google Sheets:\n"
+        f"Подключение: {connection['state']}\n"
+        f"В очереди: {sync['depth']} (задержка {int(sync['lag'])} с)\n"
+        f"Не отправлено после всех попыток: {sync['failed']}\n"
+        f"Запросов: чтение {SHEETS_STATS['reads']}, запись {SHEETS_STATS['writes']}; "
+        f"ожиданий квоты {SHEETS_STATS['throttled']} ({SHEETS_STATS['throttled_seconds']:.0f} с), "
+        f"429: {SHEETS_STATS['rate_limited']}, 5xx: {SHEETS_STATS['server_errors']}, "
+        f"повторов: {SHEETS_STATS['retries']}"
+    )
+    if sync["last_error"]:
+        text += f"\nПоследняя ошибка: {sync['last_error'][:200]}"
+    
+    photos = get_photo_cache().stats
+    text += (
+        "\n\n🖼 Фото каталога:\n"
+        f"Загружено: {photos['uploads']} ({photos['bytes_uploaded'] / 1024:.0f} КБ), "
+        f"отправлено по file_id: {photos['cached_sends']}"
     )
+    if Config.CHECKOUT_PANEL:
+        text += (
+            f"\nПанель оформления: правок {PANEL_STATS['edits']}, новых сообщений {PANEL_STATS['sends']} "
+            f"(панель пропала: {PANEL_STATS['fallbacks']})"
+        )
+    
+    slots = get_pickup_slots().snapshot()
+    limited = {slot: used for slot, used in slots.items() if used["capacity"] is not None}
+    if limited:
+        text += "\n\n🕒 Слоты самовывоза (заказы + брони / мест):\n" + "\n".join(
+            f"{date} {hour}: {used['booked']} + {used['held']} / {used['capacity']}"
+            for (date, hour), used in limited.items()
+        )
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🔙 Назад в меню", callback_data="admin_menu")]
@@ -274,6 +312,41 @@ async def admin_stats_handler(callback: CallbackQuery):
     await callback.answer()
 
 
+@router.callback_query(F.data == "admin_reconcile")
+async def admin_reconcile_handler(callback: CallbackQuery):
+    """Сверить Google Sheets с локальными заказами и исправить расхождения"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("У вас нет прав администратора", show_alert=True)
+        return
+    
+    await callback.answer("Сверка запущена...")
+    
+    try:
+        orders = await db.get_all_orders()
+        report = await get_sheets_sync().reconcile(orders)
+    except Exception as e:
+        await callback.message.answer(f"❌ Не удалось сверить таблицу: {e}")
+        return
+    
+    text = (
+        "🔄 Сверка с Google Sheets завершена\n\n"
+        f"Оплаченных заказов проверено: {report['checked']}\n"
+        f"Заказов в таблице: {report['sheet_rows']}\n"
+        f"Дописано: {len(report['appended'])}\n"
+        f"Исправлено: {len(report['updated'])}"
+    )
+    if report["appended"]:
+        text += f"\n\nДописаны: {', '.join(report['appended'][:50])}"
+    if report["updated"]:
+        text += f"\nИсправлены: {', '.join(report['updated'][:50])}"
+    
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔙 Назад в меню", callback_data="admin_menu")]
+    ])
+    
+    await callback.message.answer(text, reply_markup=keyboard)
+
+
 @router.callback_query(F.data == "admin_search_order")
 async def admin_search_order(callback: CallbackQuery, state: FSMContext):
     """Поиск заказа по номеру"""
@@ -317,6 +390,7 @@ async def admin_stock_menu(callback: CallbackQuery):
         return
     
     stock = await db.get_stock_status()
+    counts = get_inventory().snapshot()
     
     text = "📦 Управление остатками\n\n"
     text += "Выберите товар для включения/выключения:\n\n"
@@ -328,7 +402,11 @@ async def admin_stock_menu(callback: CallbackQuery):
         status_icon = "✅" if is_available else "❌"
         status_text = "Доступен" if is_available else "Недоступен"
         
-        text += f"{status_icon} №{variant_num} «{variant_name}» — {status_text}\n"
+        text += f"{status_icon} №{variant_num} «{variant_name}» — {status_text}"
+        count = counts.get(str(variant_num))
+        if count:
+            text += f", осталось {count['remaining']} из {count['count']} (в корзинах {count['held']})"
+        text += "\n"
         
         button_text = f"{'✅' if is_available else '❌'} №{variant_num} «{variant_name}»"
         buttons.append([InlineKeyboardButton(
@@ -336,6 +414,12 @@ async def admin_stock_menu(callback: CallbackQuery):
             callback_data=f"admin_toggle_stock_{variant_num}"
         )])
     
+    text += (
+        "\nКоличество в штуках: /stock <номер> <сколько букетов можно продать>\n"
+        "Снять ограничение: /stock <номер> -\n"
+        "Закончившийся вариант выключается автоматически."
+    )
+    
     buttons.append([InlineKeyboardButton(text="🔙 Назад в меню", callback_data="admin_menu")])
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -425,6 +509,7 @@ async def admin_stock_menu(callback: CallbackQuery):
         return
     
     stock = await db.get_stock_status()
+    counts = get_inventory().snapshot()
     
     text = "📦 Управление остатками\n\n"
     text += "Выберите товар для включения/выключения:\n\n"
@@ -436,7 +521,11 @@ async def admin_stock_menu(callback: CallbackQuery):
         status_icon = "✅" if is_available else "❌"
         status_text = "Доступен" if is_available else "Недоступен"
         
-        text += f"{status_icon} №{variant_num} «{variant_name}» — {status_text}\n"
+        text += f"{status_icon} №{variant_num} «{variant_name}» — {status_text}"
+        count = counts.get(str(variant_num))
+        if count:
+            text += f", осталось {count['remaining']} из {count['count']} (в корзинах {count['held']})"
+        text += "\n"
         
         button_text = f"{'✅' if is_available else '❌'} №{variant_num} «{variant_name}»"
         buttons.append([InlineKeyboardButton(
@@ -444,6 +533,12 @@ async def admin_stock_menu(callback: CallbackQuery):
             callback_data=f"admin_toggle_stock_{variant_num}"
         )])
     
+    text += (
+        "\nКоличество в штуках: /stock <номер> <сколько букетов можно продать>\n"
+        "Снять ограничение: /stock <номер> -\n"
+        "Закончившийся вариант выключается автоматически."
+    )
+    
     buttons.append([InlineKeyboardButton(text="🔙 Назад в меню", callback_data="admin_menu")])
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -469,3 +564,38 @@ async def admin_toggle_stock(callback: CallbackQuery):
     
     # Обновляем меню остатков
     await admin_stock_menu(callback)
+
+
+@router.message(Command("stock"))
+async def admin_set_stock_count(message: Message, command: CommandObject):
+    """Задать остаток варианта в штуках: /stock 3 20 (или /stock 3 - без ограничения)"""
+    if not is_admin(message.from_user.id):
+        await message.answer("У вас нет прав администратора.")
+        return
+    
+    args = (command.args or "").split()
+    if (
+        len(args) != 2 or not args[0].isdigit() or int(args[0]) not in Config.BOUQUET_VARIANTS
+        or not (args[1] == "-" or args[1].isdigit())
+    ):
+        await message.answer(
+            "Формат: /stock <номер варианта> <количество букетов>\n"
+            "Например: /stock 3 20\n"
+            "Без ограничения: /stock 3 -"
+        )
+        return
+    
+    variant_num = int(args[0])
+    count = None if args[1] == "-" else int(args[1])
+    variant_name = Config.BOUQUET_VARIANTS[variant_num]["name"]
+    
+    await get_inventory().set_count(variant_num, count)
+    
+    if count is None:
+        await message.answer(f"№{variant_num} «{variant_name}»: количество больше не ограничено")
+    else:
+        await message.answer(
+            f"№{variant_num} «{variant_name}»: можно продать ещё {count} "
+            f"{'букет' if count == 1 else 'букета' if count in [2, 3, 4] else 'букетов'}"
+            + ("" if count else " — вариант выключен")
+        )
@@ -4,12 +4,12 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from datetime import datetime, timedelta
 from config import Config
-from database import Database
-from google_sheets import GoogleSheets
+from database import create_database
+from sheets_sync import get_sheets_sync
 
 router = Router()
-db = Database()
-sheets = GoogleSheets()
+db = create_database()
+sheets_sync = get_sheets_sync()
 
 
 class CancellationStates(StatesGroup):
@@ -213,9 +213,9 @@ async def refund_card_entered(message: Message, state: FSMContext):
     # Обновление статуса заказа
     await db.update_order_status(order_number, "cancelled", refund_card=card_number)
     
-    # Обновление в Google Sheets
+    # Обновление в Google Sheets (в фоне через очередь)
     refund_amount = order.get('total_price', 0) if order else 0
-    sheets.update_order_status(order_number, "cancelled", order=order, refund_amount=refund_amount)
+    await sheets_sync.update_order_status(order_number, "cancelled", order=order, refund_amount=refund_amount)
     
     # Уведомление администраторов
     admin_text = (
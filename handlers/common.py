@@ -3,11 +3,14 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from config import Config
-from database import Database
+from database import create_database
+from image_pipeline import catalog_photo
+from photo_cache import get_photo_cache
 import os
 
 router = Router()
-db = Database()
+db = create_database()
+photo_cache = get_photo_cache()
 
 
 @router.message(Command("start"))
@@ -67,12 +70,12 @@ async def cmd_start(message: Message, state: FSMContext):
         "👉 Нажмите «Выбрать букет»"
     )
     
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
+    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     
     # Отправляем картинку с цветами, если она существует
     colors_photo_path = "data/colors.jpg"
     if os.path.exists(colors_photo_path):
-        await message.answer_photo(photo=FSInputFile(colors_photo_path))
+        await photo_cache.answer_photo(message, catalog_photo(colors_photo_path))
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="Выбрать букет", callback_data="start_order")],
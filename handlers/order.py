@@ -1,23 +1,33 @@
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, FSInputFile, InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from typing import List, Dict
 from config import Config
-from database import Database
-from google_sheets import GoogleSheets
+from database import create_database
 from order_template import OrderTemplate
+from catalog_collage import catalog_collage
+import checkout_panel
+from image_pipeline import catalog_photo
+from inventory import get_inventory
+from keyboards import get_keyboards
+from photo_cache import get_photo_cache
+from pickup_slots import get_pickup_slots
 from datetime import datetime, timedelta
+import asyncio
 import os
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = Router()
-db = Database()
-sheets = GoogleSheets()
+db = create_database()
 order_template = OrderTemplate()
+photo_cache = get_photo_cache()
+keyboards = get_keyboards()
+pickup_slots = get_pickup_slots()
+inventory = get_inventory()
 
 
 class OrderStates(StatesGroup):
@@ -91,86 +101,54 @@ async def show_bouquet_selection(message_or_callback, state: FSMContext):
 async def show_bouquet_options(message_or_callback, state: FSMContext):
     """Показать варианты букетов с кнопками"""
     await state.set_state(OrderStates.selecting_bouquet)
+    target = message_or_callback.message if hasattr(message_or_callback, 'message') else message_or_callback
+    
+    text = (
+        "Отлично! Вот все 6 вариантов:\n\n"
+        "Выберите вариант букета:"
+    )
+    if keyboards.stock is None:
+        await keyboards.load(db)
+    stock = keyboards.stock
+    keyboard = keyboards.catalog()
+    
+    if Config.CATALOG_MODE == "collage":
+        # Каталог одним сообщением: коллаж вариантов с подписью и кнопками
+        try:
+            collage_path = await asyncio.to_thread(catalog_collage, stock)
+            if collage_path:
+                await photo_cache.answer_photo(target, collage_path, caption=text, reply_markup=keyboard)
+                await checkout_panel.forget(state)
+                return
+        except Exception as e:
+            logger.error(f"Error sending catalog collage: {e}", exc_info=True)
     
     # Отправляем картинку с цветами, если она существует
     colors_photo_path = "data/colors.jpg"
     if os.path.exists(colors_photo_path):
         try:
-            if hasattr(message_or_callback, 'message'):
-                await message_or_callback.message.answer_photo(photo=FSInputFile(colors_photo_path))
-            else:
-                await message_or_callback.answer_photo(photo=FSInputFile(colors_photo_path))
+            await photo_cache.answer_photo(target, catalog_photo(colors_photo_path))
         except Exception as e:
             logger.error(f"Error sending colors photo: {e}", exc_info=True)
     
-    text = (
-        "Отлично! Вот все 6 вариантов:\n\n"
-        "Выберите вариант букета:"
-    )
-    
     # Отправка фотографий букетов
     try:
-        from aiogram.types import InputMediaPhoto
         media_group = []
         for i in range(1, 7):
             photo_path = Config.BOUQUET_VARIANTS[i]["photo"]
             if os.path.exists(photo_path):
-                media_group.append(InputMediaPhoto(media=FSInputFile(photo_path)))
+                media_group.append(catalog_photo(photo_path))
             else:
                 logger.warning(f"Photo not found: {photo_path}")
         
         if media_group:
-            if hasattr(message_or_callback, 'message'):
-                await message_or_callback.message.answer_media_group(media_group)
-            else:
-                await message_or_callback.answer_media_group(media_group)
+            await photo_cache.answer_media_group(target, media_group)
         else:
             logger.warning("No photos found to send for bouquet variants")
     except Exception as e:
         logger.error(f"Error sending photos: {e}", exc_info=True)
     
-    # Кнопки для выбора букета с учетом остатков
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    stock = await db.get_stock_status()
-    
-    buttons = []
-    button_texts = {
-        1: "1️⃣ Микс",
-        2: "2️⃣ Красный",
-        3: "3️⃣ Жёлтый",
-        4: "4️⃣ Белый",
-        5: "5️⃣ Ж+Ф",
-        6: "6️⃣ К+Ж"
-    }
-    
-    row = []
-    for variant_num in range(1, 7):
-        is_available = stock.get(str(variant_num), True)
-        button_text = button_texts[variant_num]
-        
-        # Если товар недоступен, добавляем красный крестик
-        if not is_available:
-            button_text = f"❌ {button_text}"
-        
-        row.append(InlineKeyboardButton(
-            text=button_text,
-            callback_data=f"bouquet_{variant_num}"
-        ))
-        
-        # Добавляем по 2 кнопки в ряд
-        if len(row) == 2:
-            buttons.append(row)
-            row = []
-    
-    if row:
-        buttons.append(row)
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
-    
-    if hasattr(message_or_callback, 'message'):
-        await message_or_callback.message.answer(text, reply_markup=keyboard)
-    else:
-        await message_or_callback.answer(text, reply_markup=keyboard)
+    await checkout_panel.send(target, state, text, keyboard)
 
 
 @router.callback_query(F.data == "consent_yes", StateFilter(OrderStates.waiting_consent))
@@ -205,6 +183,10 @@ async def bouquet_selected(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Этот товар закончился и недоступен для заказа", show_alert=True)
         return
     
+    if inventory.available_for(callback.from_user.id, str(variant_num)) == 0:
+        await callback.answer(shortage_text(callback.from_user.id, str(variant_num)), show_alert=True)
+        return
+    
     variant = Config.BOUQUET_VARIANTS[variant_num]
     
     await state.update_data(
@@ -215,19 +197,18 @@ async def bouquet_selected(callback: CallbackQuery, state: FSMContext):
     
     # Отправка фотографий количества тюльпанов
     try:
-        from aiogram.types import InputMediaPhoto
         media_group = []
         
         photo_15_path = "data/15.jpg"
         photo_25_path = "data/25.jpg"
         
         if os.path.exists(photo_15_path):
-            media_group.append(InputMediaPhoto(media=FSInputFile(photo_15_path)))
+            media_group.append(catalog_photo(photo_15_path))
         if os.path.exists(photo_25_path):
-            media_group.append(InputMediaPhoto(media=FSInputFile(photo_25_path)))
+            media_group.append(catalog_photo(photo_25_path))
         
         if media_group:
-            await callback.message.answer_media_group(media_group)
+            await photo_cache.answer_media_group(callback.message, media_group)
     except Exception as e:
         logger.error(f"Error sending quantity photos: {e}", exc_info=True)
     
@@ -238,15 +219,21 @@ async def bouquet_selected(callback: CallbackQuery, state: FSMContext):
         f"Если вам нужно другое количество – напишите в личные сообщения {', '.join(Config.ADMIN_CONTACTS)}"
     )
     
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="15 штук", callback_data="qty_15")],
-        [InlineKeyboardButton(text="25 штук", callback_data="qty_25")]
-    ])
-    
-    await callback.message.answer(text, reply_markup=keyboard)
+    await checkout_panel.send(callback.message, state, text, keyboards.quantity())
     await callback.answer()
 
 
+def shortage_text(user_id: int, variant: str) -> str:
+    """Почему нельзя добавить ещё букет варианта с остатком в штуках"""
+    name = Config.BOUQUET_VARIANTS[int(variant)]["name"]
+    if inventory.remaining(variant) == 0:
+        return f"❌ Букеты №{variant} «{name}» закончились"
+    available = inventory.available_for(user_id, variant)
+    if available == 0:
+        return f"Все букеты №{variant} «{name}» сейчас в корзинах других покупателей, попробуйте через несколько минут"
+    return f"Букетов №{variant} «{name}» можно заказать не больше {available}"
+
+
 async def show_bouquet_count_selection(message_or_callback, state: FSMContext, variant_num: int, quantity: int, variant_name: str):
     """Показать полное содержание заказа и кнопки для изменения количества"""
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
@@ -314,7 +301,12 @@ async def show_bouquet_count_selection(message_or_callback, state: FSMContext, v
         ])
     
     # Определяем, как отправить сообщение
-    if hasattr(message_or_callback, 'message'):
+    if Config.CHECKOUT_PANEL:
+        if hasattr(message_or_callback, 'message'):
+            await checkout_panel.show(message_or_callback.message, state, text, keyboard)
+        else:
+            await checkout_panel.send(message_or_callback, state, text, keyboard)
+    elif hasattr(message_or_callback, 'message'):
         # Это callback, пробуем edit_text, если не получается - используем answer
         try:
             await message_or_callback.message.edit_text(text, reply_markup=keyboard)
@@ -336,9 +328,14 @@ async def quantity_selected(callback: CallbackQuery, state: FSMContext):
     
     variant_num = data.get("current_bouquet_variant")
     variant_name = data.get("current_bouquet_name")
+    bouquets = data.get("bouquets", [])
+    
+    # Бронируем букеты корзины вместе с новым (до изменения списка)
+    if inventory.hold_cart(callback.from_user.id, bouquets + [{"variant": variant_num, "count": 1}]) is not None:
+        await callback.answer(shortage_text(callback.from_user.id, str(variant_num)), show_alert=True)
+        return
     
     # Проверяем, есть ли уже такой букет в списке
-    bouquets = data.get("bouquets", [])
     found = False
     for bouquet in bouquets:
         if bouquet["variant"] == variant_num and bouquet["quantity"] == quantity:
@@ -374,6 +371,12 @@ async def change_bouquet_count(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     bouquets = data.get("bouquets", [])
     
+    if delta > 0 and inventory.hold_cart(
+        callback.from_user.id, bouquets + [{"variant": variant_num, "count": delta}]
+    ) is not None:
+        await callback.answer(shortage_text(callback.from_user.id, str(variant_num)), show_alert=True)
+        return
+    
     # Получаем название варианта из конфига
     variant_name = Config.BOUQUET_VARIANTS.get(variant_num, {}).get("name", f"Вариант {variant_num}")
     
@@ -410,6 +413,8 @@ async def change_bouquet_count(callback: CallbackQuery, state: FSMContext):
             return
     
     await state.update_data(bouquets=bouquets)
+    if delta < 0:
+        inventory.hold_cart(callback.from_user.id, bouquets)
     
     # Если список букетов пуст, возвращаемся к выбору букета
     if not bouquets:
@@ -474,7 +479,7 @@ async def select_more_bouquets(callback: CallbackQuery, state: FSMContext):
         buttons.append([InlineKeyboardButton(text="💳 ПЕРЕЙТИ К ОПЛАТЕ", callback_data="more_no")])
         
         keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
-        await callback.message.answer(text, reply_markup=keyboard)
+        await checkout_panel.show(callback.message, state, text, keyboard)
     else:
         # Если букетов нет, показываем выбор букетов
         await show_bouquet_options(callback, state)
@@ -518,60 +523,54 @@ async def no_more_bouquets(callback: CallbackQuery, state: FSMContext):
     """Переход к выбору даты"""
     await state.set_state(OrderStates.selecting_date)
     
-    schedule = Config.get_pickup_schedule()
+    schedule_text, keyboard = keyboards.dates()
+    text = "Теперь выберите, когда заберете букет:\n\n" + schedule_text + "\nВыберите дату:"
     
-    text = "Теперь выберите, когда заберете букет:\n\n"
-    buttons = []
-    
-    for date_str, times in schedule.items():
-        start_hour = times["start"]
-        end_hour = times["end"]
-        text += f"{date_str} – с {start_hour}:00 до {end_hour}:00\n"
-        buttons.append([InlineKeyboardButton(
-            text=date_str,
-            callback_data=f"date_{date_str}"
-        )])
-    
-    text += "\nВыберите дату:"
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
-    
-    await callback.message.answer(text, reply_markup=keyboard)
+    await checkout_panel.show(callback.message, state, text, keyboard)
     await callback.answer()
 
 
+def free_times_keyboard(date_str: str):
+    """Кнопки времени без часов, на которые мест больше нет (None - такой даты нет в расписании)"""
+    date_schedule = keyboards.schedule.get(date_str)
+    if not date_schedule:
+        return None
+    return keyboards.times(date_str, pickup_slots.full_hours(date_str, date_schedule))
+
+
+async def ask_time_again(message: Message, state: FSMContext, date_str: str):
+    """Выбранное время заняли: предложить свободное время этой даты или другую дату"""
+    keyboard = free_times_keyboard(date_str)
+    if keyboard is not None and keyboard.inline_keyboard:
+        await state.set_state(OrderStates.selecting_time)
+        await checkout_panel.show(message, state, f"{date_str}. Выберите другое время:", keyboard)
+        return
+    
+    await state.set_state(OrderStates.selecting_date)
+    schedule_text, keyboard = keyboards.dates()
+    await checkout_panel.show(
+        message, state, "На эту дату свободного времени не осталось.\n\n" + schedule_text + "\nВыберите дату:", keyboard
+    )
+
+
 @router.callback_query(F.data.startswith("date_"), StateFilter(OrderStates.selecting_date))
 async def date_selected(callback: CallbackQuery, state: FSMContext):
     """Обработка выбора даты"""
     date_str = callback.data.replace("date_", "")
-    schedule = Config.get_pickup_schedule()
-    date_schedule = schedule.get(date_str)
+    keyboard = free_times_keyboard(date_str)
     
-    if not date_schedule:
+    if keyboard is None:
         await callback.answer("Неверная дата")
         return
     
+    if not keyboard.inline_keyboard:
+        await callback.answer("На эту дату свободного времени не осталось, выберите другую дату", show_alert=True)
+        return
+    
     await state.update_data(pickup_date=date_str)
     await state.set_state(OrderStates.selecting_time)
     
-    start_hour = date_schedule["start"]
-    end_hour = date_schedule["end"]
-    
-    # Формируем кнопки для времени
-    time_buttons = []
-    row = []
-    for hour in range(start_hour, end_hour + 1):
-        time_str = f"{hour:02d}:00"
-        row.append(InlineKeyboardButton(text=time_str, callback_data=f"time_{time_str}"))
-        if len(row) == 2:
-            time_buttons.append(row)
-            row = []
-    if row:
-        time_buttons.append(row)
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=time_buttons)
-    
-    await callback.message.answer("Выберите время:", reply_markup=keyboard)
+    await checkout_panel.show(callback.message, state, f"{date_str}. Выберите время:", keyboard)
     await callback.answer()
 
 
@@ -579,6 +578,14 @@ async def date_selected(callback: CallbackQuery, state: FSMContext):
 async def time_selected(callback: CallbackQuery, state: FSMContext):
     """Обработка выбора времени"""
     time_str = callback.data.replace("time_", "")
+    data = await state.get_data()
+    pickup_date = data.get("pickup_date")
+    
+    # Место в слоте закрепляется за покупателем до подтверждения заказа
+    if not pickup_slots.hold(callback.from_user.id, (pickup_date, time_str)):
+        await callback.answer("Это время уже занято, выберите другое", show_alert=True)
+        await ask_time_again(callback.message, state, pickup_date)
+        return
     
     await state.update_data(pickup_time=time_str)
     
@@ -605,14 +612,16 @@ async def time_selected(callback: CallbackQuery, state: FSMContext):
             last_name=user.get("last_name")
         )
         await state.set_state(OrderStates.entering_phone)
-        await callback.message.answer(
+        await checkout_panel.show(
+            callback.message, state,
             "Отлично! Укажите ваш номер телефона.\n"
             "Например: +79991234567 или 89991234567"
         )
     else:
         # Нет имени - запрашиваем имя
         await state.set_state(OrderStates.entering_name)
-        await callback.message.answer(
+        await checkout_panel.show(
+            callback.message, state,
             "Отлично! Осталось совсем немного.\n\n"
             "Пожалуйста, отправьте ваше Имя и Фамилию через пробел.\n"
             "Например: Иван Иванов"
@@ -649,7 +658,8 @@ async def name_entered(message: Message, state: FSMContext):
     
     # Переходим к вводу телефона
     await state.set_state(OrderStates.entering_phone)
-    await message.answer(
+    await checkout_panel.send(
+        message, state,
         "Отлично! Теперь укажите ваш номер телефона.\n"
         "Например: +79991234567 или 89991234567"
     )
@@ -741,7 +751,7 @@ async def process_order_confirmation(callback: CallbackQuery, state: FSMContext)
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
     
-    await callback.message.answer(confirmation_text, reply_markup=keyboard)
+    await checkout_panel.show(callback.message, state, confirmation_text, keyboard)
 
 
 async def process_order_confirmation_from_message(message: Message, state: FSMContext):
@@ -798,7 +808,7 @@ async def process_order_confirmation_from_message(message: Message, state: FSMCo
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
     
-    await message.answer(confirmation_text, reply_markup=keyboard)
+    await checkout_panel.send(message, state, confirmation_text, keyboard)
     await state.set_state(OrderStates.confirming_order)
 
 
@@ -821,6 +831,21 @@ async def order_confirmed(callback: CallbackQuery, state: FSMContext):
             await callback.answer("Ошибка: не указаны дата и время самовывоза", show_alert=True)
             return
         
+        # Брони корзины и времени могли истечь, пока покупатель вводил данные: продлеваем их или
+        # занимаем заново. Сохранённый заказ сам переводит брони в проданное (add_order_listener)
+        short_variant = inventory.hold_cart(callback.from_user.id, data.get("bouquets", []))
+        if short_variant is not None:
+            await callback.answer(
+                shortage_text(callback.from_user.id, short_variant) + ". Измените количество в заказе",
+                show_alert=True
+            )
+            return
+        
+        if not pickup_slots.hold(callback.from_user.id, (data.get("pickup_date"), data.get("pickup_time"))):
+            await callback.answer("Это время уже занято, выберите другое", show_alert=True)
+            await ask_time_again(callback.message, state, data.get("pickup_date"))
+            return
+        
         # Сохраняем имя и телефон в базу пользователей (если они есть)
         user_update_data = {}
         if data.get("first_name"):
@@ -868,7 +893,7 @@ async def order_confirmed(callback: CallbackQuery, state: FSMContext):
             "После оплаты отправьте в этот чат фото или любой файл с квитанцией — мы примем его как чек и подтвердим оплату."
         )
         
-        await callback.message.answer(payment_text)
+        await checkout_panel.show(callback.message, state, payment_text)
         await callback.answer("Заказ подтвержден!")
         logger.info(f"Заказ {order_number} успешно подтвержден")
         
@@ -916,7 +941,7 @@ async def edit_order_bouquets(callback: CallbackQuery, state: FSMContext):
     buttons.append([InlineKeyboardButton(text="✅ Вернуться к подтверждению", callback_data="back_to_confirmation")])
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
-    await callback.message.answer(text, reply_markup=keyboard)
+    await checkout_panel.show(callback.message, state, text, keyboard)
     await callback.answer()
 
 
@@ -960,7 +985,7 @@ async def change_order(callback: CallbackQuery, state: FSMContext):
         "Напишите номер пункта (1-4) или нажмите /start для начала нового заказа."
     )
     
-    await callback.message.answer(text)
+    await checkout_panel.show(callback.message, state, text)
     await callback.answer()
 
 
@@ -973,6 +998,7 @@ async def process_change_order(message: Message, state: FSMContext):
         # Изменение варианта или количества - начинаем заново с выбора букета
         await state.set_state(OrderStates.selecting_bouquet)
         await state.update_data(bouquets=[])
+        inventory.release_cart(message.from_user.id)
         
         text = (
             "Выберите букет заново:\n\n"
@@ -997,23 +1023,8 @@ async def process_change_order(message: Message, state: FSMContext):
         # Изменение даты и времени
         await state.set_state(OrderStates.selecting_date)
         
-        schedule = Config.get_pickup_schedule()
-        
-        text = "Выберите новую дату самовывоза:\n\n"
-        buttons = []
-        
-        for date_str, times in schedule.items():
-            start_hour = times["start"]
-            end_hour = times["end"]
-            text += f"{date_str} – с {start_hour}:00 до {end_hour}:00\n"
-            buttons.append([InlineKeyboardButton(
-                text=date_str,
-                callback_data=f"date_{date_str}"
-            )])
-        
-        text += "\nВыберите дату:"
-        
-        keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
+        schedule_text, keyboard = keyboards.dates()
+        text = "Выберите новую дату самовывоза:\n\n" + schedule_text + "\nВыберите дату:"
         
-        await message.answer(text, reply_markup=keyboard)
+        await checkout_panel.send(message, state, text, keyboard)
 
@@ -6,16 +6,16 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 from config import Config
-from database import Database
-from google_sheets import GoogleSheets, _dbg_log
+from database import create_database
+from sheets_sync import get_sheets_sync
 from order_template import OrderTemplate
 from handlers.order import OrderStates
 
 logger = logging.getLogger(__name__)
 
 router = Router()
-db = Database()
-sheets = GoogleSheets()
+db = create_database()
+sheets_sync = get_sheets_sync()
 order_template = OrderTemplate()
 
 # Блокировки для предотвращения одновременной обработки одного заказа
@@ -40,7 +40,7 @@ def _get_file_from_message(message: Message):
     return None, None
 
 
-async def _check_order_can_send_receipt(state: FSMContext, db: Database):
+async def _check_order_can_send_receipt(state: FSMContext, db):
     """Проверить, что заказ есть и ещё ожидает оплату (не отменён). Возвращает (order_number, order) или (None, None)."""
     data = await state.get_data()
     order_number = data.get("order_number")
@@ -260,13 +260,13 @@ async def admin_confirm_payment(callback: CallbackQuery):
         )
         order["status"] = "paid"
         
-        # Добавление в Google Sheets
+        # Добавление в Google Sheets (в фоне через очередь)
         order["order_number"] = order_number
         try:
-            sheets.add_order(order)
-            logger.info(f"Заказ {order_number} добавлен в Google Sheets")
+            await sheets_sync.add_order(order)
+            logger.info(f"Заказ {order_number} поставлен в очередь Google Sheets")
         except Exception as e:
-            logger.error(f"Ошибка при добавлении заказа в Google Sheets: {e}", exc_info=True)
+            logger.error(f"Ошибка при постановке заказа в очередь Google Sheets: {e}", exc_info=True)
         
         # Создание бланка заказа
         try:
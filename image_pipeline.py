@@ -0,0 +1,201 @@
+"""
+Подготовка фотографий каталога для Telegram (Pillow).
+
+Для каждой картинки из data/ и data/photos/ делается копия под Telegram:
+большая сторона не больше PHOTO_MAX_SIDE, прогрессивный JPEG с качеством
+PHOTO_JPEG_QUALITY, без EXIF и прочих метаданных (ориентация из EXIF
+применяется к пикселям заранее). Копии лежат в PHOTO_OPTIMIZED_DIR под
+именем из хэша содержимого и параметров, поэтому при повторном запуске
+обрабатываются только изменившиеся картинки. Обработка идёт в пуле
+процессов по числу ядер.
+
+Запускается в фоне при старте бота или вручную:
+
+    python image_pipeline.py [--force] [--workers N]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from PIL import Image, ImageOps
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+SOURCE_DIRS = ("data", "data/photos")
+MANIFEST_NAME = "manifest.json"
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def optimize_image(src: str, dst: str, max_side: int, quality: int) -> Dict:
+    """Уменьшить, перекодировать в прогрессивный JPEG и убрать метаданные (выполняется в отдельном процессе)"""
+    with Image.open(src) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            # Прозрачность (PNG) кладём на белый фон
+            background = Image.new("RGB", image.size, "white")
+            rgba = image.convert("RGBA")
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            image = background
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dst), suffix=".jpg")
+        os.close(fd)
+        # Без exif=/icc_profile= Pillow не переносит метаданные в новый файл
+        image.save(tmp_path, "JPEG", quality=quality, progressive=True, optimize=True)
+        size = image.size
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, dst)
+    return {"width": size[0], "height": size[1], "bytes": os.path.getsize(dst)}
+
+
+class ImagePipeline:
+    """Оптимизированные копии картинок каталога и манифест "исходник -> копия" """
+
+    def __init__(self, output_dir: str = "data/optimized", max_side: int = 1280, quality: int = 85,
+                 source_dirs=SOURCE_DIRS):
+        self.output_dir = output_dir
+        self.max_side = max_side
+        self.quality = quality
+        self.source_dirs = source_dirs
+        self.manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        self._manifest: Dict[str, Dict] = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать {self.manifest_path}: {e}")
+            return {}
+
+    def _save_manifest(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.output_dir, prefix=".manifest_")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def sources(self) -> List[str]:
+        """Картинки каталога (data/*.jpg, data/photos/*)"""
+        paths = []
+        for directory in self.source_dirs:
+            if not os.path.isdir(directory):
+                continue
+            for name in sorted(os.listdir(directory)):
+                path = os.path.join(directory, name)
+                if name.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(path):
+                    paths.append(path.replace(os.sep, "/"))
+        return paths
+
+    def _output_name(self, content_hash: str) -> str:
+        return f"{content_hash[:16]}_{self.max_side}_q{self.quality}.jpg"
+
+    def run(self, force: bool = False, workers: Optional[int] = None) -> Dict:
+        """Обработать новые и изменившиеся картинки; возвращает статистику"""
+        started = time.perf_counter()
+        os.makedirs(self.output_dir, exist_ok=True)
+        manifest: Dict[str, Dict] = {}
+        jobs = {}
+        for path in self.sources():
+            content_hash = file_hash(path)
+            output = os.path.join(self.output_dir, self._output_name(content_hash)).replace(os.sep, "/")
+            entry = self._manifest.get(path)
+            if not force and entry and entry["hash"] == content_hash and os.path.exists(entry["output"]):
+                manifest[path] = entry
+            elif not force and os.path.exists(output):
+                # Такую же картинку уже обрабатывали (например, под другим именем)
+                manifest[path] = {"hash": content_hash, "output": output, "bytes": os.path.getsize(output),
+                                  "original_bytes": os.path.getsize(path)}
+            else:
+                jobs[path] = (content_hash, output)
+
+        errors = 0
+        if jobs:
+            with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+                futures = {
+                    path: pool.submit(optimize_image, path, output, self.max_side, self.quality)
+                    for path, (_, output) in jobs.items()
+                }
+                for path, future in futures.items():
+                    content_hash, output = jobs[path]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        errors += 1
+                        logger.error(f"Не удалось обработать {path}: {e}")
+                        continue
+                    manifest[path] = {"hash": content_hash, "output": output, "bytes": result["bytes"],
+                                      "original_bytes": os.path.getsize(path)}
+
+        # Копии, на которые больше не ссылается ни одна картинка, удаляем
+        used = {entry["output"] for entry in manifest.values()}
+        for name in os.listdir(self.output_dir):
+            path = os.path.join(self.output_dir, name).replace(os.sep, "/")
+            if name.endswith(".jpg") and path not in used:
+                os.remove(path)
+
+        self._manifest = manifest
+        self._save_manifest()
+        return {
+            "images": len(manifest),
+            "processed": len(jobs) - errors,
+            "errors": errors,
+            "original_bytes": sum(entry["original_bytes"] for entry in manifest.values()),
+            "optimized_bytes": sum(min(entry["bytes"], entry["original_bytes"]) for entry in manifest.values()),
+            "seconds": time.perf_counter() - started,
+        }
+
+    def resolve(self, path: str) -> str:
+        """Путь к оптимизированной копии картинки (или к исходнику, если копии нет или она не меньше)"""
+        entry = self._manifest.get(path)
+        if entry is None or entry["bytes"] >= entry["original_bytes"] or not os.path.exists(entry["output"]):
+            return path
+        return entry["output"]
+
+
+_pipeline: Optional[ImagePipeline] = None
+
+
+def get_image_pipeline() -> ImagePipeline:
+    """Общий на процесс конвейер подготовки картинок"""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = ImagePipeline(Config.PHOTO_OPTIMIZED_DIR, Config.PHOTO_MAX_SIDE, Config.PHOTO_JPEG_QUALITY)
+    return _pipeline
+
+
+def catalog_photo(path: str) -> str:
+    """Какой файл отправлять вместо картинки каталога"""
+    if not Config.PHOTO_OPTIMIZE:
+        return path
+    return get_image_pipeline().resolve(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Подготовка фотографий каталога для Telegram")
+    parser.add_argument("--force", action="store_true", help="обработать все картинки заново")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию - по числу ядер)")
+    args = parser.parse_args()
+
+    stats = get_image_pipeline().run(force=args.force, workers=args.workers)
+    print(f"✓ Картинок: {stats['images']}, обработано: {stats['processed']}, ошибок: {stats['errors']}")
+    print(
+        f"  размер: {stats['original_bytes'] / 1024:.0f} КБ -> {stats['optimized_bytes'] / 1024:.0f} КБ "
+        f"за {stats['seconds']:.2f} с"
+    )
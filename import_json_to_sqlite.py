@@ -0,0 +1,20 @@
+"""
+Разовый перенос данных из data/*.json в SQLite.
+
+Запуск: python import_json_to_sqlite.py [каталог_с_json]
+После импорта установите STORAGE_BACKEND=sqlite в .env
+"""
+import sys
+from config import Config
+from sqlite_database import SqliteDatabase
+
+data_dir = sys.argv[1] if len(sys.argv) > 1 else "data"
+
+db = SqliteDatabase(Config.SQLITE_PATH)
+result = db.import_json(data_dir)
+
+print(f"✓ Импортировано в {Config.SQLITE_PATH}:")
+print(f"  заказов: {result['orders']}")
+print(f"  пользователей: {result['users']}")
+print(f"  вариантов в остатках: {result['stock']}")
+print(f"  счётчик заказов: {result['counter']}")
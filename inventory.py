@@ -0,0 +1,262 @@
+"""
+Остатки букетов в штуках и брони корзин.
+
+Администратор задаёт, сколько букетов варианта ещё можно продать
+(/stock 3 20). Запись {"count": 20, "after_order": 123, "auto_off": false}
+хранится в stock_counts (JSON или SQLite) и меняется только при таких
+командах. Продано считается в памяти по заказам с номером больше
+after_order: при запуске - по всем заказам, дальше - по событиям
+хранилища (add_order_listener). Поэтому отдельный счётчик на каждую
+продажу на диск не пишется: надёжно записывается сам заказ (журнал с
+групповой фиксацией), а отмена заказа возвращает букеты в остаток.
+
+Пока покупатель собирает корзину, её букеты держатся бронью
+CART_HOLD_MINUTES; проверка и бронь выполняются без await между ними,
+поэтому последний букет не достанется двоим. Сохранённый заказ снимает
+бронь покупателя. Закончившийся вариант выключается в stock.json
+автоматически и включается обратно, если букеты вернулись после отмены
+или администратор пополнил остаток. Варианты без записи работают как
+раньше - только переключатель в stock.json.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+from database import add_order_listener
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("pending_payment", "paid")
+
+
+def cart_counts(bouquets: List[Dict]) -> Dict[str, int]:
+    """Сколько букетов каждого варианта в корзине (15 и 25 шт. считаются вместе)"""
+    counts: Dict[str, int] = defaultdict(int)
+    for bouquet in bouquets:
+        counts[str(bouquet["variant"])] += bouquet.get("count", 1)
+    return {variant: count for variant, count in counts.items() if count > 0}
+
+
+def _order_key(order_number: str) -> int:
+    try:
+        return int(order_number)
+    except (TypeError, ValueError):
+        return 0
+
+
+class Inventory:
+    """Остатки по вариантам: лимиты администратора, продажи по заказам и брони корзин"""
+
+    def __init__(self, hold_ttl: float = 900.0):
+        self.hold_ttl = hold_ttl
+        self.counts: Dict[str, Dict] = {}  # вариант -> {"count", "after_order", "auto_off"}
+        self._sold: Dict[str, int] = defaultdict(int)  # продано после after_order
+        self._orders: Dict[str, Dict[str, int]] = {}  # активный заказ -> букеты по вариантам
+        self._last_order = 0
+        self._held: Dict[str, int] = defaultdict(int)  # букетов в бронях корзин
+        # user_id -> (букеты по вариантам, срок брони); порядок = порядок истечения
+        self._holds: "OrderedDict[int, Tuple[Dict[str, int], float]]" = OrderedDict()
+        self._db = None
+        self._tasks = set()
+        self.stats = {"holds": 0, "rejected": 0, "expired": 0, "sold_out": 0}
+
+    def remaining(self, variant: str) -> Optional[int]:
+        """Сколько букетов варианта ещё можно продать (None - без ограничения)"""
+        entry = self.counts.get(str(variant))
+        if entry is None:
+            return None
+        return max(0, entry["count"] - self._sold[str(variant)])
+
+    def held(self, variant: str) -> int:
+        self._expire_holds(time.monotonic())
+        return self._held[str(variant)]
+
+    def free(self, variant: str) -> Optional[int]:
+        """Сколько букетов можно положить в корзину прямо сейчас (None - без ограничения)"""
+        remaining = self.remaining(variant)
+        if remaining is None:
+            return None
+        return max(0, remaining - self.held(variant))
+
+    def available_for(self, user_id: int, variant: str) -> Optional[int]:
+        """Сколько букетов варианта может быть в корзине покупателя с учётом его брони"""
+        free = self.free(variant)
+        if free is None:
+            return None
+        own = self._holds[user_id][0] if user_id in self._holds else {}
+        return free + own.get(str(variant), 0)
+
+    def _expire_holds(self, now: float):
+        while self._holds:
+            user_id, (_, expires_at) = next(iter(self._holds.items()))
+            if expires_at > now:
+                return
+            self._drop_hold(user_id)
+            self.stats["expired"] += 1
+
+    def _drop_hold(self, user_id: int):
+        hold = self._holds.pop(user_id, None)
+        if hold is None:
+            return
+        for variant, count in hold[0].items():
+            self._held[variant] -= count
+
+    def hold_cart(self, user_id: int, bouquets: List[Dict]) -> Optional[str]:
+        """Забронировать букеты корзины за покупателем (заменяет его прежнюю бронь).
+
+        Возвращает None при успехе или номер варианта, которого не хватает.
+        Уменьшение корзины не отклоняется, даже если лимит успели снизить.
+        """
+        now = time.monotonic()
+        self._expire_holds(now)
+        wanted = cart_counts(bouquets)
+        current = self._holds[user_id][0] if user_id in self._holds else {}
+        for variant, count in wanted.items():
+            remaining = self.remaining(variant)
+            if remaining is None or count <= current.get(variant, 0):
+                continue
+            if count > remaining - (self._held[variant] - current.get(variant, 0)):
+                self.stats["rejected"] += 1
+                return variant
+
+        self._drop_hold(user_id)
+        # Держим только ограниченные варианты
+        limited = {variant: count for variant, count in wanted.items() if variant in self.counts}
+        if limited:
+            for variant, count in limited.items():
+                self._held[variant] += count
+            self._holds[user_id] = (limited, now + self.hold_ttl)
+            self.stats["holds"] += 1
+        return None
+
+    def release_cart(self, user_id: int):
+        """Снять бронь корзины (корзина очищена)"""
+        self._drop_hold(user_id)
+
+    def on_order_changed(self, order: Dict):
+        """Обработчик изменения заказа (подписывается через add_order_listener)"""
+        order_number = order.get("order_number")
+        if not order_number:
+            return
+        number = _order_key(order_number)
+        self._last_order = max(self._last_order, number)
+        active = order.get("status") in ACTIVE_STATUSES
+        counted = self._orders.get(order_number)
+        if active and counted is None:
+            counts = cart_counts(order.get("bouquets", []))
+            self._orders[order_number] = counts
+            self._count(number, counts, 1)
+            # Корзина покупателя стала заказом
+            self._drop_hold(order.get("user_id"))
+        elif not active and counted is not None:
+            del self._orders[order_number]
+            self._count(number, counted, -1)
+
+    def _count(self, number: int, counts: Dict[str, int], sign: int):
+        for variant, count in counts.items():
+            entry = self.counts.get(variant)
+            if entry is None or number <= entry["after_order"]:
+                continue
+            self._sold[variant] += sign * count
+            self._check_switch(variant)
+
+    def _check_switch(self, variant: str):
+        """Выключить закончившийся вариант и включить обратно выключенный автоматически"""
+        entry = self.counts[variant]
+        remaining = self.remaining(variant)
+        if remaining == 0 and not entry["auto_off"]:
+            entry["auto_off"] = True
+            self.stats["sold_out"] += 1
+            logger.info(f"Вариант {variant} закончился, выключаем")
+            self._schedule(self._switch(variant, False))
+        elif remaining > 0 and entry["auto_off"]:
+            entry["auto_off"] = False
+            logger.info(f"Вариант {variant} снова в наличии ({remaining}), включаем")
+            self._schedule(self._switch(variant, True))
+
+    def _schedule(self, coro):
+        try:
+            task = asyncio.get_running_loop().create_task(coro)
+        except RuntimeError:
+            coro.close()
+            return
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _switch(self, variant: str, available: bool):
+        if self._db is None:
+            return
+        try:
+            await self._db.save_stock_count(int(variant), self.counts.get(variant))
+            await self._db.set_variant_stock(int(variant), available)
+        except Exception as e:
+            logger.error(f"Не удалось переключить вариант {variant}: {e}", exc_info=True)
+
+    async def set_count(self, variant_num: int, count: Optional[int]):
+        """Задать, сколько букетов варианта ещё можно продать (None - снять ограничение)"""
+        variant = str(variant_num)
+        # Включаем обратно, только если вариант выключил сам лимит; ручной выключатель не трогаем
+        auto_off = self.counts.get(variant, {}).get("auto_off", False)
+        if count is None:
+            self.counts.pop(variant, None)
+            self._sold.pop(variant, None)
+            await self._db.save_stock_count(variant_num, None)
+            if auto_off:
+                await self._db.set_variant_stock(variant_num, True)
+            return
+        if count > 0 and auto_off:
+            await self._db.set_variant_stock(variant_num, True)
+            auto_off = False
+        elif count == 0 and not auto_off:
+            # Нулевой остаток выключает вариант как распродажа (если он не выключен вручную)
+            auto_off = await self._db.set_variant_stock(variant_num, False)
+        # Уже оформленные заказы в новый остаток не входят
+        entry = {"count": count, "after_order": self._last_order, "auto_off": auto_off}
+        self.counts[variant] = entry
+        self._sold[variant] = 0
+        await self._db.save_stock_count(variant_num, entry)
+
+    async def wait_switches(self):
+        """Дождаться отложенных переключений вариантов (для скриптов и бенчмарков)"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks))
+
+    async def load(self, db):
+        """Прочитать лимиты и посчитать продажи по заказам (при запуске)"""
+        self._db = db
+        self.counts = {
+            variant: {"count": entry["count"], "after_order": entry.get("after_order", 0),
+                      "auto_off": entry.get("auto_off", False)}
+            for variant, entry in (await db.get_stock_counts()).items()
+        }
+        self._sold.clear()
+        self._orders.clear()
+        for order in (await db.get_all_orders()).values():
+            self.on_order_changed(order)
+        if self.counts:
+            logger.info(
+                "Остатки букетов: "
+                + ", ".join(f"№{variant} - {self.remaining(variant)}" for variant in sorted(self.counts))
+            )
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Остаток и брони по ограниченным вариантам"""
+        return {
+            variant: {"count": entry["count"], "remaining": self.remaining(variant), "held": self.held(variant)}
+            for variant, entry in sorted(self.counts.items())
+        }
+
+
+_inventory: Optional[Inventory] = None
+
+
+def get_inventory() -> Inventory:
+    """Общий на процесс учёт остатков (следит за изменениями заказов)"""
+    global _inventory
+    if _inventory is None:
+        _inventory = Inventory(hold_ttl=Config.CART_HOLD_MINUTES * 60)
+        add_order_listener(_inventory.on_order_changed)
+    return _inventory
@@ -0,0 +1,181 @@
+"""
+Кэш клавиатур каталога, количества, дат и времени самовывоза.
+
+Клавиатуры этих экранов зависят только от остатков и расписания, поэтому
+строятся один раз на их версию: ключ кэша - (экран, версия остатков,
+версия расписания, параметры). Остатки и расписание хранятся здесь же
+снимком в памяти, и горячие экраны не читают stock.json и не вызывают
+Config.get_pickup_schedule(). Версия остатков растёт при
+toggle_variant_stock (через add_stock_listener), версия расписания -
+при refresh_schedule().
+"""
+import logging
+from typing import Callable, Dict, FrozenSet, Optional, Tuple
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from config import Config
+from database import add_stock_listener
+
+logger = logging.getLogger(__name__)
+
+BUTTON_TEXTS = {
+    1: "1️⃣ Микс",
+    2: "2️⃣ Красный",
+    3: "3️⃣ Жёлтый",
+    4: "4️⃣ Белый",
+    5: "5️⃣ Ж+Ф",
+    6: "6️⃣ К+Ж"
+}
+
+
+def bouquet_keyboard(stock: Dict[str, bool]) -> InlineKeyboardMarkup:
+    """Кнопки для выбора букета с учетом остатков"""
+    buttons = []
+    row = []
+    for variant_num in range(1, 7):
+        is_available = stock.get(str(variant_num), True)
+        button_text = BUTTON_TEXTS[variant_num]
+
+        # Если товар недоступен, добавляем красный крестик
+        if not is_available:
+            button_text = f"❌ {button_text}"
+
+        row.append(InlineKeyboardButton(
+            text=button_text,
+            callback_data=f"bouquet_{variant_num}"
+        ))
+
+        # Добавляем по 2 кнопки в ряд
+        if len(row) == 2:
+            buttons.append(row)
+            row = []
+
+    if row:
+        buttons.append(row)
+
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def quantity_keyboard() -> InlineKeyboardMarkup:
+    """Кнопки выбора количества тюльпанов в букете"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="15 штук", callback_data="qty_15")],
+        [InlineKeyboardButton(text="25 штук", callback_data="qty_25")]
+    ])
+
+
+def dates_screen(schedule: Dict[str, Dict]) -> Tuple[str, InlineKeyboardMarkup]:
+    """Строки расписания по датам и кнопки дат"""
+    lines = ""
+    buttons = []
+    for date_str, times in schedule.items():
+        lines += f"{date_str} – с {times['start']}:00 до {times['end']}:00\n"
+        buttons.append([InlineKeyboardButton(
+            text=date_str,
+            callback_data=f"date_{date_str}"
+        )])
+    return lines, InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def time_keyboard(start_hour: int, end_hour: int, hidden: FrozenSet[str] = frozenset()) -> InlineKeyboardMarkup:
+    """Кнопки времени самовывоза по два в ряд (кроме занятых часов hidden)"""
+    time_buttons = []
+    row = []
+    for hour in range(start_hour, end_hour + 1):
+        time_str = f"{hour:02d}:00"
+        if time_str in hidden:
+            continue
+        row.append(InlineKeyboardButton(text=time_str, callback_data=f"time_{time_str}"))
+        if len(row) == 2:
+            time_buttons.append(row)
+            row = []
+    if row:
+        time_buttons.append(row)
+    return InlineKeyboardMarkup(inline_keyboard=time_buttons)
+
+
+class KeyboardCache:
+    """Готовые клавиатуры по (экран, версия остатков, версия расписания, параметры)"""
+
+    def __init__(self):
+        self.stock: Optional[Dict[str, bool]] = None
+        self.schedule: Dict[str, Dict] = {}
+        self.stock_version = 0
+        self.schedule_version = 0
+        self._cache: Dict[tuple, object] = {}
+        self.stats = {"hits": 0, "builds": 0}
+
+    async def load(self, db):
+        """Прочитать остатки и расписание и построить все клавиатуры заранее (при запуске)"""
+        self.set_stock(await db.get_stock_status())
+        self.refresh_schedule()
+
+    def set_stock(self, stock: Dict[str, bool]):
+        """Новые остатки: клавиатуры, зависящие от них, строятся заново"""
+        self.stock = dict(stock)
+        self.stock_version += 1
+        self._rebuild()
+
+    def refresh_schedule(self):
+        """Перечитать расписание самовывоза (вызывать после его изменения)"""
+        self.schedule = Config.get_pickup_schedule()
+        self.schedule_version += 1
+        self._rebuild()
+
+    def _rebuild(self):
+        # Клавиатуры старых версий больше не нужны
+        self._cache = {
+            key: value for key, value in self._cache.items()
+            if key[1] == self.stock_version and key[2] == self.schedule_version
+        }
+        if self.stock is not None:
+            self.catalog()
+        self.quantity()
+        self.dates()
+        for date_str in self.schedule:
+            self.times(date_str)
+
+    def _get(self, screen: str, build: Callable, *args):
+        key = (screen, self.stock_version, self.schedule_version, *args)
+        value = self._cache.get(key)
+        if value is None:
+            value = self._cache[key] = build()
+            self.stats["builds"] += 1
+        else:
+            self.stats["hits"] += 1
+        return value
+
+    def catalog(self) -> InlineKeyboardMarkup:
+        return self._get("catalog", lambda: bouquet_keyboard(self.stock))
+
+    def quantity(self) -> InlineKeyboardMarkup:
+        return self._get("quantity", quantity_keyboard)
+
+    def dates(self) -> Tuple[str, InlineKeyboardMarkup]:
+        """Строки расписания и кнопки дат"""
+        return self._get("dates", lambda: dates_screen(self.schedule))
+
+    def times(self, date_str: str, hidden: FrozenSet[str] = frozenset()) -> Optional[InlineKeyboardMarkup]:
+        """Кнопки времени для даты без занятых часов hidden (None - такой даты нет в расписании).
+
+        Набор занятых часов входит в ключ: вариантов немного, и каждый строится один раз.
+        """
+        date_schedule = self.schedule.get(date_str)
+        if not date_schedule:
+            return None
+        return self._get(
+            "times", lambda: time_keyboard(date_schedule["start"], date_schedule["end"], hidden), date_str, hidden
+        )
+
+
+_keyboards: Optional[KeyboardCache] = None
+
+
+def get_keyboards() -> KeyboardCache:
+    """Общий на процесс кэш клавиатур (следит за изменением остатков)"""
+    global _keyboards
+    if _keyboards is None:
+        _keyboards = KeyboardCache()
+        add_stock_listener(_keyboards.set_stock)
+    return _keyboards
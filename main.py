@@ -35,21 +35,24 @@ async def main():
         logger.error("BOT_TOKEN не установлен в переменных окружения!")
         return
     
-    # Инициализация Google Sheets и запись заголовков
-    try:
-        from google_sheets import GoogleSheets
-        sheets = GoogleSheets()
-        success = sheets.init_headers()
-        if success:
-            logger.info("Заголовки таблицы Google Sheets инициализированы")
-        else:
-            logger.error("Не удалось инициализировать заголовки Google Sheets")
-    except Exception as e:
-        logger.error(f"Ошибка при инициализации заголовков Google Sheets: {e}", exc_info=True)
+    # Подключение к Google Sheets и проверка заголовков - в фоне, чтобы не задерживать запуск
+    asyncio.create_task(asyncio.to_thread(init_google_sheets))
+    
+    # Подготовка фото каталога - тоже в фоне; пока она идёт, отправляются исходные файлы
+    if Config.PHOTO_OPTIMIZE:
+        asyncio.create_task(asyncio.to_thread(optimize_catalog_photos))
     
     # Инициализация бота и диспетчера
     bot = Bot(token=Config.BOT_TOKEN)
-    storage = MemoryStorage()
+    if Config.FSM_STORAGE == "sqlite":
+        from fsm_storage import SqliteFSMStorage
+        storage = SqliteFSMStorage(
+            Config.FSM_SQLITE_PATH,
+            cache_size=Config.FSM_CACHE_SIZE,
+            flush_interval=Config.FSM_FLUSH_INTERVAL_MS / 1000
+        )
+    else:
+        storage = MemoryStorage()
     dp = Dispatcher(storage=storage)
     
     # Регистрация роутеров
@@ -59,9 +62,39 @@ async def main():
     dp.include_router(cancellation.router)
     dp.include_router(admin.router)
     
+    # Клавиатуры каталога, дат и времени строим заранее
+    from keyboards import get_keyboards
+    await get_keyboards().load(order.db)
+    
+    # Занятость слотов самовывоза по уже оформленным заказам
+    from pickup_slots import get_pickup_slots
+    await get_pickup_slots().load(order.db)
+    
+    # Остатки букетов в штуках: продажи по уже оформленным заказам
+    from inventory import get_inventory
+    await get_inventory().load(order.db)
+    
     # Запуск фоновой задачи для проверки неоплаченных заказов
     asyncio.create_task(check_unpaid_orders_background(bot))
     
+    # Поддержание подключения к Google Sheets (заблаговременное обновление токена)
+    asyncio.create_task(refresh_sheets_credentials_background())
+    
+    # Запуск отправки заказов в Google Sheets
+    from sheets_sync import get_sheets_sync
+    asyncio.create_task(get_sheets_sync().run())
+    
+    # Периодическая сверка Google Sheets с заказами
+    if Config.SHEETS_RECONCILE_INTERVAL > 0:
+        asyncio.create_task(reconcile_sheets_background())
+    
+    # Запуск фоновой компактизации журнала заказов
+    asyncio.create_task(compact_orders_background())
+    
+    # Удаление брошенных диалогов (только для хранилища на диске)
+    if Config.FSM_STORAGE == "sqlite":
+        asyncio.create_task(expire_fsm_background(storage))
+    
     logger.info("Бот запущен и готов к работе!")
     
     # Запуск polling с улучшенной обработкой flood control
@@ -77,58 +110,153 @@ async def main():
     except Exception as e:
         logger.error(f"Ошибка при работе бота: {e}", exc_info=True)
     finally:
+        # Дописываем несохранённые состояния FSM
+        await storage.close()
         await bot.session.close()
 
 
+def optimize_catalog_photos():
+    """Подготовить фото каталога для Telegram (обрабатываются только изменившиеся)"""
+    from image_pipeline import get_image_pipeline
+    
+    try:
+        stats = get_image_pipeline().run()
+        logger.info(
+            f"Фото каталога: {stats['images']} шт., обработано {stats['processed']}, "
+            f"{stats['original_bytes'] // 1024} КБ -> {stats['optimized_bytes'] // 1024} КБ "
+            f"за {stats['seconds']:.1f} с"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при подготовке фото каталога: {e}", exc_info=True)
+
+
+def init_google_sheets():
+    """Подключение общего клиента Google Sheets и запись заголовков"""
+    from google_sheets import get_sheets
+    
+    try:
+        success = get_sheets().init_headers()
+        if success:
+            logger.info("Заголовки таблицы Google Sheets инициализированы")
+        else:
+            logger.error("Не удалось инициализировать заголовки Google Sheets")
+    except Exception as e:
+        logger.error(f"Ошибка при инициализации заголовков Google Sheets: {e}", exc_info=True)
+
+
+async def refresh_sheets_credentials_background():
+    """Фоновая задача: обновляет токен Google заранее, чтобы запросы не ждали обновления"""
+    from google_sheets import get_sheets
+    
+    sheets = get_sheets()
+    while True:
+        await asyncio.sleep(300)
+        try:
+            await asyncio.to_thread(sheets.ensure_connected)
+            if await asyncio.to_thread(sheets.refresh_credentials):
+                logger.info("Токен Google Sheets обновлён")
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении подключения к Google Sheets: {e}", exc_info=True)
+
+
+async def reconcile_sheets_background():
+    """Фоновая задача: сверяет Google Sheets с заказами и дописывает пропущенное"""
+    from database import create_database
+    from sheets_sync import get_sheets_sync
+    
+    db = create_database()
+    while True:
+        await asyncio.sleep(Config.SHEETS_RECONCILE_INTERVAL)
+        try:
+            await get_sheets_sync().reconcile(await db.get_all_orders())
+        except Exception as e:
+            logger.error(f"Ошибка при сверке Google Sheets: {e}", exc_info=True)
+
+
 async def check_unpaid_orders_background(bot: Bot):
-    """Фоновая задача для проверки неоплаченных заказов"""
-    from database import Database
+    """Фоновая задача: отменяет заказы, не оплаченные за 24 часа"""
+    from database import create_database, add_order_listener
+    from payment_deadlines import PaymentDeadlines
     from datetime import datetime, timedelta
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     
-    db = Database()
+    db = create_database()
+    deadlines = PaymentDeadlines(timedelta(hours=24))
+    
+    # Сначала подписка, затем начальная загрузка - чтобы не пропустить заказы, созданные между ними
+    add_order_listener(deadlines.on_order_changed)
+    try:
+        for order in (await db.get_orders_by_status("pending_payment")).values():
+            deadlines.on_order_changed(order)
+        logger.info(f"Ожидают оплаты заказов: {len(deadlines)}")
+    except Exception as e:
+        logger.error(f"Error loading unpaid orders: {e}", exc_info=True)
     
     while True:
-        try:
-            orders = await db.get_all_orders()
-            now = datetime.now()
-            
-            for order_number, order in orders.items():
-                if order.get("status") != "pending_payment":
-                    continue
-                
-                created_at_str = order.get("created_at")
-                if not created_at_str:
-                    continue
-                
-                created_at = datetime.fromisoformat(created_at_str)
-                time_diff = now - created_at
-                
-                # Если прошло более 24 часов
-                if time_diff > timedelta(hours=24):
-                    await db.update_order_status(order_number, "cancelled", reason="timeout")
-                    
-                    user_id = order.get("user_id")
-                    cancellation_text = (
-                        "К сожалению, оплата по заказу не поступила в течение 24 часов.\n"
-                        f"Ваш заказ №{order_number} автоматически отменён.\n\n"
-                        "Хотите оформить новый? Просто напишите «Хочу букет»! 🌷"
-                    )
-                    
-                    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                        [InlineKeyboardButton(text="Хочу букет", callback_data="start_order")]
-                    ])
-                    
-                    try:
-                        await bot.send_message(user_id, cancellation_text, reply_markup=keyboard)
-                    except Exception as e:
-                        logger.error(f"Error sending cancellation to user {user_id}: {e}")
+        await deadlines.wait()
+        expired = deadlines.pop_expired(datetime.now())
+        if not expired:
+            continue
         
+        try:
+            # Все просроченные заказы отменяются одной записью
+            cancelled = await db.update_orders_status(
+                expired, "cancelled", expected_status="pending_payment", reason="timeout"
+            )
         except Exception as e:
             logger.error(f"Error checking unpaid orders: {e}")
+            # Повторим попытку через минуту
+            retry_at = datetime.now() + timedelta(minutes=1)
+            for order_number in expired:
+                deadlines.schedule(order_number, retry_at)
+            continue
         
-        # Проверяем каждые 30 минут
-        await asyncio.sleep(1800)
+        for order in cancelled:
+            order_number = order.get("order_number")
+            user_id = order.get("user_id")
+            cancellation_text = (
+                "К сожалению, оплата по заказу не поступила в течение 24 часов.\n"
+                f"Ваш заказ №{order_number} автоматически отменён.\n\n"
+                "Хотите оформить новый? Просто напишите «Хочу букет»! 🌷"
+            )
+            
+            keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="Хочу букет", callback_data="start_order")]
+            ])
+            
+            try:
+                await bot.send_message(user_id, cancellation_text, reply_markup=keyboard)
+            except Exception as e:
+                logger.error(f"Error sending cancellation to user {user_id}: {e}")
+
+
+async def compact_orders_background():
+    """Фоновая задача: периодически сворачивает журнал заказов в снимок"""
+    from database import create_database
+    
+    db = create_database()
+    
+    while True:
+        await asyncio.sleep(Config.ORDERS_COMPACT_INTERVAL)
+        try:
+            await db.compact_orders()
+        except Exception as e:
+            logger.error(f"Ошибка при компактизации журнала заказов: {e}", exc_info=True)
+
+
+async def expire_fsm_background(storage):
+    """Фоновая задача: удаляет состояния FSM, не менявшиеся дольше FSM_TTL_HOURS"""
+    while True:
+        await asyncio.sleep(Config.FSM_SWEEP_INTERVAL)
+        try:
+            reclaimed = await storage.expire(Config.FSM_TTL_HOURS * 3600)
+            if reclaimed["sessions"]:
+                logger.info(
+                    f"Удалено брошенных диалогов: {reclaimed['sessions']} ({reclaimed['bytes']} байт), "
+                    f"всего с запуска: {storage.stats['expired_sessions']} ({storage.stats['expired_bytes']} байт)"
+                )
+        except Exception as e:
+            logger.error(f"Ошибка при удалении устаревших состояний FSM: {e}", exc_info=True)
 
 
 if __name__ == "__main__":
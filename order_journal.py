@@ -0,0 +1,130 @@
+"""
+Журнал изменений заказов (append-only NDJSON).
+
+Каждая строка журнала - JSON-объект вида {"crc":"1a2b3c4d","rec":{...}},
+где crc - CRC32 байтов поля rec ровно в том виде, в каком они записаны.
+Записи дописываются пачками с одним fsync на пачку. При чтении первая
+битая запись (оборванная строка, неверный JSON или контрольная сумма)
+считается оборванным хвостом: файл обрезается по её началу.
+"""
+import json
+import logging
+import os
+import zlib
+from typing import Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+_PREFIX = b'{"crc":"'
+_REC_PREFIX_LEN = len(b'{"crc":"00000000","rec":')
+
+
+def encode_record(record: Dict) -> bytes:
+    """Сериализовать запись в строку журнала"""
+    rec = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    crc = zlib.crc32(rec) & 0xFFFFFFFF
+    return b'{"crc":"%08x","rec":%s}\n' % (crc, rec)
+
+
+def decode_line(line: bytes) -> Dict:
+    """Разобрать строку журнала; ValueError, если строка повреждена"""
+    if not line.endswith(b"}\n") or not line.startswith(_PREFIX):
+        raise ValueError("оборванная запись")
+    crc = int(line[len(_PREFIX):len(_PREFIX) + 8], 16)
+    rec = line[_REC_PREFIX_LEN:-2]
+    if zlib.crc32(rec) & 0xFFFFFFFF != crc:
+        raise ValueError("неверная контрольная сумма")
+    return json.loads(rec)
+
+
+def atomic_write(path: str, content: str):
+    """Записать файл целиком через временный файл, fsync и os.replace"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class OrderJournal:
+    """Append-only журнал изменений заказов с ротацией для компактизации"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rotated_path = f"{path}.compacting"
+        self.records = 0  # записей в текущем журнале с момента последней компактизации
+
+    def read(self) -> List[Dict]:
+        """Прочитать все целые записи (сначала ротированный журнал, затем текущий)"""
+        records = []
+        for path in (self.rotated_path, self.path):
+            file_records = self._read_file(path)
+            if path == self.path:
+                self.records = len(file_records)
+            records.extend(file_records)
+        return records
+
+    def _read_file(self, path: str) -> List[Dict]:
+        if not os.path.exists(path):
+            return []
+        records = []
+        offset = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    records.append(decode_line(line))
+                except ValueError as e:
+                    logger.warning(
+                        f"Журнал {path}: повреждённая запись на смещении {offset} ({e}), хвост отброшен"
+                    )
+                    break
+                offset += len(line)
+        if offset != os.path.getsize(path):
+            with open(path, "r+b") as f:
+                f.truncate(offset)
+                f.flush()
+                os.fsync(f.fileno())
+        return records
+
+    def append(self, records: Iterable[Dict]):
+        """Дописать пачку записей и сделать один fsync"""
+        data = b"".join(encode_record(r) for r in records)
+        if not data:
+            return
+        with open(self.path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.records += data.count(b"\n")
+
+    def rotate(self):
+        """Отложить текущий журнал под компактизацию и начать новый"""
+        self.records = 0
+        if not os.path.exists(self.path):
+            return
+        if os.path.exists(self.rotated_path):
+            # Предыдущая компактизация не завершилась - дописываем к её журналу
+            with open(self.path, "rb") as src, open(self.rotated_path, "ab") as dst:
+                dst.write(src.read())
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.remove(self.path)
+        else:
+            os.replace(self.path, self.rotated_path)
+
+    def drop_rotated(self):
+        """Удалить ротированный журнал после записи снимка"""
+        if os.path.exists(self.rotated_path):
+            os.remove(self.rotated_path)
+
+
+def apply_records(orders: Dict[str, Dict], records: Iterable[Dict]) -> int:
+    """Применить записи журнала к словарю заказов; возвращает число применённых записей"""
+    applied = 0
+    for record in records:
+        if record.get("op") == "put":
+            order = record["order"]
+            orders[order["order_number"]] = order
+            applied += 1
+    return applied
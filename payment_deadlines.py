@@ -0,0 +1,83 @@
+"""
+Сроки оплаты неоплаченных заказов.
+
+Min-heap пар (срок, номер заказа). Куча строится при запуске по заказам
+со статусом pending_payment и дальше обновляется по событиям хранилища
+(add_order_listener): новый заказ добавляет срок, смена статуса убирает.
+Фоновая задача спит ровно до ближайшего срока, а не опрашивает все заказы.
+"""
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentDeadlines:
+    """Очередь сроков оплаты с ожиданием ближайшего срока"""
+
+    def __init__(self, timeout: timedelta = timedelta(hours=24)):
+        self.timeout = timeout
+        self._heap: List[Tuple[datetime, str]] = []
+        self._deadlines: Dict[str, datetime] = {}  # актуальные сроки; устаревшие записи кучи пропускаются
+        self._changed = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def on_order_changed(self, order: Dict):
+        """Обработчик изменения заказа (подписывается через add_order_listener)"""
+        order_number = order.get("order_number")
+        if not order_number:
+            return
+        created_at = order.get("created_at")
+        if order.get("status") != "pending_payment" or not created_at:
+            self.discard(order_number)
+            return
+        self.schedule(order_number, datetime.fromisoformat(created_at) + self.timeout)
+
+    def schedule(self, order_number: str, deadline: datetime):
+        """Добавить или перенести срок заказа"""
+        if self._deadlines.get(order_number) == deadline:
+            return
+        earliest = self.next_deadline()
+        self._deadlines[order_number] = deadline
+        heapq.heappush(self._heap, (deadline, order_number))
+        if earliest is None or deadline < earliest:
+            self._changed.set()
+
+    def discard(self, order_number: str):
+        """Убрать срок заказа (запись в куче удалится лениво)"""
+        self._deadlines.pop(order_number, None)
+
+    def _drop_stale(self):
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_deadline(self) -> Optional[datetime]:
+        """Ближайший срок или None, если ждать нечего"""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_expired(self, now: datetime) -> List[str]:
+        """Забрать все заказы, срок которых истёк к моменту now"""
+        expired = []
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > now:
+                return expired
+            _, order_number = heapq.heappop(self._heap)
+            del self._deadlines[order_number]
+            expired.append(order_number)
+
+    async def wait(self):
+        """Ждать до ближайшего срока или до появления более раннего"""
+        self._changed.clear()
+        deadline = self.next_deadline()
+        timeout = None if deadline is None else max((deadline - datetime.now()).total_seconds(), 0)
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
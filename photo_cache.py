@@ -0,0 +1,144 @@
+"""
+Кэш file_id фотографий каталога.
+
+Telegram возвращает file_id загруженной фотографии; повторная отправка по
+file_id не передаёт файл заново. Кэш хранит file_id по пути файла вместе
+с хэшем содержимого (data/file_ids.json) и переживает перезапуск: если файл
+заменили, хэш не совпадёт и фото будет загружено заново. Хэш пересчитывается,
+только когда у файла меняются размер или время изменения.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Dict, List, Optional, Tuple, Union
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, InputMediaPhoto, Message
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class PhotoCache:
+    """file_id фотографий по пути и хэшу содержимого"""
+
+    def __init__(self, path: str = "data/file_ids.json"):
+        self.path = path
+        self._entries: Dict[str, Dict] = self._load()
+        self._hashes: Dict[str, Tuple[int, int, str]] = {}  # путь -> (mtime_ns, размер, хэш)
+        self.stats = {"uploads": 0, "bytes_uploaded": 0, "cached_sends": 0, "invalidated": 0}
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать кэш file_id {self.path}: {e}")
+            return {}
+
+    def _save(self):
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".file_ids_")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить кэш file_id {self.path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def content_hash(self, path: str) -> str:
+        """SHA-256 содержимого файла (пересчитывается только после изменения файла)"""
+        st = os.stat(path)
+        cached = self._hashes.get(path)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+        self._hashes[path] = (st.st_mtime_ns, st.st_size, content_hash)
+        return content_hash
+
+    def file_id(self, path: str) -> Optional[str]:
+        """Сохранённый file_id, если файл не менялся с момента загрузки"""
+        entry = self._entries.get(path)
+        if entry is None:
+            return None
+        if entry["hash"] != self.content_hash(path):
+            self.forget(path)
+            self.stats["invalidated"] += 1
+            return None
+        return entry["file_id"]
+
+    def media(self, path: str) -> Union[str, FSInputFile]:
+        """Что передать в answer_photo/InputMediaPhoto: file_id или файл для загрузки"""
+        file_id = self.file_id(path)
+        if file_id:
+            self.stats["cached_sends"] += 1
+            return file_id
+        self.stats["uploads"] += 1
+        self.stats["bytes_uploaded"] += os.path.getsize(path)
+        return FSInputFile(path)
+
+    def remember(self, path: str, file_id: str):
+        """Запомнить file_id, который Telegram вернул после загрузки"""
+        entry = {"hash": self.content_hash(path), "file_id": file_id}
+        if self._entries.get(path) != entry:
+            self._entries[path] = entry
+            self._save()
+
+    def forget(self, path: str):
+        if self._entries.pop(path, None) is not None:
+            self._save()
+
+    async def answer_photo(self, message: Message, path: str, **kwargs) -> Message:
+        """Отправить фото в чат сообщения, по file_id, если файл уже загружался"""
+        media = self.media(path)
+        try:
+            sent = await message.answer_photo(photo=media, **kwargs)
+        except TelegramBadRequest:
+            if isinstance(media, FSInputFile):
+                raise
+            # file_id перестал действовать (например, сменили бота) - загружаем заново
+            self.forget(path)
+            return await self.answer_photo(message, path, **kwargs)
+        if isinstance(media, FSInputFile) and sent.photo:
+            self.remember(path, sent.photo[-1].file_id)
+        return sent
+
+    async def answer_media_group(self, message: Message, paths: List[str]) -> List[Message]:
+        """Отправить альбом фотографий, загружая только те, чьих file_id ещё нет"""
+        media = [self.media(path) for path in paths]
+        try:
+            sent = await message.answer_media_group([InputMediaPhoto(media=item) for item in media])
+        except TelegramBadRequest:
+            if all(isinstance(item, FSInputFile) for item in media):
+                raise
+            for path, item in zip(paths, media):
+                if not isinstance(item, FSInputFile):
+                    self.forget(path)
+            return await self.answer_media_group(message, paths)
+        for path, item, result in zip(paths, media, sent):
+            if isinstance(item, FSInputFile) and result.photo:
+                self.remember(path, result.photo[-1].file_id)
+        return sent
+
+
+_photo_cache: Optional[PhotoCache] = None
+
+
+def get_photo_cache() -> PhotoCache:
+    """Общий на процесс кэш file_id"""
+    global _photo_cache
+    if _photo_cache is None:
+        _photo_cache = PhotoCache(Config.PHOTO_CACHE_PATH)
+    return _photo_cache
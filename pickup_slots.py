@@ -0,0 +1,168 @@
+"""
+Вместимость слотов самовывоза (дата + час).
+
+Для каждого слота считается, сколько заказов уже на него записано
+(ожидают оплаты или оплачены) и сколько покупателей держат его
+временной бронью, пока оформляют заказ. Счётчики живут в памяти: при
+запуске строятся по заказам, дальше обновляются по событиям хранилища
+(add_order_listener) - новый заказ занимает слот и снимает бронь
+покупателя, отмена (вручную или по таймауту оплаты) освобождает слот.
+
+Проверка и занятие слота выполняются без await между ними, поэтому
+в одном цикле событий две брони не могут занять последнее место.
+Брони живут PICKUP_HOLD_MINUTES и снимаются лениво.
+"""
+import logging
+import re
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from config import Config
+from database import add_order_listener
+
+logger = logging.getLogger(__name__)
+
+Slot = Tuple[str, str]  # ("7 марта", "10:00")
+ACTIVE_STATUSES = ("pending_payment", "paid")
+_HOUR = re.compile(r"^\d{1,2}:\d{2}$")
+
+
+def parse_capacity_overrides(value: str) -> Dict[tuple, int]:
+    """Разобрать "7 марта 10:00=5; 8 марта=8": вместимость отдельного часа или всех часов даты"""
+    overrides = {}
+    for item in value.split(";"):
+        if "=" not in item:
+            continue
+        target, capacity = item.rsplit("=", 1)
+        parts = target.split()
+        if parts and _HOUR.match(parts[-1]):
+            hour = parts.pop()
+            overrides[(" ".join(parts), f"{int(hour.split(':')[0]):02d}:00")] = int(capacity)
+        else:
+            overrides[(" ".join(parts),)] = int(capacity)
+    return overrides
+
+
+class PickupSlots:
+    """Занятость слотов самовывоза: заказы и временные брони покупателей"""
+
+    def __init__(self, default_capacity: int = 0, overrides: Optional[Dict[tuple, int]] = None,
+                 hold_ttl: float = 900.0):
+        self.default_capacity = default_capacity
+        self.overrides = overrides or {}
+        self.hold_ttl = hold_ttl
+        self._booked: Dict[Slot, int] = defaultdict(int)  # заказы на слот
+        self._held: Dict[Slot, int] = defaultdict(int)  # действующие брони на слот
+        self._orders: Dict[str, Slot] = {}  # номер заказа -> слот
+        # user_id -> (слот, срок брони); порядок = порядок истечения (TTL одинаковый)
+        self._holds: "OrderedDict[int, Tuple[Slot, float]]" = OrderedDict()
+        self.stats = {"holds": 0, "rejected": 0, "expired": 0}
+
+    def capacity(self, slot: Slot) -> Optional[int]:
+        """Вместимость слота (None - без ограничения)"""
+        capacity = self.overrides.get(slot, self.overrides.get(slot[:1], self.default_capacity))
+        return capacity if capacity > 0 else None
+
+    def _expire_holds(self, now: float):
+        while self._holds:
+            user_id, (slot, expires_at) = next(iter(self._holds.items()))
+            if expires_at > now:
+                return
+            self._drop_hold(user_id)
+            self.stats["expired"] += 1
+
+    def _drop_hold(self, user_id: int) -> Optional[Slot]:
+        hold = self._holds.pop(user_id, None)
+        if hold is None:
+            return None
+        self._held[hold[0]] -= 1
+        return hold[0]
+
+    def used(self, slot: Slot, now: Optional[float] = None) -> int:
+        """Занято мест: заказы и действующие брони"""
+        self._expire_holds(time.monotonic() if now is None else now)
+        return self._booked[slot] + self._held[slot]
+
+    def is_full(self, slot: Slot) -> bool:
+        capacity = self.capacity(slot)
+        return capacity is not None and self.used(slot) >= capacity
+
+    def full_hours(self, date_str: str, date_schedule: Dict) -> FrozenSet[str]:
+        """Часы даты, на которые мест больше нет (скрываются из клавиатуры)"""
+        hours = (f"{hour:02d}:00" for hour in range(date_schedule["start"], date_schedule["end"] + 1))
+        return frozenset(hour for hour in hours if self.is_full((date_str, hour)))
+
+    def hold(self, user_id: int, slot: Slot) -> bool:
+        """Забронировать место в слоте за покупателем (прежняя бронь покупателя снимается).
+
+        Повторный вызов для того же слота продлевает бронь. False - мест нет.
+        """
+        now = time.monotonic()
+        self._expire_holds(now)
+        current = self._holds.get(user_id)
+        if current is None or current[0] != slot:
+            capacity = self.capacity(slot)
+            if capacity is not None and self._booked[slot] + self._held[slot] >= capacity:
+                self.stats["rejected"] += 1
+                return False
+            self._drop_hold(user_id)
+            self._held[slot] += 1
+            self.stats["holds"] += 1
+        self._holds[user_id] = (slot, now + self.hold_ttl)
+        self._holds.move_to_end(user_id)
+        return True
+
+    def release_hold(self, user_id: int):
+        """Снять бронь покупателя (например, оформление прервано)"""
+        self._drop_hold(user_id)
+
+    def on_order_changed(self, order: Dict):
+        """Обработчик изменения заказа (подписывается через add_order_listener)"""
+        order_number = order.get("order_number")
+        if not order_number:
+            return
+        active = order.get("status") in ACTIVE_STATUSES
+        booked = self._orders.get(order_number)
+        if active and booked is None:
+            slot = (order.get("pickup_date") or "", order.get("pickup_time") or "")
+            self._orders[order_number] = slot
+            self._booked[slot] += 1
+            # Бронь покупателя превращается в заказ
+            hold = self._holds.get(order.get("user_id"))
+            if hold is not None and hold[0] == slot:
+                self._drop_hold(order.get("user_id"))
+        elif not active and booked is not None:
+            del self._orders[order_number]
+            self._booked[booked] -= 1
+
+    async def load(self, db):
+        """Построить счётчики по заказам (при запуске)"""
+        for order in (await db.get_all_orders()).values():
+            self.on_order_changed(order)
+        logger.info(f"Слоты самовывоза: {len(self._orders)} активных заказов")
+
+    def snapshot(self) -> Dict[Slot, Dict[str, Optional[int]]]:
+        """Занятость слотов, в которых есть заказы или брони"""
+        self._expire_holds(time.monotonic())
+        slots = {slot for slot, count in self._booked.items() if count} | {s for s, c in self._held.items() if c}
+        return {
+            slot: {"booked": self._booked[slot], "held": self._held[slot], "capacity": self.capacity(slot)}
+            for slot in sorted(slots)
+        }
+
+
+_slots: Optional[PickupSlots] = None
+
+
+def get_pickup_slots() -> PickupSlots:
+    """Общий на процесс учёт слотов (следит за изменениями заказов)"""
+    global _slots
+    if _slots is None:
+        _slots = PickupSlots(
+            Config.PICKUP_SLOT_CAPACITY,
+            parse_capacity_overrides(Config.PICKUP_SLOT_CAPACITY_OVERRIDES),
+            hold_ttl=Config.PICKUP_HOLD_MINUTES * 60
+        )
+        add_order_listener(_slots.on_order_changed)
+    return _slots
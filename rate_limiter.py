@@ -0,0 +1,39 @@
+"""
+Ограничитель частоты запросов (token bucket).
+
+Потокобезопасный: запросы к Google Sheets выполняются в рабочих потоках.
+"""
+import threading
+import time
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, limit: float, burst: float = None) -> "TokenBucket":
+        """Ведро под квоту вида "limit запросов в минуту" """
+        return cls(limit / 60.0, burst if burst is not None else max(limit / 6.0, 1.0))
+
+    def _reserve(self, tokens: float) -> float:
+        """Забрать токены (баланс может уйти в минус); вернуть, сколько ждать"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Дождаться токенов; возвращает время ожидания в секундах"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
@@ -0,0 +1,119 @@
+"""
+Сводный лист: сколько букетов и тюльпанов каждого варианта нужно
+на каждую дату и час самовывоза (только оплаченные заказы).
+
+Сводка строится один раз по листу заказов, дальше поддерживается
+приращениями: при оплате заказа его количества прибавляются к строке
+его слота, при отмене оплаченного - вычитаются. В таблицу пишутся только
+изменившиеся строки сводки, одним batch_update.
+"""
+from typing import Dict, List, Optional, Tuple
+
+VARIANTS = 6
+SUMMARY_HEADER = (
+    ["Дата", "Время"]
+    + [f"Букеты В{i}" for i in range(1, VARIANTS + 1)]
+    + [f"Тюльпаны В{i}" for i in range(1, VARIANTS + 1)]
+    + ["Итого букетов", "Итого тюльпанов"]
+)
+SUMMARY_HEADER_RANGE = "A1:P1"
+SUMMARY_FIRST_ROW = 2
+PAID_DISPLAY = "оплачен"
+
+# Колонки варианта 1-6 (F-K) и колонка даты и времени (C) в строках заказа
+_VARIANT_COLS = slice(5, 5 + VARIANTS)
+_DATE_TIME_COL = 2
+
+
+def _number(value) -> int:
+    try:
+        return int(float(str(value).replace(",", ".").replace("\xa0", "").replace(" ", "") or 0))
+    except ValueError:
+        return 0
+
+
+def _padded(row: List, width: int = 16) -> List:
+    return list(row) + [""] * (width - len(row))
+
+
+def order_counts(row1: List, row2: List) -> Tuple[str, List[int]]:
+    """Слот ("7 марта, 10:00") и количества заказа по двум его строкам в листе заказов.
+
+    Количества: букеты по вариантам 1-6, тюльпаны по вариантам 1-6.
+    """
+    row1, row2 = _padded(row1), _padded(row2)
+    bouquets = [_number(v) for v in row1[_VARIANT_COLS]]
+    tulips = [_number(v) for v in row2[_VARIANT_COLS]]
+    return str(row1[_DATE_TIME_COL]), bouquets + tulips
+
+
+class SummaryTable:
+    """Сводка в памяти и номера её строк на листе"""
+
+    def __init__(self):
+        self.counts: Dict[str, List[int]] = {}
+        self.rows: Dict[str, int] = {}
+        self._dirty: Dict[str, None] = {}  # слоты, чьи строки надо записать (по порядку изменения)
+
+    @classmethod
+    def build(cls, orders_values: List[List], summary_values: List[List]) -> "SummaryTable":
+        """Посчитать сводку по листу заказов (строки после заголовков) и сопоставить её с листом сводки.
+
+        Слоты сохраняют свои строки на листе сводки, новые дописываются в конец;
+        к записи помечаются только строки, отличающиеся от посчитанных.
+        """
+        table = cls()
+        for i, row in enumerate(orders_values):
+            row = _padded(row)
+            if not row[1] or row[0] != PAID_DISPLAY:
+                continue
+            next_row = orders_values[i + 1] if i + 1 < len(orders_values) else []
+            table.add(*order_counts(row, next_row), sign=1)
+        table._dirty.clear()
+
+        current: Dict[str, List] = {}
+        for offset, row in enumerate(summary_values):
+            row = _padded(row)
+            slot = f"{row[0]}, {row[1]}" if row[1] else row[0]
+            if slot and slot not in table.rows:
+                table.rows[slot] = SUMMARY_FIRST_ROW + offset
+                current[slot] = row
+        # Слоты, которых больше нет среди оплаченных, обнуляем, а не удаляем строки
+        for slot in table.rows:
+            table.counts.setdefault(slot, [0] * (2 * VARIANTS))
+        for slot in table.counts:
+            if slot not in current or current[slot] != _padded([str(v) for v in table._row_values(slot)]):
+                table._dirty[slot] = None
+        return table
+
+    def add(self, slot: str, counts: List[int], sign: int):
+        """Прибавить (sign=1) или вычесть (sign=-1) количества заказа"""
+        if not slot or not any(counts):
+            return
+        totals = self.counts.setdefault(slot, [0] * (2 * VARIANTS))
+        for i, value in enumerate(counts):
+            totals[i] += sign * value
+        self._dirty[slot] = None
+
+    def _row_values(self, slot: str) -> List:
+        date, _, time = slot.rpartition(", ")
+        if not date:
+            date, time = slot, ""
+        counts = self.counts[slot]
+        return [date, time] + counts + [sum(counts[:VARIANTS]), sum(counts[VARIANTS:])]
+
+    def pending_updates(self) -> Optional[List[Dict]]:
+        """Диапазоны для batch_update по изменившимся строкам (None - менять нечего)"""
+        if not self._dirty:
+            return None
+        updates = []
+        for slot in self._dirty:
+            if slot not in self.rows:
+                self.rows[slot] = max(self.rows.values(), default=SUMMARY_FIRST_ROW - 1) + 1
+            row = self.rows[slot]
+            updates.append({"range": f"A{row}:P{row}", "values": [self._row_values(slot)]})
+        return updates
+
+    def written(self):
+        """Изменения записаны в таблицу"""
+        self._dirty.clear()
@@ -0,0 +1,259 @@
+"""
+Фоновая синхронизация заказов с Google Sheets.
+
+Обработчики только ставят событие «заказ изменился» в очередь на диске
+(SQLite), это быстро и не зависит от сети. Задача-обработчик отправляет
+события в Google Sheets в порядке поступления, вызывая gspread в отдельном
+потоке, и повторяет неудачные попытки с нарастающей паузой. Событие,
+которое не удалось отправить за max_attempts попыток, помечается как
+ошибочное и больше не задерживает очередь.
+
+События копятся flush_window секунд и уходят пачкой через
+GoogleSheets.apply_changes: все новые заказы - одним append_rows, все
+изменения ячеек - одним batch_update. Если пачка не прошла, она делится
+пополам, пока не найдётся событие, на котором случилась ошибка: события
+до него отправляются, попытка засчитывается ему, и оно повторяется
+отдельно, поэтому одно плохое событие не тянет за собой остальные.
+"""
+import asyncio
+import json
+import logging
+import time
+from itertools import takewhile
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+from event_log import log_event
+from google_sheets import get_sheets
+from sqlite_database import get_connection
+
+logger = logging.getLogger(__name__)
+
+SYNC_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sheets_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_number TEXT NOT NULL,
+    action TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    failed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_sheets_queue_pending ON sheets_queue(failed, id);
+"""
+
+
+class SheetsSync:
+    """Очередь событий для Google Sheets и задача, которая её разбирает"""
+
+    def __init__(self, path: str = "data/sheets_sync.sqlite3", max_attempts: int = 10,
+                 max_backoff: float = 300.0, flush_window: float = 0.0, max_batch: int = 200, sheets=None):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self.flush_window = flush_window
+        self.max_batch = max_batch
+        self._sheets = sheets
+        self._conn = get_connection(path, SYNC_SCHEMA)
+        self._wake = asyncio.Event()
+        self.last_success_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.stats = {"sent": 0, "batches": 0, "errors": 0}
+
+    @property
+    def sheets(self):
+        if self._sheets is None:
+            self._sheets = get_sheets()
+        return self._sheets
+
+    async def enqueue(self, action: str, order_number: str, **payload):
+        """Поставить событие в очередь (action: add - новая строка заказа, status - смена статуса)"""
+        now = time.time()
+        data = json.dumps(payload, ensure_ascii=False, default=str)
+        await self._conn.run(lambda conn: conn.execute(
+            "INSERT INTO sheets_queue (order_number, action, payload, enqueued_at, next_attempt_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (order_number, action, data, now, now)
+        ))
+        self._wake.set()
+
+    async def add_order(self, order: Dict):
+        """Добавить заказ в таблицу (в фоне)"""
+        await self.enqueue("add", order.get("order_number", ""), order=order)
+
+    async def update_order_status(self, order_number: str, status: str, **kwargs):
+        """Обновить статус заказа в таблице (в фоне)"""
+        await self.enqueue("status", order_number, status=status, **kwargs)
+
+    def _send(self, events: List[Dict]):
+        """Отправить пачку событий в Google Sheets (выполняется в отдельном потоке)"""
+        sheets = self.sheets
+        sheets.ensure_connected()
+        if not sheets.worksheet:
+            raise RuntimeError("Google Sheets не подключены")
+        changes = []
+        for event in events:
+            payload = json.loads(event["payload"])
+            if event["action"] not in ("add", "status"):
+                raise ValueError(f"неизвестное действие {event['action']}")
+            changes.append({"action": event["action"], "order_number": event["order_number"], **payload})
+        sheets.apply_changes(changes)
+
+    async def _head(self):
+        """Голова очереди: сначала новые заказы, затем смены статусов, внутри - по порядку поступления.
+        
+        Такой приоритет не нарушает порядок по заказу: строка заказа всегда
+        добавляется раньше любых изменений её статуса.
+        """
+        return await self._conn.run(lambda conn: conn.execute(
+            "SELECT id, order_number, action, payload, enqueued_at, attempts, next_attempt_at FROM sheets_queue "
+            "WHERE failed = 0 ORDER BY CASE action WHEN 'add' THEN 0 ELSE 1 END, id LIMIT ?",
+            (self.max_batch,)
+        ).fetchall())
+
+    async def process_once(self) -> Optional[float]:
+        """Отправить готовые события по порядку; возвращает, сколько ждать до следующей попытки"""
+        while True:
+            events = await self._head()
+            if not events:
+                return None
+            head = events[0]
+            now = time.time()
+            # Порядок важен (строка заказа раньше смены статуса), поэтому ждём голову очереди
+            if head["attempts"]:
+                wait = head["next_attempt_at"] - now
+                events = events[:1]
+            else:
+                # Свежие события ждут окно, чтобы уйти одной пачкой с соседями
+                wait = head["enqueued_at"] + self.flush_window - now
+                events = list(takewhile(lambda e: not e["attempts"], events))
+            if wait > 0:
+                return wait
+
+            sent, failure = await self._send_split(events)
+            if sent:
+                ids = [(event["id"],) for event in sent]
+                await self._conn.run(lambda conn: conn.executemany("DELETE FROM sheets_queue WHERE id = ?", ids))
+                self.stats["sent"] += len(sent)
+                self.stats["batches"] += 1
+                self.last_success_at = time.time()
+                log_event(
+                    "sheets_sync.batch_sent",
+                    events=len(sent),
+                    lag=round(self.last_success_at - min(event["enqueued_at"] for event in sent), 3)
+                )
+            if failure is not None:
+                # Попытка засчитывается событию с ошибкой: оно повторится одно, остальные потом снова пачкой
+                await self._failed(*failure)
+
+    async def _send_split(self, events: List) -> Tuple[List, Optional[Tuple[Dict, Exception]]]:
+        """Отправить события; если пачка не прошла, делить её пополам до события с ошибкой.
+        
+        Возвращает отправленные события и (событие, ошибка) для первого
+        неотправленного. События после него не отправляются, чтобы не
+        нарушить порядок.
+        """
+        try:
+            await asyncio.to_thread(self._send, events)
+            return events, None
+        except Exception as e:
+            if len(events) == 1:
+                return [], (events[0], e)
+        middle = len(events) // 2
+        sent, failure = await self._send_split(events[:middle])
+        if failure is not None:
+            return sent, failure
+        rest, failure = await self._send_split(events[middle:])
+        return sent + rest, failure
+
+    async def _failed(self, event, error: Exception):
+        attempts = event["attempts"] + 1
+        failed = int(attempts >= self.max_attempts)
+        next_attempt_at = time.time() + min(2 ** attempts, self.max_backoff)
+        self.stats["errors"] += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+        await self._conn.run(lambda conn: conn.execute(
+            "UPDATE sheets_queue SET attempts = ?, next_attempt_at = ?, last_error = ?, failed = ? WHERE id = ?",
+            (attempts, next_attempt_at, self.last_error[:1000], failed, event["id"])
+        ))
+        log_event(
+            "sheets_sync.send_failed",
+            order_number=event["order_number"],
+            action=event["action"],
+            attempts=attempts,
+            error=self.last_error
+        )
+        if failed:
+            logger.error(
+                f"Заказ {event['order_number']} ({event['action']}) не отправлен в Google Sheets "
+                f"после {attempts} попыток: {self.last_error}"
+            )
+        else:
+            logger.warning(
+                f"Ошибка отправки заказа {event['order_number']} в Google Sheets "
+                f"(попытка {attempts}): {self.last_error}"
+            )
+
+    async def run(self):
+        """Основной цикл обработчика очереди"""
+        while True:
+            self._wake.clear()
+            try:
+                wait = await self.process_once()
+            except Exception as e:
+                logger.error(f"Ошибка обработчика очереди Google Sheets: {e}", exc_info=True)
+                wait = 5.0
+            try:
+                await asyncio.wait_for(self._wake.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def reconcile(self, orders: Dict[str, Dict]) -> Dict:
+        """Сверить таблицу с локальными заказами и дописать/исправить расхождения"""
+        report = await asyncio.to_thread(self.sheets.reconcile_orders, orders)
+        if report["appended"] or report["updated"]:
+            logger.warning(
+                f"Сверка с Google Sheets: дописано {len(report['appended'])}, "
+                f"исправлено {len(report['updated'])} из {report['checked']} оплаченных заказов"
+            )
+        return report
+
+    async def status(self) -> Dict:
+        """Состояние очереди: глубина, задержка самого старого события, ошибочные события"""
+        def _status(conn) -> Dict:
+            pending = conn.execute(
+                "SELECT COUNT(*) AS depth, MIN(enqueued_at) AS oldest FROM sheets_queue WHERE failed = 0"
+            ).fetchone()
+            failed = conn.execute("SELECT COUNT(*) FROM sheets_queue WHERE failed = 1").fetchone()[0]
+            return {"depth": pending["depth"], "oldest": pending["oldest"], "failed": failed}
+
+        result = await self._conn.run(_status)
+        oldest = result.pop("oldest")
+        result["lag"] = time.time() - oldest if oldest else 0.0
+        result["last_success_at"] = self.last_success_at
+        result["last_error"] = self.last_error
+        return result
+
+    async def failed_events(self) -> List[Dict]:
+        """События, которые так и не удалось отправить"""
+        rows = await self._conn.run(lambda conn: conn.execute(
+            "SELECT order_number, action, attempts, last_error FROM sheets_queue WHERE failed = 1 ORDER BY id"
+        ).fetchall())
+        return [dict(row) for row in rows]
+
+
+_sync: Optional[SheetsSync] = None
+
+
+def get_sheets_sync() -> SheetsSync:
+    """Общая на процесс очередь синхронизации с Google Sheets"""
+    global _sync
+    if _sync is None:
+        _sync = SheetsSync(
+            Config.SHEETS_SYNC_PATH,
+            max_attempts=Config.SHEETS_SYNC_MAX_ATTEMPTS,
+            flush_window=Config.SHEETS_FLUSH_WINDOW_MS / 1000
+        )
+    return _sync
@@ -0,0 +1,406 @@
+import asyncio
+import json
+import os
+import sqlite3
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, TypeVar
+from datetime import datetime
+
+from database import merge_user_data, notify_order_changed, notify_stock_changed
+from order_journal import OrderJournal, apply_records
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    order_number TEXT PRIMARY KEY,
+    user_id INTEGER,
+    status TEXT,
+    created_at TEXT,
+    pickup_date TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders(user_id);
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
+CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_pickup_date ON orders(pickup_date);
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS stock (
+    variant TEXT PRIMARY KEY,
+    available INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS stock_counts (
+    variant TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class SqliteConnection:
+    """Соединение с SQLite, которым владеет один выделенный поток.
+
+    Все запросы выполняются последовательно в этом потоке, поэтому
+    транзакции не пересекаются, а event loop не блокируется.
+    """
+
+    def __init__(self, path: str, schema: str = SCHEMA):
+        self.path = path
+        self.schema = schema
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor.submit(self._open).result()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.executescript(self.schema)
+        self._conn = conn
+
+    def _in_transaction(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    async def run(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Выполнить fn(conn) в потоке соединения внутри одной транзакции"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._in_transaction, fn)
+
+    async def checkpoint(self):
+        """Перенести содержимое WAL в основной файл и обрезать WAL"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self._executor, lambda: self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        )
+
+    def run_sync(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Синхронный вариант run (для скриптов и инициализации)"""
+        return self._executor.submit(self._in_transaction, fn).result()
+
+
+_connections: Dict[str, SqliteConnection] = {}
+
+
+def get_connection(path: str, schema: str = SCHEMA) -> SqliteConnection:
+    """Общее на процесс соединение для файла БД"""
+    key = os.path.abspath(path)
+    if key not in _connections:
+        _connections[key] = SqliteConnection(path, schema)
+    return _connections[key]
+
+
+def _order_row(order: Dict) -> tuple:
+    return (
+        order["order_number"],
+        order.get("user_id"),
+        order.get("status"),
+        order.get("created_at"),
+        order.get("pickup_date"),
+        json.dumps(order, ensure_ascii=False),
+    )
+
+
+class SqliteDatabase:
+    """Хранилище на SQLite с тем же API, что и database.Database"""
+
+    def __init__(self, path: str = "data/bot.sqlite3"):
+        self.path = path
+        self._conn = get_connection(path)
+        self._conn.run_sync(self._init_stock)
+
+    @staticmethod
+    def _init_stock(conn: sqlite3.Connection):
+        """По умолчанию все товары доступны"""
+        conn.executemany(
+            "INSERT OR IGNORE INTO stock (variant, available) VALUES (?, 1)",
+            [(str(i),) for i in range(1, 7)]
+        )
+
+    @staticmethod
+    def _next_counter(conn: sqlite3.Connection) -> int:
+        conn.execute("INSERT OR IGNORE INTO counters (name, value) VALUES ('order', 0)")
+        conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'order'")
+        return conn.execute("SELECT value FROM counters WHERE name = 'order'").fetchone()[0]
+
+    async def get_next_order_number(self) -> str:
+        """Получить следующий номер заказа"""
+        counter = await self._conn.run(self._next_counter)
+        return f"{counter:03d}"
+
+    async def save_order(self, order: Dict) -> str:
+        """Сохранить заказ"""
+        def _save(conn: sqlite3.Connection) -> str:
+            order_number = f"{self._next_counter(conn):03d}"
+            order["order_number"] = order_number
+            order["created_at"] = datetime.now().isoformat()
+            order["status"] = "pending_payment"
+            conn.execute(
+                "INSERT OR REPLACE INTO orders (order_number, user_id, status, created_at, pickup_date, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                _order_row(order)
+            )
+            return order_number
+
+        order_number = await self._conn.run(_save)
+        notify_order_changed(dict(order))
+        return order_number
+
+    async def get_order(self, order_number: str) -> Optional[Dict]:
+        """Получить заказ по номеру"""
+        def _get(conn: sqlite3.Connection):
+            return conn.execute("SELECT data FROM orders WHERE order_number = ?", (order_number,)).fetchone()
+
+        row = await self._conn.run(_get)
+        return json.loads(row["data"]) if row else None
+
+    @staticmethod
+    def _set_status(conn: sqlite3.Connection, order_number: str, status: str,
+                    expected_status: Optional[str], kwargs: Dict) -> Optional[Dict]:
+        row = conn.execute("SELECT data FROM orders WHERE order_number = ?", (order_number,)).fetchone()
+        if not row:
+            return None
+        order = json.loads(row["data"])
+        if expected_status is not None and order.get("status") != expected_status:
+            return None
+        order["status"] = status
+        order.update(kwargs)
+        order.setdefault("updated_at", []).append(datetime.now().isoformat())
+        conn.execute(
+            "UPDATE orders SET status = ?, data = ? WHERE order_number = ?",
+            (status, json.dumps(order, ensure_ascii=False), order_number)
+        )
+        return order
+
+    async def update_order_status(self, order_number: str, status: str, **kwargs):
+        """Обновить статус заказа"""
+        order = await self._conn.run(lambda conn: self._set_status(conn, order_number, status, None, kwargs))
+        if order is not None:
+            notify_order_changed(order)
+
+    async def update_orders_status(self, order_numbers: List[str], status: str,
+                                   expected_status: Optional[str] = None, **kwargs) -> List[Dict]:
+        """Обновить статус нескольких заказов в одной транзакции; возвращает изменённые заказы"""
+        def _update(conn: sqlite3.Connection) -> List[Dict]:
+            updated = []
+            for order_number in order_numbers:
+                order = self._set_status(conn, order_number, status, expected_status, kwargs)
+                if order is not None:
+                    updated.append(order)
+            return updated
+
+        orders = await self._conn.run(_update)
+        for order in orders:
+            notify_order_changed(order)
+        return orders
+
+    async def get_user_orders(self, user_id: int) -> List[Dict]:
+        """Получить все заказы пользователя"""
+        def _get(conn: sqlite3.Connection):
+            return conn.execute(
+                "SELECT data FROM orders WHERE user_id = ? ORDER BY order_number", (user_id,)
+            ).fetchall()
+
+        rows = await self._conn.run(_get)
+        return [json.loads(row["data"]) for row in rows]
+
+    async def get_orders_by_status(self, status: str) -> Dict[str, Dict]:
+        """Получить заказы с указанным статусом"""
+        def _get(conn: sqlite3.Connection):
+            return conn.execute(
+                "SELECT order_number, data FROM orders WHERE status = ? ORDER BY created_at", (status,)
+            ).fetchall()
+
+        rows = await self._conn.run(_get)
+        return {row["order_number"]: json.loads(row["data"]) for row in rows}
+
+    async def get_all_orders(self) -> Dict[str, Dict]:
+        """Получить все заказы"""
+        def _get(conn: sqlite3.Connection):
+            return conn.execute("SELECT order_number, data FROM orders ORDER BY order_number").fetchall()
+
+        rows = await self._conn.run(_get)
+        return {row["order_number"]: json.loads(row["data"]) for row in rows}
+
+    async def compact_orders(self) -> bool:
+        """Перенести WAL в основной файл БД (аналог компактизации журнала JSON-хранилища)"""
+        await self._conn.checkpoint()
+        return True
+
+    async def get_user(self, user_id: int) -> Optional[Dict]:
+        """Получить данные пользователя"""
+        def _get(conn: sqlite3.Connection):
+            return conn.execute("SELECT data FROM users WHERE user_id = ?", (str(user_id),)).fetchone()
+
+        row = await self._conn.run(_get)
+        if not row:
+            logger.warning(f"Пользователь {user_id} не найден в базе")
+            return None
+        return json.loads(row["data"])
+
+    async def save_user(self, user_id: int, user_data: Dict):
+        """Сохранить данные пользователя"""
+        def _save(conn: sqlite3.Connection):
+            row = conn.execute("SELECT data FROM users WHERE user_id = ?", (str(user_id),)).fetchone()
+            existing_user = json.loads(row["data"]) if row else {}
+            user = merge_user_data(existing_user, user_data)
+            conn.execute(
+                "INSERT OR REPLACE INTO users (user_id, data) VALUES (?, ?)",
+                (str(user_id), json.dumps(user, ensure_ascii=False))
+            )
+
+        await self._conn.run(_save)
+
+    async def update_user_consent(self, user_id: int, consented: bool = True):
+        """Обновить согласие на обработку ПД"""
+        user = await self.get_user(user_id)
+        if user:
+            user["consent_given"] = consented
+            await self.save_user(user_id, user)
+        else:
+            await self.save_user(user_id, {"consent_given": consented})
+
+    async def get_stock_status(self) -> Dict[str, bool]:
+        """Получить статус остатков товаров"""
+        def _get(conn: sqlite3.Connection):
+            return conn.execute("SELECT variant, available FROM stock").fetchall()
+
+        rows = await self._conn.run(_get)
+        return {row["variant"]: bool(row["available"]) for row in rows}
+
+    async def is_variant_available(self, variant_num: int) -> bool:
+        """Проверить, доступен ли вариант букета"""
+        stock = await self.get_stock_status()
+        return stock.get(str(variant_num), True)
+
+    async def toggle_variant_stock(self, variant_num: int) -> bool:
+        """Переключить доступность варианта букета"""
+        def _toggle(conn: sqlite3.Connection) -> bool:
+            conn.execute(
+                "INSERT OR IGNORE INTO stock (variant, available) VALUES (?, 1)", (str(variant_num),)
+            )
+            conn.execute(
+                "UPDATE stock SET available = 1 - available WHERE variant = ?", (str(variant_num),)
+            )
+            row = conn.execute("SELECT available FROM stock WHERE variant = ?", (str(variant_num),)).fetchone()
+            return bool(row["available"])
+
+        try:
+            new_status = await self._conn.run(_toggle)
+            logger.info(f"Вариант {variant_num} {'включен' if new_status else 'выключен'}")
+            notify_stock_changed(await self.get_stock_status())
+            return new_status
+        except Exception as e:
+            logger.error(f"Ошибка при переключении остатков: {e}", exc_info=True)
+            return False
+
+    async def set_variant_stock(self, variant_num: int, available: bool) -> bool:
+        """Включить или выключить вариант букета; True - статус изменился"""
+        def _set(conn: sqlite3.Connection) -> bool:
+            cursor = conn.execute(
+                "INSERT INTO stock (variant, available) VALUES (?, ?) "
+                "ON CONFLICT(variant) DO UPDATE SET available = excluded.available "
+                "WHERE available != excluded.available",
+                (str(variant_num), int(available))
+            )
+            return cursor.rowcount > 0
+
+        changed = await self._conn.run(_set)
+        if changed:
+            logger.info(f"Вариант {variant_num} {'включен' if available else 'выключен'}")
+            notify_stock_changed(await self.get_stock_status())
+        return changed
+
+    async def get_stock_counts(self) -> Dict[str, Dict]:
+        """Лимиты количества по вариантам (вариант -> запись inventory.Inventory)"""
+        def _get(conn: sqlite3.Connection):
+            return conn.execute("SELECT variant, data FROM stock_counts").fetchall()
+
+        rows = await self._conn.run(_get)
+        return {row["variant"]: json.loads(row["data"]) for row in rows}
+
+    async def save_stock_count(self, variant_num: int, entry: Optional[Dict]):
+        """Сохранить лимит количества варианта (None - снять лимит)"""
+        def _save(conn: sqlite3.Connection):
+            if entry is None:
+                conn.execute("DELETE FROM stock_counts WHERE variant = ?", (str(variant_num),))
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO stock_counts (variant, data) VALUES (?, ?)",
+                    (str(variant_num), json.dumps(entry, ensure_ascii=False))
+                )
+
+        await self._conn.run(_save)
+
+    def import_json(self, data_dir: str = "data") -> Dict[str, int]:
+        """Разовый импорт данных из JSON-файлов (orders с журналом, users, stock, stock_counts, order_counter)"""
+        def _read(name: str, default):
+            path = os.path.join(data_dir, name)
+            if not os.path.exists(path):
+                return default
+            with open(path, "r", encoding="utf-8") as f:
+                content = f.read()
+            return json.loads(content) if content.strip() else default
+
+        orders = _read("orders.json", {})
+        # Заказы после последней компактизации есть только в журнале - применяем его, как Database
+        apply_records(orders, OrderJournal(os.path.join(data_dir, "orders.journal.ndjson")).read())
+        users = _read("users.json", {})
+        stock = _read("stock.json", {})
+        stock_counts = _read("stock_counts.json", {})
+        # Файл счётчика может отставать от заказов: он пишется только при компактизации
+        counter = max(
+            [_read("order_counter.json", {}).get("counter", 0)]
+            + [int(number) for number in orders if number.isdigit()]
+        )
+
+        def _import(conn: sqlite3.Connection):
+            conn.executemany(
+                "INSERT OR REPLACE INTO orders (order_number, user_id, status, created_at, pickup_date, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [_order_row({**order, "order_number": number}) for number, order in orders.items()]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO users (user_id, data) VALUES (?, ?)",
+                [(str(user_id), json.dumps(user, ensure_ascii=False)) for user_id, user in users.items()]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO stock (variant, available) VALUES (?, ?)",
+                [(str(variant), int(bool(available))) for variant, available in stock.items()]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO stock_counts (variant, data) VALUES (?, ?)",
+                [(str(variant), json.dumps(entry, ensure_ascii=False)) for variant, entry in stock_counts.items()]
+            )
+            # Счётчик не уменьшаем, если в БД уже были заказы
+            conn.execute(
+                "INSERT INTO counters (name, value) VALUES ('order', ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = MAX(value, excluded.value)",
+                (counter,)
+            )
+
+        self._conn.run_sync(_import)
+        return {"orders": len(orders), "users": len(users), "stock": len(stock), "counter": counter}
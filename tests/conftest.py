@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Журнал событий тестов не должен попадать в logs/ репозитория
+os.environ.setdefault("EVENT_LOG_PATH", os.path.join(tempfile.mkdtemp(), "events.ndjson"))
+# Поддельному листу (fake_sheets) клиентские квоты Sheets не нужны
+os.environ.setdefault("SHEETS_READS_PER_MINUTE", "60000")
+os.environ.setdefault("SHEETS_WRITES_PER_MINUTE", "60000")
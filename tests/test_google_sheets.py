@@ -0,0 +1,91 @@
+"""Запись заказов в Google Sheets на поддельном листе (fake_sheets)"""
+import pytest
+
+from fake_sheets import FakeWorksheet, connect_fake
+from google_sheets import GoogleSheets
+
+
+def order_data(order_number: str, status: str = "paid", variant: int = 1, count: int = 1, **extra) -> dict:
+    return {
+        "order_number": order_number,
+        "status": status,
+        "first_name": "Иван",
+        "last_name": "Иванов",
+        "username": "ivan",
+        "pickup_date": "7 марта",
+        "pickup_time": "12:00",
+        "total_price": 1800 * count,
+        "bouquets": [{"variant": variant, "variant_name": "Микс", "quantity": 15, "count": count}],
+        **extra,
+    }
+
+
+@pytest.fixture
+def sheets():
+    worksheet = FakeWorksheet()
+    sheets = connect_fake(GoogleSheets(), worksheet)
+    sheets._init_headers()
+    worksheet.stats.update(reads=0, writes=0)
+    return sheets
+
+
+def order_rows(sheets):
+    """Первые строки заказов: (статус, номер, варианты 1-6, оплата, возврат)"""
+    rows = sheets.worksheet.rows[2::2]
+    return [(row[0], row[1], row[5:11], row[14], row[15]) for row in rows]
+
+
+def summary_rows(sheets):
+    return sheets.sheet.worksheet(sheets.summary_name).rows[1:]
+
+
+def test_apply_changes_coalesces_batch(sheets):
+    sheets.apply_changes([
+        {"action": "add", "order": order_data("001")},
+        {"action": "add", "order": order_data("002", variant=3, count=2)},
+        {"action": "add", "order": order_data("001")},  # повтор в пачке пропускается
+        {"action": "status", "order_number": "001", "status": "cancelled",
+         "order": order_data("001", "cancelled"), "refund_amount": 1800},
+    ])
+
+    assert order_rows(sheets) == [
+        ("отменен", "001", ["1", "", "", "", "", ""], "0", "1800"),
+        ("оплачен", "002", ["", "", "2", "", "", ""], "3600", ""),
+    ]
+    # Один append_rows на новые заказы и один batch_update на смену статуса
+    assert sheets.worksheet.stats["writes"] == 2
+    assert summary_rows(sheets) == [
+        ["7 марта", "12:00", "0", "0", "2", "0", "0", "0", "0", "0", "30", "0", "0", "0", "2", "30"],
+    ]
+
+    # Уже записанный заказ не добавляется второй раз
+    sheets.apply_changes([{"action": "add", "order": order_data("002", variant=3, count=2)}])
+    assert len(order_rows(sheets)) == 2
+
+
+def test_reconcile_fixes_only_differences(sheets):
+    sheets.apply_changes([{"action": "add", "order": order_data("001")}])
+    orders = {
+        "001": order_data("001", "cancelled", payment_confirmed_at="2026-03-01T10:00:00", refund_card="2200..."),
+        "002": order_data("002", variant=2, count=3),
+        "003": order_data("003", "pending_payment"),  # неоплаченные в таблицу не попадают
+    }
+
+    report = sheets.reconcile_orders(orders)
+
+    assert report == {"checked": 2, "sheet_rows": 1, "appended": ["002"], "updated": ["001"]}
+    assert order_rows(sheets) == [
+        ("отменен", "001", ["1", "", "", "", "", ""], "0", "1800"),
+        ("оплачен", "002", ["", "3", "", "", "", ""], "5400", ""),
+    ]
+    assert summary_rows(sheets) == [
+        ["7 марта", "12:00", "0", "3", "0", "0", "0", "0", "0", "45", "0", "0", "0", "0", "3", "45"],
+    ]
+
+    # Повторная сверка ничего не меняет и читает лист заказов один раз
+    writes = sheets.worksheet.stats["writes"]
+    reads = sheets.worksheet.stats["reads"]
+    report = sheets.reconcile_orders(orders)
+    assert report["appended"] == [] and report["updated"] == []
+    assert sheets.worksheet.stats["writes"] == writes
+    assert sheets.worksheet.stats["reads"] == reads + 1
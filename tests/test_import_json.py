@@ -0,0 +1,53 @@
+"""Перенос данных JSON-хранилища в SQLite (import_json_to_sqlite.py)"""
+import asyncio
+import json
+import os
+
+from database import Database
+from sqlite_database import SqliteDatabase
+
+
+def order_data(user_id: int) -> dict:
+    return {
+        "user_id": user_id,
+        "first_name": "Иван",
+        "bouquets": [{"variant": 1, "variant_name": "Микс", "quantity": 15, "count": 1}],
+        "pickup_date": "7 марта",
+        "pickup_time": "12:00",
+        "total_price": 1800,
+    }
+
+
+async def fill_json(data_dir: str):
+    db = Database(data_dir)
+    for user_id in range(20):
+        await db.save_order(order_data(user_id))
+    assert await db.compact_orders()
+    # Эти заказы попадают только в журнал
+    for user_id in range(20, 22):
+        await db.save_order(order_data(user_id))
+    await db.update_order_status("005", "paid")
+
+
+def test_import_replays_journal(tmp_path):
+    data_dir = str(tmp_path / "data")
+    asyncio.run(fill_json(data_dir))
+    assert os.path.getsize(os.path.join(data_dir, "orders.journal.ndjson")) > 0
+    with open(os.path.join(data_dir, "orders.json"), encoding="utf-8") as f:
+        assert len(json.load(f)) == 20
+
+    db = SqliteDatabase(str(tmp_path / "bot.sqlite3"))
+    result = db.import_json(data_dir)
+    assert result["orders"] == 22
+    assert result["counter"] == 22
+
+    async def check():
+        orders = await db.get_all_orders()
+        assert sorted(orders) == [f"{n:03d}" for n in range(1, 23)]
+        assert orders["005"]["status"] == "paid"
+        assert orders["021"]["user_id"] == 20
+        # Новый заказ не перезаписывает импортированные
+        assert await db.save_order(order_data(99)) == "023"
+        assert len(await db.get_all_orders()) == 23
+
+    asyncio.run(check())
@@ -0,0 +1,55 @@
+"""Лимиты количества (inventory.Inventory) и переключатель варианта в stock.json"""
+import asyncio
+
+from database import Database
+from inventory import Inventory
+
+
+def order_data(user_id: int, count: int) -> dict:
+    return {
+        "user_id": user_id,
+        "bouquets": [{"variant": 3, "variant_name": "Жёлтый", "quantity": 15, "count": count}],
+        "status": "pending_payment",
+    }
+
+
+async def setup(data_dir: str):
+    db = Database(data_dir)
+    inventory = Inventory()
+    await inventory.load(db)
+    return db, inventory
+
+
+def test_limit_keeps_manual_switch(tmp_path):
+    async def run():
+        db, inventory = await setup(str(tmp_path))
+        await db.toggle_variant_stock(3)  # администратор выключил вариант вручную
+        await inventory.set_count(3, 5)
+        assert not await db.is_variant_available(3)
+        await inventory.set_count(3, None)
+        assert not await db.is_variant_available(3)
+        await inventory.set_count(3, 0)
+        await inventory.set_count(3, 5)
+        assert not await db.is_variant_available(3)
+
+    asyncio.run(run())
+
+
+def test_limit_reenables_what_it_sold_out(tmp_path):
+    async def run():
+        db, inventory = await setup(str(tmp_path))
+        await inventory.set_count(3, 2)
+        order = order_data(1, 2)
+        await db.save_order(order)
+        inventory.on_order_changed(order)
+        await inventory.wait_switches()
+        assert not await db.is_variant_available(3)
+        await inventory.set_count(3, None)
+        assert await db.is_variant_available(3)
+
+        await inventory.set_count(3, 0)
+        assert not await db.is_variant_available(3)
+        await inventory.set_count(3, 4)
+        assert await db.is_variant_available(3)
+
+    asyncio.run(run())
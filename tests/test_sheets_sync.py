@@ -0,0 +1,42 @@
+"""Очередь синхронизации с Google Sheets (sheets_sync.SheetsSync)"""
+import asyncio
+
+from sheets_sync import SheetsSync
+
+
+class FlakySheets:
+    """Принимает пачки изменений и отклоняет целиком пачку с «плохим» заказом"""
+
+    worksheet = True
+
+    def __init__(self, bad: str):
+        self.bad = bad
+        self.applied = []
+
+    def ensure_connected(self):
+        pass
+
+    def apply_changes(self, changes):
+        if any(change["order_number"] == self.bad for change in changes):
+            raise ValueError(f"заказ {self.bad} не записывается")
+        self.applied.extend(change["order_number"] for change in changes)
+
+
+def test_failed_batch_charges_the_bad_event(tmp_path):
+    sheets = FlakySheets(bad="004")
+    sync = SheetsSync(str(tmp_path / "sync.sqlite3"), max_attempts=3, sheets=sheets)
+
+    async def run():
+        for number in range(1, 9):
+            await sync.update_order_status(f"{number:03d}", "paid")
+        wait = await sync.process_once()
+        return wait, await sync._head()
+
+    wait, pending = asyncio.run(run())
+    # События до плохого отправлены, попытка засчитана только ему, остальные ждут его повтора
+    assert sheets.applied == ["001", "002", "003"]
+    assert wait > 0
+    assert [(event["order_number"], event["attempts"]) for event in pending] == [
+        ("004", 1), ("005", 0), ("006", 0), ("007", 0), ("008", 0)
+    ]
+    assert "004" in sync.last_error
@@ -0,0 +1,28 @@
+"""Групповая запись JSON-хранилища и компактизация журнала"""
+import asyncio
+import json
+import os
+
+import database
+from database import Database
+
+
+def test_compact_writes_counter_after_restart(tmp_path):
+    data_dir = str(tmp_path)
+
+    async def save_orders():
+        db = Database(data_dir)
+        for user_id in range(3):
+            await db.save_order({"user_id": user_id, "bouquets": []})
+
+    async def restart_and_compact():
+        # Новый процесс: номера есть только в журнале, счётчик в памяти прочитан из файла
+        database._storages.pop(os.path.abspath(data_dir))
+        db = Database(data_dir)
+        assert len(await db.get_all_orders()) == 3
+        assert await db.compact_orders()
+
+    asyncio.run(save_orders())
+    asyncio.run(restart_and_compact())
+    with open(os.path.join(data_dir, "order_counter.json"), encoding="utf-8") as f:
+        assert json.load(f)["counter"] == 3